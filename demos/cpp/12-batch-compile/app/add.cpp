@@ -0,0 +1,6 @@
+#include "calc.h"
+
+void printAdd()
+{
+    printResult("add", add(2, 3));
+}
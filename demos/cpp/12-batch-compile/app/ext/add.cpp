@@ -0,0 +1,6 @@
+#include "calc.h"
+
+void printAddExt()
+{
+    printResult("add ext", add(add(1, 2), 3));
+}
@@ -0,0 +1,11 @@
+void printAdd();
+void printAddExt();
+void printMul();
+
+int main()
+{
+    printAdd();
+    printAddExt();
+    printMul();
+    return 0;
+}
@@ -0,0 +1,6 @@
+#include "calc.h"
+
+void printMul()
+{
+    printResult("mul", mul(2, 3));
+}
@@ -0,0 +1,8 @@
+#ifndef CALC_H
+#define CALC_H
+
+int add(int a, int b);
+int mul(int a, int b);
+void printResult(const char* name, int value);
+
+#endif
@@ -0,0 +1,6 @@
+#include "calc.h"
+
+int mul(int a, int b)
+{
+    return a * b;
+}
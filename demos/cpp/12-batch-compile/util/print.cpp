@@ -0,0 +1,7 @@
+#include <iostream>
+#include "calc.h"
+
+void printResult(const char* name, int value)
+{
+    std::cout << name << " = " << value << std::endl;
+}
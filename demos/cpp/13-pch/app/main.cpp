@@ -0,0 +1,10 @@
+#include <string>
+#include <vector>
+
+void printWords(const std::vector<std::string>& words);
+
+int main()
+{
+    printWords({"precompiled", "header", "works"});
+    return 0;
+}
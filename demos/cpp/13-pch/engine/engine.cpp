@@ -0,0 +1,13 @@
+#include "engine.h"
+
+std::string joinWords(const std::vector<std::string>& words)
+{
+    std::string result;
+    for (const auto& word : words)
+    {
+        if (!result.empty())
+            result += ' ';
+        result += word;
+    }
+    return result;
+}
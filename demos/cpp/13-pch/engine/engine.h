@@ -0,0 +1,9 @@
+#ifndef ENGINE_H
+#define ENGINE_H
+
+#include <string>
+#include <vector>
+
+std::string joinWords(const std::vector<std::string>& words);
+
+#endif
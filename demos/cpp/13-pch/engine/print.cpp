@@ -0,0 +1,7 @@
+#include <iostream>
+#include "engine.h"
+
+void printWords(const std::vector<std::string>& words)
+{
+    std::cout << joinWords(words) << std::endl;
+}
@@ -0,0 +1,6 @@
+#include "shapes.h"
+
+double circleArea(double radius)
+{
+    return 3.0 * radius * radius;
+}
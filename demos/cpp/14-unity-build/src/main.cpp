@@ -0,0 +1,9 @@
+#include <iostream>
+#include "shapes.h"
+
+int main()
+{
+    std::cout << "areas: " << circleArea(1) << " " << squareArea(2) << " "
+              << triangleArea(3, 4) << " " << rectangleArea(2, 5) << std::endl;
+    return 0;
+}
@@ -0,0 +1,6 @@
+#include "shapes.h"
+
+double rectangleArea(double width, double height)
+{
+    return width * height;
+}
@@ -0,0 +1,9 @@
+#ifndef SHAPES_H
+#define SHAPES_H
+
+double circleArea(double radius);
+double squareArea(double side);
+double triangleArea(double base, double height);
+double rectangleArea(double width, double height);
+
+#endif
@@ -0,0 +1,6 @@
+#include "shapes.h"
+
+double squareArea(double side)
+{
+    return side * side;
+}
@@ -0,0 +1,6 @@
+#include "shapes.h"
+
+double triangleArea(double base, double height)
+{
+    return base * height / 2;
+}
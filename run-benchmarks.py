@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Benchmarks of ZenMake's own overhead.
+
+ It generates a synthetic C++ project of configurable size and builds it
+ with a fake toolchain: the fake compiler/linker only writes checksums of
+ its input files into the output file, so the measured time is mostly time
+ of ZenMake and Waf. Results are saved in JSON format and they can be
+ compared with results of another run (another commit):
+
+    ./run-benchmarks.py -o before.json
+    git checkout other-branch
+    ./run-benchmarks.py -o after.json --compare before.json
+
+ It works only on POSIX platforms because the fake toolchain is made of
+ shell scripts.
+"""
+
+import sys
+import os
+import io
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+if sys.hexversion < 0x3060000:
+    raise ImportError('Python >= 3.6 is required')
+
+here = os.path.dirname(os.path.abspath(__file__))
+joinpath = os.path.join
+
+ZENMAKE_PATH = joinpath(here, 'src', 'zenmake')
+RESULTS_FORMAT_VERSION = 1
+
+SCENARIOS = (
+    'configure', 'build', 'noop-build', 'rebuild-one', 'clean', 'test',
+)
+
+# enough for detection of the toolchain as gcc by Waf
+_FAKE_GCC_MACROS = """\
+#define __GNUC__ 10
+#define __GNUC_MINOR__ 0
+#define __GNUC_PATCHLEVEL__ 0
+#define __linux__ 1
+#define __ELF__ 1
+#define __x86_64__ 1
+"""
+
+_FAKE_CXX = """\
+#!/bin/sh
+# fake compiler/linker for benchmarks of ZenMake
+
+for arg in "$@"; do
+    if [ "$arg" = "-dM" ]; then
+        cat <<'EOF'
+%s
+EOF
+        exit 0
+    fi
+done
+
+out=
+prev=
+for arg in "$@"; do
+    case "$arg" in
+        -o?*) out="${arg#-o}" ;;
+        *) [ "$prev" = "-o" ] && out="$arg" ;;
+    esac
+    prev="$arg"
+done
+[ -n "$out" ] || exit 0
+
+{
+    echo '#!/bin/sh'
+    for arg in "$@"; do
+        case "$arg" in
+            -*) ;;
+            *) [ -f "$arg" ] && cksum "$arg" | sed 's/^/# /' ;;
+        esac
+    done
+} > "$out"
+chmod +x "$out"
+""" % _FAKE_GCC_MACROS.rstrip()
+
+_FAKE_AR = """\
+#!/bin/sh
+# fake archiver for benchmarks of ZenMake: ar rcs <target> <objects>
+
+out="$2"
+shift 2
+cksum "$@" > "$out"
+"""
+
+def _writeFile(path, content, executable = False):
+    dirpath = os.path.dirname(path)
+    if not os.path.isdir(dirpath):
+        os.makedirs(dirpath)
+    with io.open(path, 'wt') as file:
+        file.write(content)
+    if executable:
+        os.chmod(path, 0o755)
+
+def generateProject(rootdir, libs, files, tests):
+    """
+    Generate synthetic project with static libraries, an executable
+    and test executables.
+    """
+
+    toolchainDir = joinpath(rootdir, 'fake-toolchain')
+    _writeFile(joinpath(toolchainDir, 'g++'), _FAKE_CXX, True)
+    _writeFile(joinpath(toolchainDir, 'ar'), _FAKE_AR, True)
+
+    _writeFile(joinpath(rootdir, 'include', 'common.h'),
+               '#pragma once\n#include <cstddef>\n#define BENCH_VALUE 1\n')
+
+    tasks = {}
+    for lib in range(libs):
+        name = 'lib%d' % lib
+        for idx in range(files):
+            _writeFile(joinpath(rootdir, name, 'file%d.h' % idx),
+                       '#pragma once\nint %s_func%d();\n' % (name, idx))
+            _writeFile(joinpath(rootdir, name, 'file%d.cpp' % idx),
+                       '#include "common.h"\n#include "file%d.h"\n'
+                       'int %s_func%d() { return BENCH_VALUE + %d; }\n' % \
+                       (idx, name, idx, idx))
+
+        use = sorted(set('lib%d' % x for x in (lib - 1, lib // 2) if 0 <= x < lib))
+        tasks[name] = {
+            'features' : 'cxxstlib',
+            'source' : '%s/*.cpp' % name,
+            'includes' : 'include',
+            'use' : use,
+        }
+
+    _writeFile(joinpath(rootdir, 'app', 'main.cpp'),
+               '#include "common.h"\nint main() { return 0; }\n')
+    tasks['app'] = {
+        'features' : 'cxxprogram',
+        'source' : 'app/*.cpp',
+        'includes' : 'include',
+        'use' : ['lib%d' % x for x in range(libs)],
+    }
+
+    for idx in range(tests):
+        name = 'test%d' % idx
+        _writeFile(joinpath(rootdir, 'tests', '%s.cpp' % name),
+                   '#include "common.h"\nint main() { return 0; }\n')
+        tasks[name] = {
+            'features' : 'cxxprogram test',
+            'source' : 'tests/%s.cpp' % name,
+            'includes' : 'include',
+            'use' : ['lib%d' % (idx % libs)] if libs else [],
+        }
+
+    buildconf = [
+        '# generated by run-benchmarks.py',
+        'tasks = %r' % tasks,
+        'toolchains = %r' % {
+            'fake-c++' : {
+                'kind' : 'auto-c++',
+                'CXX' : 'fake-toolchain/g++',
+                'AR' : 'fake-toolchain/ar',
+            },
+        },
+        'buildtypes = %r' % {
+            'release' : { 'toolchain' : 'fake-c++', 'cxxflags' : '-O2' },
+            'default' : 'release',
+        },
+    ]
+    _writeFile(joinpath(rootdir, 'buildconf.py'), '\n'.join(buildconf) + '\n')
+
+class Runner(object):
+    """ Runs ZenMake commands in the generated project """
+
+    def __init__(self, rootdir, zenmake, jobs, verbose):
+        self.rootdir = rootdir
+        self.zenmake = zenmake
+        self.jobs = jobs
+        self.verbose = verbose
+
+        self.env = dict(os.environ)
+        self.env.update({
+            'ZENMAKE_NO_DAEMON' : '1',
+            'NOCOLOR' : '1',
+        })
+
+    def run(self, *args):
+        """ Run ZenMake command and return wall time of it """
+
+        cmdline = [sys.executable, self.zenmake] + list(args)
+        if args[0] in ('build', 'test'):
+            cmdline.append('--jobs=%d' % self.jobs)
+
+        started = time.perf_counter()
+        proc = subprocess.run(cmdline, cwd = self.rootdir, env = self.env,
+                              stdout = subprocess.PIPE, stderr = subprocess.STDOUT,
+                              universal_newlines = True, check = False)
+        elapsed = time.perf_counter() - started
+
+        if self.verbose:
+            print(proc.stdout)
+        if proc.returncode != 0:
+            print(proc.stdout)
+            raise RuntimeError('Command %r failed' % ' '.join(cmdline))
+        return elapsed
+
+    def removeBuildDir(self):
+        """ Remove the build directory of the project """
+        shutil.rmtree(joinpath(self.rootdir, 'build'), ignore_errors = True)
+
+    def changeOneFile(self, counter):
+        """ Change one source file so that only one object must be rebuilt """
+
+        path = joinpath(self.rootdir, 'lib0', 'file0.cpp')
+        with io.open(path, 'at') as file:
+            file.write('// change %d\n' % counter)
+
+def runScenario(runner, name, repeat):
+    """ Run one scenario 'repeat' times and return list of times """
+
+    times = []
+    for idx in range(repeat):
+        if name == 'configure':
+            runner.removeBuildDir()
+            times.append(runner.run('configure'))
+        elif name == 'build':
+            runner.removeBuildDir()
+            runner.run('configure')
+            times.append(runner.run('build'))
+        elif name == 'noop-build':
+            if idx == 0:
+                runner.run('build')
+            times.append(runner.run('build'))
+        elif name == 'rebuild-one':
+            runner.run('build')
+            runner.changeOneFile(idx)
+            times.append(runner.run('build'))
+        elif name == 'clean':
+            runner.run('build')
+            times.append(runner.run('clean'))
+        elif name == 'test':
+            runner.run('build')
+            times.append(runner.run('test'))
+        else:
+            raise ValueError('Unknown scenario %r' % name)
+
+    return times
+
+def _gitRevision():
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd = here,
+                                         stderr = subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('utf-8').strip()
+
+def _summarize(times):
+    return {
+        'min' : min(times),
+        'median' : statistics.median(times),
+        'mean' : statistics.mean(times),
+        'runs' : times,
+    }
+
+def printResults(results, baseline = None):
+    """ Print results in a table, optionally with comparison """
+
+    header = '%-14s %10s %10s' % ('scenario', 'min, s', 'median, s')
+    if baseline:
+        header += ' %10s %9s' % ('base, s', 'change')
+    print(header)
+    print('-' * len(header))
+
+    baseResults = baseline['results'] if baseline else {}
+    for name, item in results['results'].items():
+        line = '%-14s %10.3f %10.3f' % (name, item['min'], item['median'])
+        base = baseResults.get(name)
+        if base:
+            change = 100.0 * (item['median'] - base['median']) / base['median']
+            line += ' %10.3f %+8.1f%%' % (base['median'], change)
+        print(line)
+
+def main():
+    """ Entry point """
+
+    parser = argparse.ArgumentParser(description = __doc__,
+                        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--libs', type = int, default = 20,
+                        help = 'amount of static libraries (default: %(default)s)')
+    parser.add_argument('--files', type = int, default = 20,
+                        help = 'amount of source files in each library (default: %(default)s)')
+    parser.add_argument('--tests', type = int, default = 5,
+                        help = 'amount of test executables (default: %(default)s)')
+    parser.add_argument('-r', '--repeat', type = int, default = 3,
+                        help = 'amount of runs for each scenario (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type = int, default = os.cpu_count() or 1,
+                        help = 'amount of parallel jobs (default: %(default)s)')
+    parser.add_argument('-s', '--scenarios', default = ','.join(SCENARIOS),
+                        help = 'comma separated list of scenarios (default: %(default)s)')
+    parser.add_argument('-o', '--output', help = 'file to save results in JSON format')
+    parser.add_argument('--compare', help = 'file with results to compare with')
+    parser.add_argument('--zenmake', default = ZENMAKE_PATH,
+                        help = 'path to ZenMake to run (default: %(default)s)')
+    parser.add_argument('--keep', action = 'store_true',
+                        help = 'do not remove the generated project')
+    parser.add_argument('-v', '--verbose', action = 'store_true',
+                        help = 'print output of ZenMake')
+    args = parser.parse_args()
+
+    if os.name != 'posix':
+        print('Benchmarks are supported only on POSIX platforms')
+        return 1
+
+    scenarios = [x.strip() for x in args.scenarios.split(',') if x.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        print('Unknown scenarios: %s' % ', '.join(sorted(unknown)))
+        return 1
+
+    baseline = None
+    if args.compare:
+        with io.open(args.compare, 'rt') as file:
+            baseline = json.load(file)
+
+    rootdir = tempfile.mkdtemp(prefix = 'zm.bench.')
+    try:
+        generateProject(rootdir, args.libs, args.files, args.tests)
+        runner = Runner(rootdir, args.zenmake, args.jobs, args.verbose)
+
+        results = {
+            'format-version' : RESULTS_FORMAT_VERSION,
+            'revision' : _gitRevision(),
+            'python' : platform.python_version(),
+            'platform' : platform.platform(),
+            'params' : {
+                'libs' : args.libs, 'files' : args.files, 'tests' : args.tests,
+                'repeat' : args.repeat, 'jobs' : args.jobs,
+            },
+            'results' : {},
+        }
+
+        for name in scenarios:
+            print('Running %r ...' % name)
+            times = runScenario(runner, name, args.repeat)
+            results['results'][name] = _summarize(times)
+    finally:
+        if args.keep:
+            print('Generated project: %s' % rootdir)
+        else:
+            shutil.rmtree(rootdir, ignore_errors = True)
+
+    if baseline and baseline.get('params') != results['params']:
+        print('Warning: the results to compare were obtained with other params')
+
+    printResults(results, baseline)
+
+    if args.output:
+        with io.open(args.output, 'wt') as file:
+            json.dump(results, file, indent = 2)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
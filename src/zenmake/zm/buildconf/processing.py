@@ -7,8 +7,11 @@
 """
 
 import os
+import sys
 import re
+import types
 import functools
+import multiprocessing
 from collections import defaultdict
 from copy import deepcopy
 
@@ -1070,12 +1073,37 @@ def customToolchains(self):
 
         return _customToolchains
 
+# Min amount of YAML buildconf files in subdirs to load them in a process
+# pool: starting of worker processes costs more than loading of a few files
+_MIN_CONFS_FOR_POOL = 16
+
+# Files are loaded in the main process as well, so one CPU is left for it
+_POOL_WORKERS = (os.cpu_count() or 1) - 1
+
+# Other start methods import the main module of ZenMake in each worker
+_POOL_SUPPORTED = _POOL_WORKERS > 0 and \
+                  'fork' in multiprocessing.get_all_start_methods()
+
+def _loadConf(dirpath, filename):
+    buildconf = loader.load(dirpath, filename)
+    Validator(buildconf).run()
+    return buildconf
+
+def _loadConfData(dirpath, filename):
+    """
+    Load and validate buildconf in a worker process. Module objects
+    can not be pickled so only their attributes are returned.
+    """
+
+    return dict(vars(_loadConf(dirpath, filename)))
+
 class ConfManager(object):
     """
     Class to manage Config instances
     """
 
-    __slots__ = '_clivars', '_clihandler', '_configs', '_virtConfigs', '_orderedConfigs'
+    __slots__ = ('_clivars', '_clihandler', '_configs', '_virtConfigs',
+                 '_orderedConfigs', '_pool', '_toPreload', '_preloaded')
 
     def __init__(self, topdir, clivars, clihandler):
         """
@@ -1088,7 +1116,69 @@ def __init__(self, topdir, clivars, clihandler):
         self._configs = {}
         self._virtConfigs = {}
 
-        self.makeConfig(abspath(topdir))
+        self._pool = None
+        self._toPreload = []
+        self._preloaded = {}
+
+        try:
+            self.makeConfig(abspath(topdir))
+        finally:
+            if self._pool is not None:
+                for future in self._preloaded.values():
+                    future.cancel()
+                self._pool.shutdown()
+                self._pool = None
+            self._preloaded.clear()
+
+    def _preload(self, subdirs):
+        """
+        Start loading and validation of YAML buildconf files from subdirs
+        in a process pool. Python buildconf files can not be passed between
+        processes and they are loaded only in the main process.
+        """
+
+        if not _POOL_SUPPORTED:
+            return
+
+        for dirpath in subdirs:
+            if dirpath in self._configs or dirpath in self._preloaded:
+                continue
+            filename = loader.findConfFile(dirpath)
+            if filename and not filename.endswith('.py'):
+                self._toPreload.append((dirpath, filename))
+
+        if self._pool is None:
+            if len(self._toPreload) < _MIN_CONFS_FOR_POOL:
+                return
+            from concurrent.futures import ProcessPoolExecutor
+            kwargs = {}
+            if sys.version_info >= (3, 7):
+                kwargs['mp_context'] = multiprocessing.get_context('fork')
+            # else 'fork' is the default start method where it's supported
+            self._pool = ProcessPoolExecutor(max_workers = _POOL_WORKERS, **kwargs)
+
+        for dirpath, filename in self._toPreload:
+            if dirpath not in self._configs and dirpath not in self._preloaded:
+                future = self._pool.submit(_loadConfData, dirpath, filename)
+                self._preloaded[dirpath] = future
+        self._toPreload.clear()
+
+    def _getBuildConf(self, dirpath, filename):
+
+        future = self._preloaded.pop(dirpath, None)
+        # it's faster to load it here than to wait for the queue of the pool
+        if future is not None and not future.cancel():
+            try:
+                data = future.result()
+            except Exception: # pylint: disable = broad-except
+                # errors must be reported from this process
+                pass
+            else:
+                buildconf = types.ModuleType('buildconf')
+                vars(buildconf).update(data)
+                return buildconf
+
+        return _loadConf(dirpath, filename)
 
     def makeConfig(self, dirpath, parent = None):
         """
@@ -1108,8 +1198,7 @@ def makeConfig(self, dirpath, parent = None):
                   % relpath(dirpath, CWD)
             raise ZenMakeError(msg)
 
-        buildconf = loader.load(dirpath, filename)
-        Validator(buildconf).run()
+        buildconf = self._getBuildConf(dirpath, filename)
 
         index = len(self._orderedConfigs)
         self._configs[dirpath] = index
@@ -1122,7 +1211,9 @@ def makeConfig(self, dirpath, parent = None):
         if startdir != dirpath:
             self._virtConfigs[startdir] = index
 
-        for subdir in bconf.subdirs:
+        subdirs = bconf.subdirs
+        self._preload(subdirs)
+        for subdir in subdirs:
             if subdir in self._configs:
                 # skip circular dependencies
                 continue
@@ -345,6 +345,10 @@ def _genCliOptionsVarsScheme(confnode, fullkey):
     'normalize-target-name' : { 'type': 'bool' },
     'enabled'       : { 'type': 'bool' },
     'objfile-index' : { 'type': 'int' },
+    'dep-scanner' : { 'type': 'str', 'allowed' : ('python', 'compiler') },
+    'unity-build' : { 'type': ('bool', 'int') },
+    'pch' : { 'type': 'str' },
+    'batch-compile' : { 'type': ('bool', 'int') },
 }
 
 ############ EXTEND TASK PARAMS
@@ -443,13 +447,34 @@ def _applyExportAndSelectedTaskParams():
                 'type': ('str', 'list-of-strs'),
                 'traits': ['list-of-paths'],
             },
-            'hash-algo' : { 'type': 'str', 'allowed' : ('sha1', 'md5') },
+            'monitor-files-stat' : { 'type': 'bool' },
+            'hash-algo' : {
+                'type': 'str',
+                'allowed' : ('sha1', 'md5', 'blake2b', 'blake2s', 'xxh3'),
+            },
+            'hash-mode' : {
+                'type': 'str',
+                'allowed': ('content', 'stat-then-content'),
+            },
             'db-format' : {
                 'type': 'str',
-                'allowed': ('py', 'pickle', 'msgpack'),
+                'allowed': ('py', 'pickle', 'msgpack', 'sharded', 'indexed'),
             },
             'provide-edep-targets' : { 'type': 'bool' },
             'build-work-dir-name' : { 'type': 'str' },
+            'build-cache' : {
+                'type': ('bool', 'str', 'dict'),
+                'allow-unknown-keys' : False,
+                'dict-vars' : {
+                    'dir' : { 'type': 'str' },
+                    'max-size' : { 'type': ('int', 'str') },
+                    'url' : { 'type': 'str' },
+                    'upload' : { 'type': 'bool' },
+                },
+            },
+            'glob-index' : { 'type': 'bool' },
+            'jobserver' : { 'type': 'bool' },
+            'fast-partial' : { 'type': 'bool' },
         },
     },
     'cliopts' : {
@@ -0,0 +1,123 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Protocol of the remote build cache. It's used by the client in
+ zm.waf.buildcache and by the reference server in zm.cacheserver.
+
+ The protocol is plain HTTP/1.1 with persistent connections:
+
+    POST /v1/exists        JSON body {"keys": [key, ...]}. The answer is
+                           JSON {"found": [key, ...]} with existing keys.
+    GET  /v1/objects/<key> Download an entry. The answer is 200 with the
+                           entry as the body or 404 if there is no entry.
+    PUT  /v1/objects/<key> Upload an entry as the body. The answer is 201 if
+                           the entry is stored or 200 if it exists already.
+
+ Key is a hex string. Entry is all output files of one build task in one
+ stream: header (magic, amount of files, size and permission bits of each
+ file) and then content of the files one by one. So an entry can be
+ streamed without knowing anything about it except the header.
+"""
+
+import os
+import re
+import struct
+
+PROTOCOL_PREFIX = '/v1'
+EXISTS_PATH = PROTOCOL_PREFIX + '/exists'
+OBJECTS_PATH = PROTOCOL_PREFIX + '/objects/'
+
+# max amount of keys in one 'exists' request
+MAX_EXISTS_KEYS = 10000
+
+CHUNK_SIZE = 256 * 1024
+
+_ENTRY_MAGIC = b'ZMCE'
+_ENTRY_HEADER = struct.Struct('<4sI')
+_ENTRY_FILEINFO = struct.Struct('<QI')
+
+_RE_KEY = re.compile(r'^[0-9a-f]{8,128}$')
+
+def isValidKey(key):
+    """ Return True if the key can be used in the protocol """
+    return bool(_RE_KEY.match(key))
+
+def gatherEntries(dirpath):
+    """
+    Gather entries of a cache directory where entries are stored in
+    subdirectories named by the first two chars of their keys. An entry can
+    be a file or a directory with files. Temporary entries are skipped.
+    Returns tuple (list of tuples (mtime, size, path), total size).
+    """
+
+    entries = []
+    totalSize = 0
+    for subdir in os.scandir(dirpath):
+        if not subdir.is_dir():
+            continue
+        for entry in os.scandir(subdir.path):
+            if entry.name.endswith('.tmp'):
+                continue
+            stat = entry.stat()
+            size = stat.st_size
+            if entry.is_dir():
+                size = sum(x.stat().st_size for x in os.scandir(entry.path))
+            entries.append((stat.st_mtime, size, entry.path))
+            totalSize += size
+
+    return entries, totalSize
+
+def packEntryHeader(fileInfo):
+    """
+    Make header of an entry for files with list of tuples (size, mode)
+    """
+
+    header = _ENTRY_HEADER.pack(_ENTRY_MAGIC, len(fileInfo))
+    return header + b''.join(_ENTRY_FILEINFO.pack(*x) for x in fileInfo)
+
+def readEntryHeader(read):
+    """
+    Read header of an entry with the function read(size).
+    Returns list of tuples (size, mode) for each file.
+    """
+
+    data = read(_ENTRY_HEADER.size)
+    if len(data) != _ENTRY_HEADER.size:
+        raise ValueError('Truncated entry')
+    magic, count = _ENTRY_HEADER.unpack(data)
+    if magic != _ENTRY_MAGIC:
+        raise ValueError('Invalid entry')
+
+    size = count * _ENTRY_FILEINFO.size
+    data = read(size)
+    if len(data) != size:
+        raise ValueError('Truncated entry')
+    return list(_ENTRY_FILEINFO.iter_unpack(data))
+
+def entryChunks(paths):
+    """
+    Generate entry for the files as a sequence of chunks.
+    Returns tuple (total size, generator).
+    """
+
+    fileInfo = []
+    for path in paths:
+        stat = os.stat(path)
+        fileInfo.append((stat.st_size, stat.st_mode & 0o777))
+    header = packEntryHeader(fileInfo)
+
+    def generate():
+        yield header
+        for path in paths:
+            with open(path, 'rb') as file:
+                while True:
+                    chunk = file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+
+    return len(header) + sum(x[0] for x in fileInfo), generate()
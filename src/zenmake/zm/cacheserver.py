@@ -0,0 +1,279 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Implementation of the command 'cacheserver' that is a reference server
+ of the protocol of the remote build cache (see zm.cacheproto).
+"""
+
+import os
+import json
+import time
+import shutil
+import socketserver
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from zm.cmd import Command as _Command
+from zm.error import ZenMakeError
+from zm.cacheproto import EXISTS_PATH, OBJECTS_PATH, MAX_EXISTS_KEYS, CHUNK_SIZE
+from zm.cacheproto import isValidKey, readEntryHeader, gatherEntries
+from zm import log
+
+joinpath = os.path.join
+
+DEFAULT_BIND = '127.0.0.1:8090'
+
+_TRIM_INTERVAL = 60
+
+class _RequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args): # pylint: disable = redefined-builtin
+        log.debug('cacheserver: ' + format % args)
+
+    def _sendReply(self, code, body = b'', contentType = 'text/plain'):
+        self.send_response(code)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _readBody(self, dst = None):
+        size = int(self.headers.get('Content-Length', 0))
+        if dst is None:
+            return self.rfile.read(size)
+
+        while size > 0:
+            chunk = self.rfile.read(min(size, CHUNK_SIZE))
+            if not chunk:
+                raise EOFError('Connection closed')
+            dst.write(chunk)
+            size -= len(chunk)
+        return None
+
+    def _objectKey(self):
+        if not self.path.startswith(OBJECTS_PATH):
+            return None
+        key = self.path[len(OBJECTS_PATH):]
+        return key if isValidKey(key) else None
+
+    def do_POST(self): # pylint: disable = invalid-name
+        """ Handle POST request """
+
+        if self.path != EXISTS_PATH:
+            self._readBody()
+            self._sendReply(404)
+            return
+
+        try:
+            keys = json.loads(self._readBody().decode('utf-8'))['keys']
+        except (ValueError, KeyError, TypeError):
+            self._sendReply(400)
+            return
+        if not isinstance(keys, list) or len(keys) > MAX_EXISTS_KEYS:
+            self._sendReply(400)
+            return
+
+        storage = self.server.storage
+        found = [x for x in keys if isinstance(x, str) and storage.exists(x)]
+        body = json.dumps({ 'found' : found }).encode('utf-8')
+        self._sendReply(200, body, 'application/json')
+
+    def do_GET(self): # pylint: disable = invalid-name
+        """ Handle GET request """
+
+        key = self._objectKey()
+        file = self.server.storage.open(key) if key else None
+        if file is None:
+            self._sendReply(404)
+            return
+
+        with file:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(os.fstat(file.fileno()).st_size))
+            self.end_headers()
+            shutil.copyfileobj(file, self.wfile, CHUNK_SIZE)
+
+    def do_PUT(self): # pylint: disable = invalid-name
+        """ Handle PUT request """
+
+        key = self._objectKey()
+        if key is None:
+            self._readBody()
+            self._sendReply(400)
+            return
+
+        storage = self.server.storage
+        if storage.exists(key):
+            self._readBody(_NullWriter)
+            self._sendReply(200)
+            return
+
+        if not storage.put(key, self._readBody):
+            self._sendReply(400)
+            return
+        self._sendReply(201)
+
+class _NullWriter(object):
+
+    @staticmethod
+    def write(_):
+        """ Write nothing """
+
+class Storage(object):
+    """
+    Directory with entries of the remote build cache. Each entry is
+    stored in one file and the least recently used entries are removed
+    when the total size is bigger than maxSize.
+    """
+
+    __slots__ = ('dirpath', 'maxSize', '_lock', '_lastTrim')
+
+    def __init__(self, dirpath, maxSize = None):
+        self.dirpath = dirpath
+        self.maxSize = maxSize
+        self._lock = threading.Lock()
+        self._lastTrim = 0
+
+        if not os.path.isdir(dirpath):
+            os.makedirs(dirpath)
+
+    def _entryPath(self, key):
+        return joinpath(self.dirpath, key[:2], key)
+
+    def exists(self, key):
+        """ Return True if the entry exists """
+        return isValidKey(key) and os.path.isfile(self._entryPath(key))
+
+    def open(self, key):
+        """ Open entry for reading or return None if it doesn't exist """
+
+        path = self._entryPath(key)
+        try:
+            file = open(path, 'rb') # pylint: disable = consider-using-with
+        except EnvironmentError:
+            return None
+        try:
+            # mark as recently used
+            os.utime(path)
+        except EnvironmentError:
+            pass
+        return file
+
+    def put(self, key, readBody):
+        """
+        Store entry with readBody(file). Returns False if the entry is invalid.
+        """
+
+        path = self._entryPath(key)
+        dirpath = os.path.dirname(path)
+        if not os.path.isdir(dirpath):
+            os.makedirs(dirpath, exist_ok = True)
+
+        tmpPath = '%s.%d.tmp' % (path, threading.get_ident())
+        try:
+            with open(tmpPath, 'w+b') as file:
+                readBody(file)
+                size = file.tell()
+                file.seek(0)
+                fileInfo = readEntryHeader(file.read)
+                if file.tell() + sum(x[0] for x in fileInfo) != size:
+                    raise ValueError('Invalid entry size')
+            os.replace(tmpPath, path)
+        except ValueError:
+            os.remove(tmpPath)
+            return False
+        except:
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+            raise
+
+        self._trimIfNeeded()
+        return True
+
+    def _trimIfNeeded(self):
+
+        if not self.maxSize:
+            return
+
+        with self._lock:
+            now = time.time()
+            if now - self._lastTrim < _TRIM_INTERVAL:
+                return
+            self._lastTrim = now
+
+            entries, totalSize = gatherEntries(self.dirpath)
+
+            if totalSize <= self.maxSize:
+                return
+
+            entries.sort()
+            for _, size, path in entries:
+                try:
+                    os.remove(path)
+                except EnvironmentError:
+                    continue
+                totalSize -= size
+                if totalSize <= self.maxSize:
+                    break
+
+class Server(socketserver.ThreadingMixIn, HTTPServer):
+    """
+    Reference HTTP server of the remote build cache
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, storage):
+        super().__init__(address, _RequestHandler)
+        self.storage = storage
+
+def parseBindAddress(value):
+    """
+    Convert value like 'host:port' or 'port' into tuple (host, port)
+    """
+
+    host, _, port = value.rpartition(':')
+    if not host:
+        host = DEFAULT_BIND.rpartition(':')[0]
+    try:
+        return host, int(port)
+    except ValueError as ex:
+        raise ZenMakeError("Invalid address to bind: %r" % value) from ex
+
+class Command(_Command):
+    """
+    Run reference server of the remote build cache.
+    It's implementation of command 'cacheserver'.
+    """
+
+    def _run(self, cliArgs):
+
+        # it's imported here to avoid loading of Waf for the protocol
+        from zm.waf.buildcache import defaultCacheDir, parseSize
+
+        dirpath = cliArgs.cacheDir
+        if not dirpath:
+            dirpath = joinpath(defaultCacheDir(), 'server')
+        dirpath = os.path.abspath(os.path.expanduser(dirpath))
+        maxSize = parseSize(cliArgs.maxSize) if cliArgs.maxSize else None
+
+        address = parseBindAddress(cliArgs.bind or DEFAULT_BIND)
+        server = Server(address, Storage(dirpath, maxSize))
+        self._info("Cache server is listening on http://%s:%d/ with dir %r" % \
+                   (server.server_address[0], server.server_address[1], dirpath))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
@@ -96,6 +96,19 @@ def __init__(self, *args, **kwargs):
         name = 'uninstall',
         description = 'removes the targets installed',
     ),
+    Command(
+        name = 'daemon',
+        description = 'run server to keep the project warm between runs of %s' % APPNAME,
+    ),
+    Command(
+        name = 'watch',
+        description = 'watch changes in the project and run build/test/run on them',
+        usageTextTempl = "%s [options] [build|test|run [args]] [-- program args]",
+    ),
+    Command(
+        name = 'cacheserver',
+        description = 'run reference server of the remote build cache',
+    ),
     Command(
         name = 'zipapp',
         description = 'make executable zip archive of %s' % APPNAME,
@@ -141,6 +154,13 @@ class PosArg(_AutoDict):
         help = 'set task name from buildconf or target name',
         commands = ['run',],
     ),
+    PosArg(
+        name = 'cmdArgs',
+        nargs = argparse.REMAINDER,
+        metavar = 'command',
+        help = "command 'build', 'test' or 'run' with its args, 'build' by default",
+        commands = ['watch',],
+    ),
 ]
 
 class Option(_AutoDict):
@@ -222,12 +242,39 @@ def __init__(self, *args, **kwargs):
         commands = ['build', 'test', 'run', 'install'],
         help = 'amount of parallel jobs',
     ),
+    Option(
+        names = ['--max-load'],
+        dest = 'maxLoad',
+        type = float,
+        commands = ['build', 'test', 'run', 'install'],
+        help = "don't start new tasks if the load average is above this value",
+    ),
+    Option(
+        names = ['--min-free-mem'],
+        dest = 'minFreeMem',
+        commands = ['build', 'test', 'run', 'install'],
+        help = "don't start new tasks if available memory is below this "
+               "value like '1G'",
+    ),
+    Option(
+        names = ['--link-mem'],
+        dest = 'linkMem',
+        commands = ['build', 'test', 'run', 'install'],
+        help = "memory to reserve for each running link task like '2G'",
+    ),
     Option(
         names = ['-p', '--progress'],
         action = "store_true",
         commands = ['build', 'test', 'run', 'install', 'uninstall'],
         help = 'progress bar',
     ),
+    Option(
+        names = ['--critical-path'],
+        dest = 'criticalPath',
+        action = "store_true",
+        commands = ['build', 'test'],
+        help = 'print critical path of executed build tasks',
+    ),
     Option(
         names = ['-f', '--force'],
         action = "store_true",
@@ -259,6 +306,35 @@ def __init__(self, *args, **kwargs):
         commands = ['zipapp', 'install', 'uninstall'],
         help = 'destination directory',
     ),
+    Option(
+        names = ['--stop'],
+        action = "store_true",
+        commands = ['daemon'],
+        help = 'stop running daemon for the current directory',
+    ),
+    Option(
+        names = ['--poll'],
+        action = "store_true",
+        commands = ['watch'],
+        help = 'detect changes by polling instead of inotify',
+    ),
+    Option(
+        names = ['--bind'],
+        commands = ['cacheserver'],
+        help = "address to listen on as 'host:port' (default: 127.0.0.1:8090)",
+    ),
+    Option(
+        names = ['--cache-dir'],
+        dest = 'cacheDir',
+        commands = ['cacheserver'],
+        help = 'directory to store entries of the cache',
+    ),
+    Option(
+        names = ['--max-size'],
+        dest = 'maxSize',
+        commands = ['cacheserver'],
+        help = "max size of the cache like '500M' or '10G'",
+    ),
     Option(
         names = ['-v', '--verbose'],
         action = "count",
@@ -0,0 +1,356 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Implementation of the 'daemon' command. The daemon is a long-lived local
+ server that keeps a project warm between runs of ZenMake: all python modules
+ are loaded, processed buildconf files are kept in memory as well as
+ the ZenMake tasks db and the Waf build state. Each served command is run
+ in a forked process and therefore it cannot spoil the state of the daemon.
+"""
+
+import os
+import sys
+import signal
+import socket
+import traceback
+
+from zm.constants import CWD
+from zm.pyutils import struct
+from zm.autodict import AutoDict
+from zm.cmd import Command as _Command
+from zm.error import ZenMakeError
+from zm import log, utils, error, cli, db, daemonconn
+
+joinpath = os.path.join
+
+# Only these commands are served by the daemon, other commands are run
+# by the client itself.
+_SERVED_CMDS = frozenset(('build', 'test', 'run'))
+
+_PreparedCmd = struct('_PreparedCmd', 'cmd, bconfManager, monit')
+
+def _exitCode(code):
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    return 1
+
+def loadModules():
+    """ Load all modules that are needed to run served commands """
+
+    # pylint: disable = unused-import
+    # the same order of loading as in zm.starter
+    from zm import features
+    from zm.waf import launcher, wrappers, build
+    wrappers.setUp()
+
+def makeMonitSnapshot(bconfManager):
+    """
+    Make object with the same monitored files as the autoconfig feature
+    uses to detect changes in these files with assist.areMonitoredFilesChanged.
+    """
+
+    monitfiles = [x.path for x in bconfManager.configs]
+    for bconf in bconfManager.configs:
+        files = bconf.general.get('monitor-files')
+        if files:
+            monitfiles.extend(files.abspaths())
+    monitfiles = sorted(set(monitfiles))
+
+    return AutoDict(
+        monitfiles = monitfiles,
+        monitstats = utils.statFiles(monitfiles),
+        monithashes = { path: utils.hashFile(path) for path in monitfiles },
+    )
+
+def prepareCmd(argv):
+    """
+    Process CLI and buildconf files for the command line.
+    Returns None if the command must not be served.
+    """
+
+    from zm.waf import launcher
+    from zm.buildconf.processing import ConfManager as BuildConfManager
+    from zm.starter import handleCLI, findTopLevelBuildConfDir
+
+    bconfDir = findTopLevelBuildConfDir(CWD)
+    if bconfDir is None:
+        return None
+
+    cmd = handleCLI(argv, False, None, CWD)
+    if cmd.name not in _SERVED_CMDS:
+        return None
+
+    def cliOptsHandler(defaults):
+        return handleCLI(argv, False, defaults, CWD)
+
+    bconfManager = BuildConfManager(bconfDir, clivars = cmd.args,
+                                    clihandler = cliOptsHandler)
+    cmd = cli.selected
+
+    # load and prepare all needed modules
+    launcher.loadFeatureModules(bconfManager)
+
+    return _PreparedCmd(cmd = cmd, bconfManager = bconfManager,
+                        monit = makeMonitSnapshot(bconfManager))
+
+def applyGlobals(prepared):
+    """ Set global state of ZenMake for the prepared command """
+
+    cmd = prepared.cmd
+    cli.selected = cmd
+    error.verbose = cmd.args.verbose
+
+    bconf = prepared.bconfManager.root
+    utils.setDefaultHashAlgo(bconf.general['hash-algo'])
+    db.useformat(bconf.general['db-format'])
+
+def runInChild(prepared):
+    """
+    Run the prepared command in a forked process. Returns exit code.
+    """
+
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    retcode = 0
+    try:
+        log.enableColorsByCli(prepared.cmd.args.color)
+        from zm.waf import launcher
+        launcher.run(prepared.cmd, prepared.bconfManager)
+    except SystemExit as ex:
+        retcode = _exitCode(ex.code)
+    except KeyboardInterrupt:
+        log.pprint('RED', 'Interrupted')
+        retcode = 68
+    except BaseException: # pylint: disable = broad-except
+        traceback.print_exc(file = sys.stdout)
+        retcode = 2
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    return retcode
+
+def warmUp(prepared):
+    """
+    Load ZenMake tasks db and Waf build state into memory for the next
+    run of the prepared command.
+    """
+
+    from zm.waf.assist import makeTasksCachePath
+    from zm.waf.build import preloadBuildState
+
+    bconf = prepared.bconfManager.root
+    buildtype = bconf.selectedBuildType
+    bconfPaths = bconf.confPaths
+
+    db.preload(makeTasksCachePath(bconfPaths.zmcachedir, buildtype))
+
+    preloadBuildState(joinpath(bconfPaths.buildout, buildtype))
+
+class Server(object):
+    """
+    Server of the ZenMake daemon for the working directory
+    """
+
+    __slots__ = (
+        '_workdir', '_sockpath', '_sock', '_prepared', '_stopped', '_warmUpNext',
+    )
+
+    def __init__(self, workdir):
+        self._workdir = workdir
+        self._sockpath = daemonconn.socketPath(workdir)
+        self._sock = None
+        self._prepared = {}
+        self._stopped = False
+        self._warmUpNext = None
+
+    def _bind(self):
+
+        sockpath = self._sockpath
+        if not daemonconn.makeSocketDir(sockpath):
+            raise ZenMakeError("Directory %r for the daemon socket must be "
+                               "owned by the current user and must not be "
+                               "accessible by other users" % \
+                               os.path.dirname(sockpath))
+
+        # remove stale socket file
+        try:
+            os.remove(sockpath)
+        except OSError:
+            pass
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(sockpath)
+        os.chmod(sockpath, 0o600)
+        sock.listen(8)
+        self._sock = sock
+
+    def _prepareCmd(self, argv):
+        """
+        Get prepared command for the command line from the cache or make it.
+        Returns None if the command must not be served.
+        """
+
+        from zm.waf import assist
+
+        key = (tuple(argv), tuple(sorted(os.environ.items())))
+        prepared = self._prepared.get(key)
+        if prepared is not None:
+            if not assist.areMonitoredFilesChanged(prepared.monit):
+                return prepared
+            del self._prepared[key]
+
+        prepared = prepareCmd(argv)
+        if prepared is not None:
+            self._prepared[key] = prepared
+        return prepared
+
+    def _execute(self, conn, prepared):
+
+        pid = os.fork()
+        if pid == 0:
+            # child process
+            self._sock.close()
+            conn.close()
+            os._exit(runInChild(prepared)) # pylint: disable = protected-access
+
+        status = None
+        while status is None:
+            donePid, _status = os.waitpid(pid, os.WNOHANG)
+            if donePid:
+                status = _status
+            elif daemonconn.isClientGone(conn, 0.05):
+                os.kill(pid, signal.SIGINT)
+                status = os.waitpid(pid, 0)[1]
+
+        if os.WIFEXITED(status):
+            return os.WEXITSTATUS(status)
+        return 1
+
+    def _serveCmd(self, conn, request, fds):
+
+        savedFds = [os.dup(x) for x in (0, 1, 2)]
+        prepared = None
+        try:
+            for i, fd in enumerate(fds[:3]):
+                os.dup2(fd, i)
+
+            env = os.environ
+            env.clear()
+            env.update(request['env'])
+
+            try:
+                prepared = self._prepareCmd(request['argv'])
+            except SystemExit as ex:
+                # for example: 'help' was requested
+                return { 'status' : 'done', 'retcode' : _exitCode(ex.code) }
+            except ZenMakeError as ex:
+                if ex.fullmsg and error.verbose > 1:
+                    log.pprint('RED', ex.fullmsg)
+                log.error(ex.msg)
+                return { 'status' : 'done', 'retcode' : 1 }
+
+            if prepared is None:
+                return { 'status' : 'declined' }
+
+            applyGlobals(prepared)
+            retcode = self._execute(conn, prepared)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            for i, fd in enumerate(savedFds):
+                os.dup2(fd, i)
+                os.close(fd)
+            for fd in fds:
+                os.close(fd)
+
+        self._warmUpNext = prepared
+        return { 'status' : 'done', 'retcode' : retcode }
+
+    def _handle(self, conn):
+
+        request, fds = daemonconn.recvMsg(conn, withFds = True)
+        if request.get('stop'):
+            self._stopped = True
+            for fd in fds:
+                os.close(fd)
+            return { 'status' : 'stopped' }
+
+        if len(fds) < 3:
+            for fd in fds:
+                os.close(fd)
+            return { 'status' : 'declined' }
+
+        return self._serveCmd(conn, request, fds)
+
+    def run(self):
+        """ Run server loop until it's stopped """
+
+        loadModules()
+        self._bind()
+        log.info("ZenMake daemon is listening on %r" % self._sockpath)
+
+        try:
+            while not self._stopped:
+                conn, _ = self._sock.accept()
+                with conn:
+                    # pylint: disable = broad-except
+                    try:
+                        reply = self._handle(conn)
+                    except (EOFError, OSError, ValueError):
+                        continue
+                    except Exception:
+                        traceback.print_exc(file = sys.stdout)
+                        reply = { 'status' : 'declined' }
+                    try:
+                        daemonconn.sendMsg(conn, reply)
+                    except OSError:
+                        pass
+
+                prepared, self._warmUpNext = self._warmUpNext, None
+                if prepared is not None:
+                    # it's done after the reply to the client to
+                    # not make the client wait for it
+                    warmUp(prepared)
+        finally:
+            self._sock.close()
+            try:
+                os.remove(self._sockpath)
+            except OSError:
+                pass
+
+        log.info("ZenMake daemon is stopped")
+
+class Command(_Command):
+    """
+    Run/stop ZenMake daemon.
+    It's implementation of command 'daemon'.
+    """
+
+    def _run(self, cliArgs):
+
+        if not daemonconn.DAEMON_SUPPORTED:
+            log.error("The 'daemon' command is not supported on this platform")
+            return 1
+
+        if cliArgs.stop:
+            if not daemonconn.stopDaemon(CWD):
+                self._warn("There is no running daemon for %r" % CWD)
+            return 0
+
+        if daemonconn.stopDaemon(CWD):
+            self._info("Previous daemon for %r has been stopped" % CWD)
+
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        try:
+            Server(CWD).run()
+        except KeyboardInterrupt:
+            pass
+        return 0
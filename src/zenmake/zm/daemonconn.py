@@ -0,0 +1,210 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Client side and protocol of the ZenMake daemon (see zm.daemon).
+ This module must use only the python standard library because it is
+ imported before anything else to make the start of the client as fast as
+ possible.
+"""
+
+import os
+import sys
+import stat
+import json
+import struct
+import socket
+import select
+from hashlib import sha1
+
+joinpath = os.path.join
+
+DAEMON_SUPPORTED = hasattr(socket, 'AF_UNIX') and hasattr(os, 'fork')
+
+_HEADER = struct.Struct('!I')
+_FDS_AMOUNT = 3
+
+def _runtimeDir():
+    path = os.environ.get('XDG_RUNTIME_DIR')
+    if not path or not os.path.isdir(path):
+        import tempfile
+        path = tempfile.gettempdir()
+    return joinpath(path, 'zenmake-%d' % os.getuid())
+
+def isSafeSocketDir(path):
+    """
+    Return True if the directory for daemon sockets is a real directory
+    owned by the current user and not accessible by other users.
+    Otherwise another local user could replace the socket and receive
+    the environment and the standard fds of the client.
+    """
+
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        return False
+    return not st.st_mode & 0o077
+
+def makeSocketDir(sockpath):
+    """
+    Make directory for the daemon socket path if it doesn't exist.
+    Returns True if the directory is safe to use (see isSafeSocketDir).
+    """
+
+    path = os.path.dirname(sockpath)
+    try:
+        os.makedirs(path, mode = 0o700, exist_ok = True)
+    except OSError:
+        return False
+    return isSafeSocketDir(path)
+
+def socketPath(workdir):
+    """
+    Get path of the daemon unix socket for the selected working directory.
+    A socket path has limited length and therefore it's not placed in
+    the workdir.
+    """
+
+    name = sha1(workdir.encode('utf-8')).hexdigest()[:20]
+    return joinpath(_runtimeDir(), name + '.sock')
+
+def sendMsg(sock, data, fds = None):
+    """
+    Send dict data as a message with optional file descriptors
+    """
+
+    payload = json.dumps(data).encode('utf-8')
+    payload = _HEADER.pack(len(payload)) + payload
+    if fds:
+        import array
+        ancdata = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))]
+        sent = sock.sendmsg([payload], ancdata)
+        payload = payload[sent:]
+    if payload:
+        sock.sendall(payload)
+
+def _recvExactly(sock, size, buff = b''):
+    while len(buff) < size:
+        chunk = sock.recv(size - len(buff))
+        if not chunk:
+            raise EOFError('Connection closed')
+        buff += chunk
+    return buff
+
+def recvMsg(sock, withFds = False):
+    """
+    Receive a message sent by sendMsg. Returns tuple (data, fds).
+    """
+
+    fds = []
+    buff = b''
+    if withFds:
+        import array
+        fdsArr = array.array('i')
+        buff, ancdata, _, _ = sock.recvmsg(
+            _HEADER.size, socket.CMSG_LEN(_FDS_AMOUNT * fdsArr.itemsize))
+        if not buff:
+            raise EOFError('Connection closed')
+        for level, kind, data in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                data = data[:len(data) - (len(data) % fdsArr.itemsize)]
+                fdsArr.frombytes(data)
+        fds = list(fdsArr)
+
+    header = _recvExactly(sock, _HEADER.size, buff)
+    size = _HEADER.unpack(header)[0]
+    payload = _recvExactly(sock, size)
+    return json.loads(payload.decode('utf-8')), fds
+
+def _connect(workdir):
+    sockpath = socketPath(workdir)
+    if not isSafeSocketDir(os.path.dirname(sockpath)):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(sockpath)
+    except (OSError, socket.error):
+        sock.close()
+        return None
+    return sock
+
+def runByDaemon(argv, workdir = None):
+    """
+    Try to run ZenMake command by a running daemon for the workdir.
+    Returns exit code of the command or None if there is no running daemon
+    or the daemon has declined the command.
+    """
+
+    if not DAEMON_SUPPORTED:
+        return None
+
+    env = os.environ
+    if env.get('ZENMAKE_NO_DAEMON') or env.get('ZENMAKE_TESTING_MODE'):
+        return None
+
+    if workdir is None:
+        workdir = os.getcwd()
+
+    sock = _connect(workdir)
+    if sock is None:
+        return None
+
+    request = { 'argv' : list(argv), 'env' : dict(env) }
+
+    # make sure that nothing stays in python buffers before sharing of fds
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    with sock:
+        try:
+            sendMsg(sock, request, [0, 1, 2])
+            reply, _ = recvMsg(sock)
+        except KeyboardInterrupt:
+            # closed connection tells the daemon to interrupt the command
+            return 68
+        except (EOFError, OSError, ValueError):
+            return None
+
+    if reply.get('status') != 'done':
+        return None
+    return reply.get('retcode', 1)
+
+def stopDaemon(workdir):
+    """
+    Stop running daemon for the workdir. Returns True if it was stopped.
+    """
+
+    if not DAEMON_SUPPORTED:
+        return False
+
+    sock = _connect(workdir)
+    if sock is None:
+        return False
+
+    with sock:
+        try:
+            sendMsg(sock, { 'stop' : True })
+            reply, _ = recvMsg(sock)
+        except (EOFError, OSError, ValueError):
+            return False
+    return reply.get('status') == 'stopped'
+
+def isClientGone(sock, timeout = 0):
+    """
+    Return True if the client of the socket has closed connection.
+    It waits for the timeout in seconds if there is nothing to read.
+    """
+
+    readable = select.select([sock], [], [], timeout)[0]
+    if not readable:
+        return False
+    try:
+        return not sock.recv(1, socket.MSG_PEEK)
+    except OSError:
+        return True
@@ -8,12 +8,15 @@
 
 import os
 import io
+import mmap
+import struct
 import pickle
+from collections.abc import Mapping, MutableMapping
 
 from waflib import ConfigSet
 from zm.constants import PLATFORM
 from zm.pyutils import texttype, PY_MAJOR_VER
-from zm.utils import configSetToDict
+from zm.utils import configSetToDict, statFile
 
 _MSGPACK_EXISTS = False
 try:
@@ -238,8 +241,241 @@ def __init__(self, pathname, extension = None):
             extension = '.msgpack' if extension is None else extension
             super().__init__(pathname, module, extension, **_MSGPACK_ARGS)
 
+_INDEXEDDB_MAGIC = b'ZMIDX\x00\x00\x01'
+# magic, offset of index, size of index
+_INDEXEDDB_HEADER = struct.Struct('<8sQQ')
+
+class LazyDict(MutableMapping):
+    """
+    Dict-like object to get values from IndexedDBFile. Each value is
+    deserialized on first access.
+    """
+
+    __slots__ = ('_buff', '_locs', '_loaded')
+
+    def __init__(self, buff, locs):
+        self._buff = buff
+        # {key: (offset, size)} or {key: None} for values set after loading
+        self._locs = locs
+        self._loaded = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._loaded[key]
+        except KeyError:
+            pass
+
+        offset, size = self._locs[key]
+        value = pickle.loads(self._buff[offset:offset + size])
+        self._loaded[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._loaded[key] = value
+        self._locs.setdefault(key, None)
+
+    def __delitem__(self, key):
+        del self._locs[key]
+        self._loaded.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._locs
+
+    def __iter__(self):
+        return iter(self._locs)
+
+    def __len__(self):
+        return len(self._locs)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __reduce__(self):
+        return (dict, (dict(self.items()), ))
+
+    def copy(self):
+        """ Make dict with all the items """
+        return dict(self.items())
+
+class IndexedDBFile(DBFile):
+    """
+    Implemetation of DBFile to save/load python dicts in indexed binary format.
+    Each value of the top-level dicts is stored as a separate pickled record
+    and the index of records is stored at the end of the file. Dicts from
+    the top level are loaded as LazyDict objects where values are
+    deserialized only on demand from the memory-mapped file.
+    Saving appends only changed records and a new index to the existing file.
+    The file is rewritten completely only if there are too many unused
+    records in it.
+    Not thread safe
+    """
+
+    __slots__ = ()
+
+    def __init__(self, pathname, extension = None):
+        extension = '.zmidx' if extension is None else extension
+        extension = _BINDB_FILEEXT_FORMAT % extension
+        super().__init__(pathname, extension)
+
+    @staticmethod
+    def _readIndex(buff):
+
+        magic, offset, size = _INDEXEDDB_HEADER.unpack_from(buff)
+        if magic != _INDEXEDDB_MAGIC:
+            raise ValueError('Invalid format of db file')
+        return pickle.loads(buff[offset:offset + size])
+
+    def _openBuffer(self):
+
+        with open(self._pathname, 'rb') as file:
+            if PLATFORM == 'windows':
+                # mapped file cannot be replaced/removed on Windows
+                return file.read()
+            return mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+    def _save(self, data):
+        """ Save to file """
+
+        try:
+            oldBuff = self._openBuffer()
+            oldIndex = self._readIndex(oldBuff)
+            fileSize = len(oldBuff)
+        except (EnvironmentError, ValueError, struct.error):
+            oldBuff, oldIndex, fileSize = None, None, 0
+
+        newRecords = []
+        newSize = fileSize if oldIndex else _INDEXEDDB_HEADER.size
+
+        def putRecord(value, oldLoc):
+            nonlocal newSize
+            dump = pickle.dumps(value, _PICKLE_PROTOCOL)
+            if oldLoc is not None:
+                offset, size = oldLoc
+                if oldBuff[offset:offset + size] == dump:
+                    return oldLoc
+            loc = (newSize, len(dump))
+            newRecords.append(dump)
+            newSize += len(dump)
+            return loc
+
+        index = { 'entries' : {}, 'sections' : {} }
+        oldEntries = oldIndex['entries'] if oldIndex else {}
+        oldSections = oldIndex['sections'] if oldIndex else {}
+
+        for key, value in data.items():
+            if isinstance(value, Mapping):
+                oldLocs = oldSections.get(key, {})
+                index['sections'][key] = {
+                    k: putRecord(v, oldLocs.get(k)) for k, v in value.items()
+                }
+            else:
+                index['entries'][key] = putRecord(value, oldEntries.get(key))
+
+        if oldIndex is not None and not newRecords and \
+                    index['entries'].keys() == oldEntries.keys() and \
+                    index['sections'] == oldSections:
+            # nothing has been changed
+            return
+
+        liveSize = sum(x[1] for x in index['entries'].values())
+        liveSize += sum(x[1] for locs in index['sections'].values() \
+                            for x in locs.values())
+
+        if oldIndex is not None and newSize - liveSize <= liveSize:
+            self._append(newRecords, index, fileSize)
+        else:
+            self._rewrite(data)
+
+        if isinstance(oldBuff, mmap.mmap):
+            oldBuff.close()
+
+    def _append(self, records, index, offset):
+
+        indexDump = pickle.dumps(index, _PICKLE_PROTOCOL)
+        with open(self._pathname, 'r+b') as file:
+            file.seek(offset)
+            for record in records:
+                file.write(record)
+            indexOffset = file.tell()
+            file.write(indexDump)
+            file.flush()
+            file.seek(0)
+            file.write(_INDEXEDDB_HEADER.pack(_INDEXEDDB_MAGIC,
+                                              indexOffset, len(indexDump)))
+
+    def _rewrite(self, data):
+
+        index = { 'entries' : {}, 'sections' : {} }
+        offset = _INDEXEDDB_HEADER.size
+        pathname = self._pathname
+        tmppathname = pathname + '.tmp'
+
+        with open(tmppathname, 'wb') as file:
+            file.seek(offset)
+
+            def putRecord(value):
+                nonlocal offset
+                dump = pickle.dumps(value, _PICKLE_PROTOCOL)
+                file.write(dump)
+                loc = (offset, len(dump))
+                offset += len(dump)
+                return loc
+
+            for key, value in data.items():
+                if isinstance(value, Mapping):
+                    index['sections'][key] = {
+                        k: putRecord(v) for k, v in value.items()
+                    }
+                else:
+                    index['entries'][key] = putRecord(value)
+
+            indexDump = pickle.dumps(index, _PICKLE_PROTOCOL)
+            file.write(indexDump)
+            file.seek(0)
+            file.write(_INDEXEDDB_HEADER.pack(_INDEXEDDB_MAGIC,
+                                              offset, len(indexDump)))
+
+        try:
+            stat = os.stat(pathname)
+            os.remove(pathname)
+            if PLATFORM != 'windows':
+                os.chown(tmppathname, stat.st_uid, stat.st_gid)
+        except (AttributeError, OSError):
+            pass
+
+        os.rename(tmppathname, pathname)
+
+    def _load(self):
+        """ Load from file """
+
+        buff = self._openBuffer()
+        try:
+            index = self._readIndex(buff)
+        except struct.error as ex:
+            raise ValueError('Invalid format of db file') from ex
+
+        data = {}
+        for key, (offset, size) in index['entries'].items():
+            data[key] = pickle.loads(buff[offset:offset + size])
+        for key, locs in index['sections'].items():
+            data[key] = LazyDict(buff, locs)
+
+        return data
+
+class ShardedDBFile(PickleDBFile):
+    """
+    Implemetation of DBFile for the 'sharded' format. ZenMake db files
+    are the same as for the 'pickle' format but the Waf build state is stored
+    in shards (see zm.waf.buildstate).
+    """
+
+    __slots__ = ()
+
 _defaultDbFormat = 'py'
 
+# data preloaded with the function 'preload': {path: (stat, data)}
+_preloaded = {}
+
 def useformat(dbformat):
     """ Set default DB format """
 
@@ -254,6 +490,10 @@ def getformat():
     """ Get default DB format """
     return _defaultDbFormat
 
+def isBuildStateSharded():
+    """ Return True if the Waf build state must be stored in shards """
+    return _defaultDbFormat == 'sharded'
+
 def factory(pathname, dbformat = None):
     """
     Create DBFile instance by dbformat
@@ -269,9 +509,47 @@ def saveTo(pathname, data):
     """ Save data to db in current format """
     factory(pathname).save(data)
 
+def preload(pathname):
+    """
+    Load data from db in current format and keep it in memory for the next
+    call of loadFrom. It's used by the ZenMake daemon.
+    """
+
+    dbfile = factory(pathname)
+    path = dbfile.path
+    try:
+        stat = statFile(path)
+        data = dbfile.load()
+    except Exception: # pylint: disable = broad-except
+        _preloaded.pop(path, None)
+        return
+
+    _preloaded[path] = (stat, data)
+
+def _popPreloaded(path):
+
+    stat, data = _preloaded.pop(path, (None, None))
+    if stat is None:
+        return None
+
+    try:
+        if statFile(path) != stat:
+            return None
+    except EnvironmentError:
+        return None
+
+    return data
+
 def loadFrom(pathname, asConfigSet = False):
     """ Load data from db in current format """
-    return factory(pathname).load(asConfigSet)
+
+    dbfile = factory(pathname)
+    if _preloaded:
+        data = _popPreloaded(dbfile.path)
+        if data is not None:
+            return DBFile._asConfigSet(data) if asConfigSet else data # pylint: disable = protected-access
+
+    return dbfile.load(asConfigSet)
 
 def exists(pathname):
     """ Return True if db file exists """
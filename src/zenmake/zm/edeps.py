@@ -10,7 +10,11 @@
 import sys
 import shutil
 from copy import deepcopy
+from functools import partial
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from waflib import Options
 
 from zm.constants import DEPNAME_DELIMITER, SYSTEM_LIB_PATHS, PYTHON_EXE, PLATFORM
 from zm.pyutils import maptype, stringtype
@@ -19,7 +23,7 @@
 from zm.buildconf import loader as buildconfLoader
 from zm.buildconf.validator import Validator
 from zm.buildconf.processing import Config as BuildConfig
-from zm.waf import assist
+from zm.waf import assist, jobserver
 
 joinpath    = os.path.join
 isabs       = os.path.isabs
@@ -162,6 +166,36 @@ def _dispatchRules(rules):
 
     return producers
 
+def _getSubDepDirs(bconf, seen = None):
+    """
+    Get absolute paths of root dirs of all external dependencies of
+    the ZenMake project recursively.
+    """
+
+    if seen is None:
+        seen = set()
+
+    for depConf in bconf.edeps.values():
+        rootdir = depConf.get('rootdir')
+        if rootdir is None:
+            continue
+        if not isinstance(rootdir, PathsParam):
+            # edeps of not processed buildconf
+            rootdir = PathsParam(rootdir, bconf.startdir, kind = 'path')
+        path = rootdir.abspath()
+        if path in seen:
+            continue
+        seen.add(path)
+
+        bconfFilePath = findConfFile(path)
+        if bconfFilePath is None:
+            continue
+        subBuildConf = buildconfLoader.load(path, bconfFilePath)
+        Validator(subBuildConf).run(checksOnly = True)
+        _getSubDepDirs(BuildConfig(subBuildConf), seen)
+
+    return sorted(seen)
+
 def _detectZenMakeProjectRules(depConf, buildtype):
 
     depRootDir = depConf['rootdir']
@@ -178,9 +212,11 @@ def _detectZenMakeProjectRules(depConf, buildtype):
     Validator(depBuildConf).run(checksOnly = True)
     # This call can be optimized because it needs only confPaths here
     # but it doesn't seem that it makes noticeable performance regression
-    depBConfPaths = BuildConfig(depBuildConf).confPaths
+    depBConf = BuildConfig(depBuildConf)
+    depBConfPaths = depBConf.confPaths
 
     depConf['$zmcachedir'] = depBConfPaths.zmcachedir
+    depConf['$sub-dep-dirs'] = _getSubDepDirs(depBConf)
 
     if 'rules' in depConf:
         # do nothing if custom rules exist
@@ -203,7 +239,8 @@ def needToConfigure(**kwargs):
         cliargs = {}
 
         return assist.needToConfigure(zmMetaConf, depRootDir,
-                                      depZmCacheDir, buildtype, cliargs)
+                                      depZmCacheDir, buildtype, cliargs,
+                                      depBConfPaths.zmmetafile)
 
     baseRule = {
         'cwd' : depRootDir,
@@ -512,6 +549,12 @@ def finishExternalDepsConfig(cfgCtx):
                 continue
             rule['targets'] = []
             fromDeps = rule.pop('$from-deps')
+            rule['$dep-names'] = [x['name'] for x in fromDeps]
+            depDirs = set()
+            for depConf in fromDeps:
+                depDirs.add(depConf['rootdir'].abspath())
+                depDirs.update(depConf.get('$sub-dep-dirs', []))
+            rule['$dep-dirs'] = sorted(depDirs)
             for depConf in fromDeps:
                 _depRules = depConfToRules.setdefault(hashRtObj(depConf), [depConf, []])
                 _depRules[1].append(rule)
@@ -665,7 +708,12 @@ def _checkTriggers(ctx, rule):
 
     return False
 
-def _runRule(ctx, rule):
+def _runRule(ctx, rule, output = None, procs = None):
+    """
+    Run command of the rule. If 'output' is a list then all output lines
+    are stored into it as tuples (line, err) instead of printing. Running
+    process is added into the set 'procs' if it's not None.
+    """
 
     depType = rule.get('$dep-type')
 
@@ -673,7 +721,7 @@ def _runRule(ctx, rule):
     rootdir = rootbconf.rootdir
 
     cmd = rule['cmd']
-    env = dict(os.environ)
+    env = jobserver.popenEnv(os.environ)
     if depType == 'zenmake':
         cmd += ' --color %s' % ('yes' if log.colorsEnabled() else 'no')
         if _local.get('configure-cmd-was-called', False):
@@ -686,25 +734,164 @@ def _runRule(ctx, rule):
     env.update(rule['env'])
     cwd = joinpath(rootdir, rule['cwd'])
 
-    kwargs = {
-        'cwd' : cwd,
-        'env' : env,
-        'timeout' : rule['timeout'],
-        'shell' : rule['shell'],
-    }
+    ctx.log_command(cmd, { 'cwd' : cwd })
+
+    if output is None:
+        def printLine(line, err):
+            line = '  %s' % line
+            stream = sys.stderr if err else sys.stdout
+            stream.write(line)
+            stream.flush()
+    else:
+        depNames = rule.get('$dep-names')
+        prefix = '  [%s] ' % (', '.join(depNames) if depNames else rule['name'])
+        def printLine(line, err):
+            output.append((prefix + line, err))
+
+    procCmd = utils.ProcCmd(cmd, rule['shell'], stdErrToOut = False,
+                            outCallback = printLine, passFds = jobserver.popenFds())
+    if procs is not None:
+        procs.add(procCmd)
+    try:
+        result = procCmd.run(cwd, env, rule['timeout'])
+    finally:
+        if procs is not None:
+            procs.discard(procCmd)
+
+    if result.exitcode != 0:
+        raise error.ZenMakeProcessFailed(cmd, result.exitcode)
+
+def _gatherRuleDeps(rules, rootdir):
+    """
+    Get list with sets of indexes of rules that must be finished before each
+    rule. Rules of the same dependency or with the same used directories
+    (working directory, root dirs of dependency and its own dependencies)
+    must be run in the order of the list 'rules'.
+    """
+
+    deps = []
+    lastRuleByKey = {}
+    for idx, rule in enumerate(rules):
+        keys = {('dir', normpath(joinpath(rootdir, rule['cwd'])))}
+        keys.update(('dir', x) for x in rule.get('$dep-dirs', []))
+        keys.update(('dep', x) for x in rule.get('$dep-names', []))
+
+        ruleDeps = set()
+        for key in keys:
+            lastIdx = lastRuleByKey.get(key)
+            if lastIdx is not None:
+                ruleDeps.add(lastIdx)
+            lastRuleByKey[key] = idx
+        deps.append(ruleDeps)
 
-    ctx.log_command(cmd, kwargs)
+    return deps
 
-    def printLine(line, err):
-        line = '  %s' % line
+def _printRuleOutput(records, lines):
+
+    log.printRecords(records)
+    for line, err in lines:
         stream = sys.stderr if err else sys.stdout
         stream.write(line)
-        stream.flush()
+    sys.stdout.flush()
+    sys.stderr.flush()
 
-    kwargs['outCallback'] = printLine
-    result = utils.runCmd(cmd, **kwargs)
-    if result.exitcode != 0:
-        raise error.ZenMakeProcessFailed(cmd, result.exitcode)
+def _runRuleBuffered(ctx, rule, procs):
+    """
+    Run rule in a thread with buffered output.
+    Returns tuple (log records, output lines, exception or None).
+    """
+
+    jobServer = jobserver.get()
+    log.bufferOutput()
+    lines = []
+    exc = None
+    token = jobServer.acquire() if jobServer else None
+    try:
+        _runRule(ctx, rule, lines, procs)
+    except Exception as ex: # pylint: disable = broad-except
+        exc = ex
+    finally:
+        if jobServer:
+            jobServer.release(token)
+    return log.releaseOutput(), lines, exc
+
+def _scheduleRules(pool, rules, deps, needToRun, runRule):
+    """
+    Submit rules into the pool when all their dependencies from 'deps' are
+    finished and wait for them. No rules are submitted after the first failure.
+    Returns exception of the first failed rule or None.
+    """
+
+    pending = list(range(len(rules)))
+    finished = set()
+    running = {}
+    failure = None
+
+    while pending or running:
+        while failure is None:
+            ready = [x for x in pending if deps[x] <= finished]
+            if not ready:
+                break
+            pending = [x for x in pending if x not in ready]
+            for idx in ready:
+                # triggers are checked after all previous rules of
+                # the same dependency have been finished
+                if needToRun(rules[idx]):
+                    running[pool.submit(runRule, rules[idx])] = idx
+                else:
+                    finished.add(idx)
+
+        if not running:
+            break
+
+        done = wait(running, return_when = FIRST_COMPLETED)[0]
+        for future in sorted(done, key = running.get):
+            idx = running.pop(future)
+            records, lines, exc = future.result()
+            _printRuleOutput(records, lines)
+            finished.add(idx)
+            if exc is not None and failure is None:
+                failure = exc
+
+    return failure
+
+def _runRules(ctx, rules, forceRules):
+    """
+    Run rules with checking of their triggers. Independent rules are run
+    concurrently with the amount of threads from --jobs. Output of each rule
+    is buffered and printed when the rule is finished in this case.
+    """
+
+    printLogo = [True]
+
+    def needToRun(rule):
+        doRun = True if forceRules else _checkTriggers(ctx, rule)
+        if doRun and printLogo[0]:
+            log.printStep('Running rules for external dependencies')
+            printLogo[0] = False
+        return doRun
+
+    jobs = getattr(ctx, 'jobs', None) or getattr(Options.options, 'jobs', 1)
+    if jobs <= 1 or len(rules) <= 1:
+        for rule in rules:
+            if needToRun(rule):
+                _runRule(ctx, rule)
+        return
+
+    procs = set()
+    runRule = partial(_runRuleBuffered, ctx, procs = procs)
+    deps = _gatherRuleDeps(rules, ctx.bconfManager.root.rootdir)
+
+    with ThreadPoolExecutor(max_workers = jobs) as pool:
+        try:
+            failure = _scheduleRules(pool, rules, deps, needToRun, runRule)
+        except KeyboardInterrupt:
+            for procCmd in list(procs):
+                procCmd.kill()
+            raise
+
+    if failure is not None:
+        raise failure
 
 def _getAllTargetFiles(target):
 
@@ -788,15 +975,7 @@ def produceExternalDeps(ctx):
 
     forceRules = cli.selected.args.get('forceExternalDeps')
 
-    printLogo = True
-    for rule in rules:
-        doRun = True if forceRules else _checkTriggers(ctx, rule)
-        if not doRun:
-            continue
-        if printLogo:
-            log.printStep('Running rules for external dependencies')
-            printLogo = False
-        _runRule(ctx, rule)
+    _runRules(ctx, rules, forceRules)
 
     bconfFeatures = ctx.bconfManager.root.general
     if cmd == 'build' and bconfFeatures.get('provide-edep-targets', False):
@@ -19,7 +19,7 @@
 import re
 from collections import Counter
 
-from waflib import Errors as waferror
+from waflib import Build, Errors as waferror
 from waflib.Task import Task
 from waflib.TaskGen import feature, before, after
 from waflib.Tools import c_preproc, qt5
@@ -85,6 +85,12 @@
 _RE_QCONFIG_PRI = re.compile(r"^\s*([\w\d\.\_]+)\s*\+?=\s*(\S+(\s+\S+)*)\s*$")
 _RE_Q_OBJECT_EXISTS = re.compile(r"\bQ_OBJECT\b")
 
+# Results of the Q_OBJECT detection in moc headers are stored in the Waf
+# build state as {abspath: (stat data, node signature, has Q_OBJECT)}
+_MOC_HEADERS_ATTR = 'zmMocHeaders'
+if _MOC_HEADERS_ATTR not in Build.SAVED_ATTRS:
+    Build.SAVED_ATTRS.append(_MOC_HEADERS_ATTR)
+
 def toQt5Name(name):
     """ Convert name from QtSomeName to Qt5SomeName """
 
@@ -797,15 +803,50 @@ def addExtraMocIncludes(tgen):
             includes.append(node.parent.get_bld())
     tgen.includes = utils.uniqueListWithOrder(includes)
 
-def _filterMocHeaders(nodes):
+def _hasQObject(node):
+
+    code = node.read()
+    code = c_preproc.re_nl.sub('', code)
+    code = c_preproc.re_cpp.sub(c_preproc.repl, code)
+    return bool(_RE_Q_OBJECT_EXISTS.search(code))
+
+def _filterMocHeaders(bld, nodes):
+    """
+    Select headers with Q_OBJECT. Results are cached in the build state and
+    a header is read again only if its stat data and signature were changed.
+    Only headers selected in the current build are stored, so removed and
+    renamed headers don't stay in the build state.
+    """
+
+    prevCache = getattr(bld, 'zmPrevMocHeaders', None)
+    if prevCache is None:
+        # first call in the current build
+        prevCache = getattr(bld, _MOC_HEADERS_ATTR, None) or {}
+        bld.zmPrevMocHeaders = prevCache
+        setattr(bld, _MOC_HEADERS_ATTR, {})
+    cache = getattr(bld, _MOC_HEADERS_ATTR)
 
     result = []
     for node in nodes:
-        code = node.read()
-        code = c_preproc.re_nl.sub('', code)
-        code = c_preproc.re_cpp.sub(c_preproc.repl, code)
+        path = node.abspath()
+        try:
+            stat = utils.statFile(path)
+        except EnvironmentError:
+            stat = None
+
+        cachedInfo = cache.get(path) or prevCache.get(path)
+        if cachedInfo is not None and stat is not None and cachedInfo[0] == stat:
+            hasQObject = cachedInfo[2]
+        else:
+            sig = node.get_bld_sig()
+            if cachedInfo is not None and cachedInfo[1] == sig:
+                hasQObject = cachedInfo[2]
+            else:
+                hasQObject = _hasQObject(node)
+            cachedInfo = (stat, sig, hasQObject)
+        cache[path] = cachedInfo
 
-        if _RE_Q_OBJECT_EXISTS.search(code):
+        if hasQObject:
             result.append(node)
 
     return result
@@ -838,7 +879,7 @@ def process_mocs(tgen):
 
     startNode = bld.getStartDirNode(taskParams['$startdir'])
     moc = getNodesFromPathsConf(bld, moc, rootdir)
-    moc = _filterMocHeaders(moc)
+    moc = _filterMocHeaders(bld, moc)
     # moc headers as 'includes' paths must be relative to the startdir
     moc = [x.path_from(startNode) for x in moc]
     tgen.moc = moc
@@ -9,16 +9,19 @@
 """
 
 import os
+import json
+import time
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from waflib.TaskGen import feature, after
 from waflib import Build, Task
 from waflib.Build import BuildContext
-from zm import log, cli, error
+from zm import log, cli, error, utils
 from zm.autodict import AutoDict as _AutoDict
 from zm.features import precmd, postcmd
 from zm.edeps import produceExternalDeps
-from zm.waf import assist
+from zm.waf import assist, buildcache
 
 # This module relies on module 'runcmd'. So module 'runcmd' must be loaded.
 # pylint: disable = unused-import
@@ -33,6 +36,12 @@
     withTests = False,
     runTestsOnChanges = False,
 
+    # tuple (index, count) from the CLI option --test-shard or None
+    testShard = None,
+
+    # path from the CLI option --test-timings or None
+    testTimingsPath = None,
+
     # names of test tasks
     testTaskNames = None,
 
@@ -65,6 +74,117 @@ def execute(*args, **kwargs):
 
 assist.needToConfigure = _wrapNeedToConfigure(assist.needToConfigure)
 
+def _parseTestShard(value):
+    """
+    Parse value of the CLI option --test-shard. Returns tuple (index, count)
+    with zero-based index or None
+    """
+
+    if not value:
+        return None
+
+    try:
+        index, count = [int(x) for x in value.split('/')]
+    except ValueError:
+        index = count = 0
+
+    if count < 1 or not 1 <= index <= count:
+        msg = "Invalid value for --test-shard: %r." % value
+        msg += " It must be in the format 'INDEX/COUNT' where 1 <= INDEX <= COUNT"
+        raise error.ZenMakeError(msg)
+
+    return index - 1, count
+
+def _selectTestShard(names, timings, shard):
+    """
+    Select names of test tasks for the shard. Tests are distributed across
+    shards by their historical run times: the longest test is always added
+    to the shard with the least total time. Tests without history get the
+    average time. Result is the same for the same names and timings.
+    """
+
+    index, count = shard
+
+    knownTimes = [timings[x] for x in names if x in timings]
+    defaultTime = sum(knownTimes) / len(knownTimes) if knownTimes else 1.0
+    weights = { x: timings.get(x, defaultTime) for x in names }
+
+    loads = [0.0] * count
+    selected = set()
+    for name in sorted(names, key = lambda x: (-weights[x], x)):
+        shardIdx = loads.index(min(loads))
+        loads[shardIdx] += weights[name]
+        if shardIdx == index:
+            selected.add(name)
+
+    return selected
+
+def _makeTestTimingsPath(bld):
+    """
+    Get path of the file with recorded run times of tests of the project.
+    It's in the directory of the build cache (see general.build-cache) so
+    it can be shared between build directories and machines.
+    """
+
+    bconf = bld.bconfManager.root
+    config = buildcache.getConfig(bconf)
+    dirpath = config['dir'] if config else buildcache.defaultCacheDir()
+    name = utils.normalizeForFileName(bconf.projectName or 'project')
+    name = "%s.%s.json" % (name, bconf.selectedBuildType or 'default')
+    return os.path.join(dirpath, 'test-timings', name)
+
+def loadTestTimings(path):
+    """
+    Load run times of tests as a dict {name: seconds} from JSON file.
+    Raises EnvironmentError or ValueError if the file can not be read.
+    """
+
+    with open(path, 'r', encoding = 'utf-8') as file:
+        data = json.load(file)
+    if not isinstance(data, dict):
+        raise ValueError("Invalid format of file %r" % path)
+    return { k: float(v) for k, v in data.items() \
+                    if isinstance(v, (int, float)) and not isinstance(v, bool) }
+
+def saveTestTimings(path, timings):
+    """
+    Merge run times of tests into the JSON file. File is replaced atomically
+    because it can be shared between builds.
+    """
+
+    try:
+        merged = loadTestTimings(path)
+    except (EnvironmentError, ValueError):
+        merged = {}
+    merged.update(timings)
+
+    dirpath = os.path.dirname(path)
+    if not os.path.isdir(dirpath):
+        os.makedirs(dirpath, exist_ok = True)
+
+    tmpPath = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmpPath, 'w', encoding = 'utf-8') as file:
+        json.dump(merged, file, indent = 1, sort_keys = True)
+    os.replace(tmpPath, path)
+
+def _loadShardTimings():
+    """
+    Load run times to balance shards. All shards must select tests from the
+    same data, so times are taken only from the file set by --test-timings
+    which doesn't change during the run. Without this file tests are
+    distributed by their names only.
+    """
+
+    path = _shared.testTimingsPath
+    if not path:
+        return {}
+
+    try:
+        return loadTestTimings(path)
+    except (EnvironmentError, ValueError) as ex:
+        msg = "Cannot read run times of tests from %r: %s" % (path, ex)
+        raise error.ZenMakeError(msg) from ex
+
 @postcmd('options')
 def postOpt(ctx):
     """ Extra init after wscript.options """
@@ -75,6 +195,11 @@ def postOpt(ctx):
         _shared.runTestsOnChanges = cliArgs.runTests == 'on-changes'
     if 'withTests' in cliArgs:
         _shared.withTests = cliArgs.withTests == 'yes'
+    _shared.testShard = _parseTestShard(cliArgs.get('testShard'))
+    testTimingsPath = cliArgs.get('testTimings')
+    if testTimingsPath:
+        testTimingsPath = os.path.abspath(os.path.expanduser(testTimingsPath))
+    _shared.testTimingsPath = testTimingsPath
 
     # init array of test task names for each bconf
     _shared.testTaskNames = [None] * len(ctx.bconfManager.configs)
@@ -229,6 +354,7 @@ def postBuild(bld):
     ctxCache['saved.attrs'] = {}
     for attr in Build.SAVED_ATTRS:
         ctxCache['saved.attrs'][attr] = getattr(bld, attr, {})
+    ctxCache['build.state'] = getattr(bld, 'zmBuildState', None)
 
 @feature('*')
 @after('process_rule')
@@ -261,6 +387,31 @@ def applyFeatureTest(tgen):
         for task in tgen.tasks:
             task.runnable_status = lambda: Task.SKIP_ME
 
+def _gatherTestDeps(tasks):
+    """
+    Get dict {task: set of tasks} with tasks from the 'tasks' that must be
+    finished before each task
+    """
+
+    def getTaskParams(task):
+        return getattr(task.generator, 'zm-task-params', {})
+
+    taskSet = set(tasks)
+    tasksByName = {}
+    for task in tasks:
+        name = getTaskParams(task).get('name')
+        tasksByName.setdefault(name, []).append(task)
+
+    deps = {}
+    for task in tasks:
+        taskDeps = set(x for x in task.run_after if x in taskSet)
+        for name in getTaskParams(task).get('use', []):
+            taskDeps.update(tasksByName.get(name, []))
+        taskDeps.discard(task)
+        deps[task] = taskDeps
+
+    return deps
+
 class TestContext(BuildContext):
     """
     Context for command 'test'
@@ -268,6 +419,11 @@ class TestContext(BuildContext):
 
     fun = cmd = 'test'
 
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        # sharded build state from the build stage (see zm.waf.buildstate)
+        self.zmBuildState = None
+
     def _prepareExecute(self):
 
         ctxCache = _shared.ctxCache
@@ -282,6 +438,9 @@ def _prepareExecute(self):
         else:
             for attr in Build.SAVED_ATTRS:
                 setattr(self, attr, bldAttrs.get(attr, {}))
+            buildState = ctxCache.get('build.state')
+            if buildState is not None:
+                self.zmBuildState = buildState
             self.init_dirs()
 
         # load envs
@@ -296,6 +455,9 @@ def _prepareExecute(self):
         # clear cache to allow gc to free some memory
         ctxCache.clear()
 
+        # run times of tests of this run
+        self.zmTestTimings = {}
+
     def _makeTask(self, taskParams, bconfPaths):
         ctx = self
 
@@ -325,14 +487,18 @@ def _makeTasks(self):
 
         runTestsOnChanges = _shared.runTestsOnChanges
         ordered = assist.orderTasksByLocalDeps(self.zmtasks)
+        ordered = [x for x in ordered \
+                        if x['$istest'] and _isSuitableForRunCmd(x)]
+
+        testShard = _shared.testShard
+        if testShard is not None:
+            names = _selectTestShard([x['name'] for x in ordered],
+                                     _loadShardTimings(), testShard)
+            ordered = [x for x in ordered if x['name'] in names]
 
         changedTasks = set(_shared.changedTasks)
 
         for taskParams in ordered:
-            if not taskParams['$istest']:
-                continue
-            if not _isSuitableForRunCmd(taskParams):
-                continue
             if runTestsOnChanges and taskParams['name'] not in changedTasks:
                 continue
 
@@ -351,7 +517,12 @@ def _executeTest(self, task):
             msg += "there's no such directory for 'cwd': %r" % task.cwd
             raise error.ZenMakeError(msg)
 
+        startTime = time.perf_counter()
         task.process()
+        zmTaskParams = getattr(task.generator, 'zm-task-params', {})
+        self.zmTestTimings[zmTaskParams.get('name', task.name)] = \
+                                        time.perf_counter() - startTime
+
         if task.hasrun != Task.SUCCESS:
             if task.hasrun == Task.CRASHED:
                 msg = 'Test %r failed with exit code %r' % (task.name, task.err_code)
@@ -374,6 +545,59 @@ def _executeTest(self, task):
                 msg = task.format_error()
             raise error.ZenMakeError(msg)
 
+    def _executeTestsInParallel(self, tasks):
+        """
+        Run tests with a pool of 'jobs' threads. Output of each test is
+        buffered and printed when the test is finished. Order of tasks
+        by local deps is preserved.
+        """
+
+        def runTest(task):
+            log.bufferOutput()
+            exc = None
+            try:
+                self._executeTest(task)
+            except Exception as ex: # pylint: disable = broad-except
+                exc = ex
+            return log.releaseOutput(), exc
+
+        deps = _gatherTestDeps(tasks)
+        taskIndexes = { task:i for i, task in enumerate(tasks) }
+        pending = list(tasks)
+        finished = set()
+        running = {}
+        failure = None
+
+        with ThreadPoolExecutor(max_workers = self.jobs) as pool:
+            while pending or running:
+                if failure is None:
+                    ready = [x for x in pending if deps[x] <= finished]
+                    pending = [x for x in pending if not deps[x] <= finished]
+                    for task in ready:
+                        running[pool.submit(runTest, task)] = task
+
+                if not running:
+                    break
+
+                done = wait(running, return_when = FIRST_COMPLETED)[0]
+                done = sorted(done, key = lambda x: taskIndexes[running[x]])
+                for future in done:
+                    task = running.pop(future)
+                    records, exc = future.result()
+                    log.printRecords(records)
+                    finished.add(task)
+                    if exc is not None and failure is None:
+                        failure = exc
+
+        if failure is not None:
+            raise failure
+
+        if pending:
+            # deps of these tasks have a cycle
+            names = ', '.join(repr(x.name) for x in pending)
+            msg = "Tests %s cannot be run because of cyclic dependencies" % names
+            raise error.ZenMakeError(msg)
+
     def _runTasks(self):
 
         def tgpost(tgen):
@@ -399,8 +623,11 @@ def tgpost(tgen):
             if not alltasks:
                 break
 
-            for task in alltasks:
-                self._executeTest(task)
+            if self.jobs > 1 and len(alltasks) > 1:
+                self._executeTestsInParallel(alltasks)
+            else:
+                for task in alltasks:
+                    self._executeTest(task)
 
     def execute(self):
         """
@@ -411,4 +638,12 @@ def execute(self):
         produceExternalDeps(self)
 
         self._makeTasks()
-        self._runTasks()
+        try:
+            self._runTasks()
+        finally:
+            if self.zmTestTimings:
+                path = _makeTestTimingsPath(self)
+                try:
+                    saveTestTimings(path, self.zmTestTimings)
+                except EnvironmentError as ex:
+                    log.warn("Cannot save run times of tests into %r: %s" % (path, ex))
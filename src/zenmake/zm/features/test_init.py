@@ -31,6 +31,19 @@
         commands = ['build', 'test'],
         help = 'run tests',
     ),
+    cli.Option(
+        names = ['--test-shard'],
+        dest = 'testShard',
+        commands = ['build', 'test'],
+        help = "run only one part of tests: 'INDEX/COUNT', INDEX is from 1",
+    ),
+    cli.Option(
+        names = ['--test-timings'],
+        dest = 'testTimings',
+        commands = ['build', 'test'],
+        metavar = 'FILE',
+        help = "JSON file with run times of tests to balance --test-shard",
+    ),
 ])
 
 cli.config.optdefaults.update({
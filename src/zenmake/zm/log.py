@@ -8,6 +8,7 @@
 
 import os
 import sys
+import threading
 from waflib import Logs
 from zm.constants import PLATFORM
 
@@ -27,6 +28,46 @@
 makeMemLogger = Logs.make_mem_logger
 freeLogger    = Logs.free_logger
 
+# log records buffered by threads
+_buffered = threading.local()
+
+def _bufferRecord(record):
+    records = getattr(_buffered, 'records', None)
+    if records is None:
+        return True
+    records.append(record)
+    return False
+
+def bufferOutput():
+    """
+    Start buffering of log records in the current thread instead of output
+    """
+
+    logger = Logs.log
+    # Logs.init_log resets all filters
+    if _bufferRecord not in logger.filters:
+        logger.addFilter(_bufferRecord)
+    _buffered.records = []
+
+def releaseOutput():
+    """
+    Stop buffering of log records in the current thread.
+    Returns list of buffered records.
+    """
+
+    records = getattr(_buffered, 'records', None)
+    _buffered.records = None
+    return records or []
+
+def printRecords(records):
+    """
+    Output log records buffered with bufferOutput/releaseOutput
+    """
+
+    logger = Logs.log
+    for record in records:
+        logger.handle(record)
+
 def enableColorsByCli(colorArg):
     """
     Set up log colors by arg from CLI
@@ -398,14 +398,20 @@ def _getNodesFromPathPatterns(ctx, param, startNode, withDirs,
                 exclude.append(pathPattern)
                 exclude.append(pathPattern + '/**')
 
-    nodes = startNode.ant_glob(
-        incl = include,
-        excl = exclude,
-        ignorecase = param.get('ignorecase', False),
-        dir = withDirs,
-        generator = not cache,
-        remove = False, # don't remove declared paths
-    )
+    ignorecase = param.get('ignorecase', False)
+    globIndex = getattr(ctx, 'zmGlobIndex', None)
+    if globIndex is not None:
+        # see zm.waf.globindex
+        nodes = globIndex.glob(startNode, include, exclude, ignorecase, withDirs)
+    else:
+        nodes = startNode.ant_glob(
+            incl = include,
+            excl = exclude,
+            ignorecase = ignorecase,
+            dir = withDirs,
+            generator = not cache,
+            remove = False, # don't remove declared paths
+        )
 
     if cache:
         _pathPatternsCache[cacheKey] = [x.abspath() for x in nodes]
@@ -71,6 +71,13 @@ def __getattr__(self, name):
     }
     result = type(typename, (object,), namespace)
 
+    # the same as in the collections.namedtuple: it's needed for pickling
+    try:
+        frame = sys._getframe(1) # pylint: disable = protected-access
+        result.__module__ = frame.f_globals.get('__name__', '__main__')
+    except (AttributeError, ValueError): # pragma: no cover
+        pass
+
     return result
 
 def asmethod(cls, methodName = None, wrap = False, **kwargs):
@@ -26,6 +26,9 @@
     'zipapp'  : 'zm.zipapp',
     'version' : 'zm.version',
     'sysinfo' : 'zm.sysinfo',
+    'daemon'  : 'zm.daemon',
+    'cacheserver' : 'zm.cacheserver',
+    'watch'   : 'zm.watch',
 }
 
 def handleCLI(args, noBuildConf, options, cwd):
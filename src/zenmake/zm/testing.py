@@ -7,6 +7,7 @@
 """
 
 import json
+from collections.abc import Mapping
 
 from zm.waf.task import WafTask
 from zm.waf.ccroot import wafccroot
@@ -19,6 +20,8 @@ class JSONEncoder(json.JSONEncoder):
 
     def default(self, o):
         # pylint: disable = method-hidden
+        if isinstance(o, Mapping):
+            return dict(o.items())
         try:
             return json.JSONEncoder.default(self, o)
         except TypeError:
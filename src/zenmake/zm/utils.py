@@ -9,14 +9,17 @@
 import os
 import sys
 import signal
+import selectors
+import locale
 import re
 import shlex
 import inspect
 import platform as _platform
 from copy import deepcopy
-from hashlib import sha1
+from hashlib import sha1, blake2b, blake2s
 from importlib import import_module as importModule
 from types import ModuleType
+from queue import Queue
 
 try:
     import threading
@@ -29,6 +32,13 @@
 from zm.error import ZenMakeError, ZenMakeProcessTimeoutExpired
 from zm.buildconf.types import ConfNode
 
+_XXHASH_EXISTS = False
+try:
+    import xxhash
+    _XXHASH_EXISTS = True
+except ImportError:
+    pass
+
 _joinpath = os.path.join
 
 WINDOWS_RESERVED_FILENAMES = frozenset((
@@ -386,27 +396,61 @@ def substBuiltInVarsInParam(val, svars, splitListOfStrs = True, notHandled = Non
     assert not isinstance(val, tuple)
     return val
 
+# Digests of blake2 are truncated to the size of sha1 digests: they are
+# stored in the Waf build state for each file and task
+_BLAKE2_DIGEST_SIZE = 20
+
+def _blake2b(data = b''):
+    return blake2b(data, digest_size = _BLAKE2_DIGEST_SIZE)
+
+def _blake2s(data = b''):
+    return blake2s(data, digest_size = _BLAKE2_DIGEST_SIZE)
+
+_HASH_ALGOS = {
+    'sha1'    : sha1,
+    'md5'     : md5,
+    'blake2b' : _blake2b,
+    'blake2s' : _blake2s,
+}
+
+if _XXHASH_EXISTS:
+    _HASH_ALGOS['xxh3'] = xxhash.xxh3_128
+
 _HashAlgo = sha1
+_HashAlgoName = 'sha1'
 
 def setDefaultHashAlgo(algo):
     """
-    Set default hash algo. Can be 'sha1' or 'md5'.
+    Set default hash algo. Can be 'sha1', 'md5', 'blake2b', 'blake2s' or 'xxh3'.
+    The 'xxh3' is replaced by 'blake2b' if python module 'xxhash' is not
+    installed.
     """
 
+    if algo == 'xxh3' and not _XXHASH_EXISTS:
+        algo = 'blake2b'
+    if algo not in _HASH_ALGOS:
+        algo = 'sha1'
+
     # pylint: disable = global-statement
-    global _HashAlgo
-    if algo == 'md5':
-        _HashAlgo = wafutils.md5 = md5
-    else:
-        _HashAlgo = wafutils.md5 = sha1
+    global _HashAlgo, _HashAlgoName
+    _HashAlgo = wafutils.md5 = _HASH_ALGOS[algo]
+    # md5 can be replaced by sha1 in waflib.Utils for "FIPS compliant" python
+    _HashAlgoName = _HashAlgo().name if algo == 'md5' else algo
 
 def defaultHashAlgo():
     """
-    Get default hash algo. Can be 'sha1' or 'md5'.
+    Get default hash algo. It's a function like hashlib.sha1.
     """
 
     return _HashAlgo
 
+def defaultHashAlgoName():
+    """
+    Get name of the default hash algo that is really used.
+    """
+
+    return _HashAlgoName
+
 # Since python 3.4 non-inheritable file handles are provided by default
 if hasattr(os, 'O_NOINHERIT') and sys.hexversion < 0x3040000:
     def _hashFile(hashobj, path):
@@ -433,13 +477,13 @@ def _hashFile(hashobj, path):
         return hashobj
 
 def hashFile(path):
-    """ Hash file by using sha1/md5 """
+    """ Hash file by using the default hash algo """
     _hash = _HashAlgo()
     return _hashFile(_hash, path).digest()
 
 def hashFiles(paths):
     """
-    Hash files from paths by using sha1/md5.
+    Hash files from paths by using the default hash algo.
     Order of paths must be constant. Simple way to do it is to sort the path items.
     """
 
@@ -454,6 +498,22 @@ def hashFiles(paths):
         _hashFile(_hash, path)
     return _hash.digest()
 
+def statFile(path):
+    """
+    Get stat data of the file to detect its changes without reading
+    of the file. Returns tuple (size, mtime in ns, inode).
+    """
+
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+def statFiles(paths):
+    """
+    Get stat data of files from paths as a dict {path: statFile(path)}
+    """
+
+    return { path: statFile(path) for path in paths }
+
 class BuildConfFunc(object):
     """
     Class to store a func from buildconf
@@ -847,21 +907,113 @@ def value(self, val):
 
 ProcCmdResult = struct('ProcCmdResult', 'exitcode, stdout, stderr')
 
+# max amount of bytes to read from a pipe at once
+_PIPE_CHUNK_SIZE = 65536
+
+class _LineAssembler(object):
+    """
+    Assemble text lines from chunks of bytes of a process output and pass
+    them into a callback. Line endings are converted into '\\n' as with
+    'universal_newlines' in the subprocess module.
+    """
+
+    __slots__ = ('callback', 'err', 'encoding', '_buf')
+
+    def __init__(self, callback, err):
+        self.callback = callback
+        self.err = err
+        self.encoding = locale.getpreferredencoding(False)
+        self._buf = b''
+
+    def _emit(self, data):
+        for line in data.splitlines():
+            self.callback(line.decode(self.encoding, 'replace') + '\n', err = self.err)
+
+    def feed(self, data):
+        """
+        Handle next chunk of output. Empty chunk means the end of output.
+        """
+
+        if not data:
+            tail, self._buf = self._buf, b''
+            if tail.endswith(b'\r'):
+                self._emit(tail)
+            elif tail:
+                # last line without line ending is passed as is
+                self.callback(tail.decode(self.encoding, 'replace'), err = self.err)
+            return
+
+        buf = self._buf + data
+        # '\r' at the end can be the first half of '\r\n'
+        pos = max(buf.rfind(b'\n'), buf.rfind(b'\r', 0, len(buf) - 1))
+        if pos < 0:
+            self._buf = buf
+            return
+        self._buf = buf[pos + 1:]
+        self._emit(buf[:pos + 1])
+
+def _pumpWithSelector(assemblers):
+    """
+    Read output of a process from pipes until all of them are closed.
+    It's event-driven reading without any busy loops.
+    """
+
+    with selectors.DefaultSelector() as selector:
+        for fd, assembler in assemblers:
+            selector.register(fd, selectors.EVENT_READ, assembler)
+        while selector.get_map():
+            for key, _ in selector.select():
+                data = os.read(key.fd, _PIPE_CHUNK_SIZE)
+                if not data:
+                    selector.unregister(key.fd)
+                key.data.feed(data)
+
+def _pumpWithThreads(assemblers):
+    """
+    Read output of a process from pipes until all of them are closed.
+    Selectors don't support pipes on Windows, so each pipe is read in its own
+    thread and the callback is called in the current thread.
+    """
+
+    queue = Queue()
+
+    def read(fd, assembler):
+        while True:
+            data = os.read(fd, _PIPE_CHUNK_SIZE)
+            queue.put((assembler, data))
+            if not data:
+                break
+
+    for fd, assembler in assemblers:
+        thread = threading.Thread(target = read, args = (fd, assembler))
+        thread.daemon = True
+        thread.start()
+
+    remaining = len(assemblers)
+    while remaining:
+        assembler, data = queue.get()
+        assembler.feed(data)
+        if not data:
+            remaining -= 1
+
 class ProcCmd(object):
     """
     Class to run external command in a subprocess
     """
 
     def __init__(self, cmdLine, shell = False, captureOutput = False,
-                                        stdErrToOut = True, outCallback = None):
+                 stdErrToOut = True, outCallback = None, *, passFds = ()):
 
         """
         Parameter outCallback can be used to handle stdout/stderr line by line
         without waiting for a process to exit. Also if outCallback is not None
         then it means that captureOutput is True. If stdErrToOut is True it means
-        that captureOutput is True as well.
+        that captureOutput is True as well. Parameter passFds is a sequence of
+        file descriptors to keep open in the process (not on Windows).
         """
 
+        # pylint: disable = too-many-arguments
+
         self._origCmdLine = cmdLine
 
         cmdAsStr = isinstance(cmdLine, stringtype)
@@ -904,6 +1056,9 @@ def __init__(self, cmdLine, shell = False, captureOutput = False,
         # This parameter does nothing on Windows.
         self._popenArgs['start_new_session'] = True
 
+        if passFds and PLATFORM != 'windows':
+            self._popenArgs['pass_fds'] = passFds
+
     def _communicate(self):
 
         callback = self._outCallback
@@ -911,29 +1066,44 @@ def _communicate(self):
             stdout, stderr = self._proc.communicate()
             return ProcCmdResult(self._proc.returncode, stdout, stderr)
 
-        # It is simple and actually not optimal algo but it works for ZenMake needs
         proc = self._proc
-        while True:
-            noData = True
+        assemblers = [(x.fileno(), _LineAssembler(callback, err)) \
+                        for x, err in ((proc.stdout, False), (proc.stderr, True)) if x]
+        try:
+            if PLATFORM == 'windows':
+                _pumpWithThreads(assemblers)
+            else:
+                _pumpWithSelector(assemblers)
+        finally:
             if proc.stdout:
-                line = proc.stdout.readline()
-                if line:
-                    noData = False
-                    callback(line, err = False)
+                proc.stdout.close()
             if proc.stderr:
-                line = proc.stderr.readline()
-                if line:
-                    noData = False
-                    callback(line, err = True)
-            if noData and proc.poll() is not None:
-                break
+                proc.stderr.close()
 
-        if proc.stdout:
-            proc.stdout.close()
-        if proc.stderr:
-            proc.stderr.close()
+        proc.wait()
         return ProcCmdResult(proc.returncode, None, None)
 
+    def kill(self):
+        """
+        Kill running process. It can be called from another thread.
+        """
+
+        proc = self._proc
+        if proc is None:
+            return
+
+        try:
+            if self._popenArgs.get('start_new_session') and hasattr(os, 'killpg'):
+                # If 'shell' is true then killing of current process is killing of
+                # executed shell but not childs.
+                # Unix only.
+                os.killpg(proc.pid, signal.SIGKILL)
+            else:
+                proc.kill()
+        except OSError:
+            # process has already gone
+            pass
+
     def run(self, cwd = None, env = None, timeout = None):
         """
         Run command.
@@ -946,15 +1116,6 @@ def run(self, cwd = None, env = None, timeout = None):
             'env' : env,
         })
 
-        def killProc(proc):
-            if kwargs.get('start_new_session') and hasattr(os, 'killpg'):
-                # If 'shell' is true then killing of current process is killing of
-                # executed shell but not childs.
-                # Unix only.
-                os.killpg(proc.pid, signal.SIGKILL)
-            else:
-                proc.kill()
-
         timer = None
         try:
             self._proc = subprocess.Popen(self._cmdLine, **kwargs)
@@ -963,7 +1124,7 @@ def killProc(proc):
                 self._timeoutExpired = False
 
                 def killProcTimeout(self):
-                    killProc(self._proc)
+                    self.kill()
                     self._timeoutExpired = True
 
                 timer = threading.Timer(timeout, killProcTimeout, args = [self])
@@ -980,8 +1141,7 @@ def killProcTimeout(self):
         except (OSError, subprocess.SubprocessError) as ex:
             raise ZenMakeError(str(ex)) from ex
         except KeyboardInterrupt:
-            if self._proc:
-                killProc(self._proc)
+            self.kill()
             raise
         finally:
             if timer:
@@ -992,6 +1152,129 @@ def killProcTimeout(self):
 
         return result
 
+    async def _communicateAsync(self, proc):
+
+        # asyncio is imported on demand because it's slow to import
+        import asyncio # pylint: disable = import-outside-toplevel
+
+        callback = self._outCallback
+        if callback is None:
+            stdout, stderr = await proc.communicate()
+            encoding = locale.getpreferredencoding(False)
+
+            def decode(data):
+                if data is None:
+                    return None
+                return data.decode(encoding, 'replace').replace('\r\n', '\n')
+
+            return decode(stdout), decode(stderr)
+
+        async def pump(stream, assembler):
+            while True:
+                data = await stream.read(_PIPE_CHUNK_SIZE)
+                assembler.feed(data)
+                if not data:
+                    break
+
+        streams = ((proc.stdout, False), (proc.stderr, True))
+        await asyncio.gather(*[pump(x, _LineAssembler(callback, err)) \
+                                for x, err in streams if x])
+        await proc.wait()
+        return None, None
+
+    async def runAsync(self, cwd = None, env = None, timeout = None):
+        """
+        Run command as an asyncio coroutine. It's the same as the method 'run'
+        but many commands can be run concurrently in one thread.
+        Returns ProcCmdResult.
+        """
+
+        import asyncio # pylint: disable = import-outside-toplevel
+
+        kwargs = dict(self._popenArgs)
+        kwargs.pop('universal_newlines')
+        shell = kwargs.pop('shell')
+        kwargs.update({
+            'cwd' : cwd,
+            'env' : env,
+        })
+
+        cmdLine = self._cmdLine
+        try:
+            if shell or isinstance(cmdLine, stringtype):
+                # string without shell is possible on Windows only
+                proc = await asyncio.create_subprocess_shell(cmdLine, **kwargs)
+            else:
+                proc = await asyncio.create_subprocess_exec(*cmdLine, **kwargs)
+        except (OSError, subprocess.SubprocessError) as ex:
+            raise ZenMakeError(str(ex)) from ex
+
+        self._proc = proc
+        self._timeoutExpired = False
+        try:
+            communication = asyncio.ensure_future(self._communicateAsync(proc))
+            done, _ = await asyncio.wait([communication], timeout = timeout)
+            if not done:
+                self.kill()
+                self._timeoutExpired = True
+            stdout, stderr = await communication
+
+            if self._timeoutExpired:
+                raise ZenMakeProcessTimeoutExpired(self._origCmdLine, timeout,
+                                                    stdout, stderr)
+        except asyncio.CancelledError:
+            self.kill()
+            raise
+        finally:
+            self._proc = None
+
+        return ProcCmdResult(proc.returncode, stdout, stderr)
+
+def runProcCmds(procCmds, cwd = None, env = None, timeout = None):
+    """
+    Run commands from the list of ProcCmd objects concurrently in the current
+    thread with asyncio. Parameters cwd, env and timeout are used for each
+    command. All commands are finished before the first exception (if any)
+    is raised. With python < 3.8 it must be called from the main thread
+    on POSIX systems.
+    Returns list of ProcCmdResult in the order of procCmds.
+    """
+
+    import asyncio # pylint: disable = import-outside-toplevel
+
+    async def runAll():
+        coroutines = [x.runAsync(cwd, env, timeout) for x in procCmds]
+        return await asyncio.gather(*coroutines, return_exceptions = True)
+
+    oldPython = sys.version_info < (3, 8)
+    if PLATFORM == 'windows' and oldPython:
+        # only ProactorEventLoop can run subprocesses on Windows,
+        # it's the default loop since python 3.8
+        loop = asyncio.ProactorEventLoop()
+    else:
+        loop = asyncio.new_event_loop()
+
+    watcher = None
+    if PLATFORM != 'windows' and oldPython:
+        # default child watcher of python < 3.8 works only with the loop
+        # attached to it and set for the current thread
+        asyncio.set_event_loop(loop)
+        watcher = asyncio.get_child_watcher()
+        watcher.attach_loop(loop)
+
+    try:
+        results = loop.run_until_complete(runAll())
+    finally:
+        if watcher is not None:
+            watcher.attach_loop(None)
+            asyncio.set_event_loop(None)
+        loop.close()
+
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
 def runCmd(cmdLine, cwd = None, env = None, shell = False, timeout = None,
             captureOutput = False, stdErrToOut = False, outCallback = None):
     """
@@ -79,7 +79,15 @@ def writeZenMakeMetaFile(filePath, meta, prevZmMeta):
 
     zmMeta.attrs = meta.attrs
     zmMeta.monitfiles = sorted(set(meta.monitfiles))
-    zmMeta.monithash  = utils.hashFiles(zmMeta.monitfiles)
+    if meta.get('monitstat', True):
+        # stat data must be gathered before hashing to detect files changed
+        # between these two steps
+        zmMeta.monitstats = utils.statFiles(zmMeta.monitfiles)
+        zmMeta.monithashes = {
+            path: utils.hashFile(path) for path in zmMeta.monitfiles
+        }
+    else:
+        zmMeta.monithash  = utils.hashFiles(zmMeta.monitfiles)
 
     from waflib import Context
     zmMeta.wafhexversion = Context.HEXVERSION
@@ -468,11 +476,47 @@ def isBuildConfFake(conf):
     """
     return conf.__name__.endswith('fakeconf')
 
-def areMonitoredFilesChanged(zmMetaConf):
+def _areMonitoredFilesChangedByStat(zmMetaConf, metaFilePath):
+
+    prevStats  = zmMetaConf.monitstats
+    prevHashes = zmMetaConf.monithashes
+
+    refreshed = {}
+    try:
+        for path in zmMetaConf.monitfiles:
+            prevStat = prevStats.get(path)
+            stat = utils.statFile(path)
+            if prevStat is not None and stat == prevStat:
+                continue
+            prevHash = prevHashes.get(path)
+            if prevHash is None or utils.hashFile(path) != prevHash:
+                return True
+            # the same content with other stat data (touch, git checkout)
+            refreshed[path] = stat
+    except EnvironmentError:
+        return True
+
+    if refreshed:
+        # otherwise these files would be hashed on each run
+        prevStats.update(refreshed)
+        if metaFilePath:
+            dbfile = db.PyDBFile(metaFilePath, extension = '')
+            dbfile.save(zmMetaConf.get_merged_dict())
+
+    return False
+
+def areMonitoredFilesChanged(zmMetaConf, metaFilePath = None):
     """
     Detect that current monitored files are changed.
+    If the meta file contains stat data of the files then only files
+    with changed stat data are hashed. New stat data of files with the same
+    content are stored in the zmMetaConf and in the meta file if
+    the metaFilePath is set.
     """
 
+    if 'monitstats' in zmMetaConf and 'monithashes' in zmMetaConf:
+        return _areMonitoredFilesChangedByStat(zmMetaConf, metaFilePath)
+
     try:
         _hash = utils.hashFiles(zmMetaConf.monitfiles)
     except EnvironmentError:
@@ -517,9 +561,12 @@ def isBuildTypeConfigured(zmcachedir, buildtype):
 
     return True
 
-def needToConfigure(zmMetaConf, rootdir, zmcachedir, buildtype, cliargs):
+def needToConfigure(zmMetaConf, rootdir, zmcachedir, buildtype, cliargs,
+                    metaFilePath = None):
     """
-    Detect if it's needed to run 'configure' command
+    Detect if it's needed to run 'configure' command.
+    Param metaFilePath is the path of the loaded zmMetaConf to update stat
+    data of monitored files in it (see areMonitoredFilesChanged).
     """
 
     if zmMetaConf.zmversion != version.current():
@@ -528,7 +575,11 @@ def needToConfigure(zmMetaConf, rootdir, zmcachedir, buildtype, cliargs):
     if zmMetaConf.rundir != rootdir or zmMetaConf.platform != PLATFORM:
         return True
 
-    if areMonitoredFilesChanged(zmMetaConf):
+    if zmMetaConf.attrs.get('last-hash-algo') != utils.defaultHashAlgoName():
+        # all stored hashes were made by other algo
+        return True
+
+    if areMonitoredFilesChanged(zmMetaConf, metaFilePath):
         return True
 
     if areExternalParamsChanged(zmMetaConf, buildtype, cliargs):
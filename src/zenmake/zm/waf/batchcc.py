@@ -0,0 +1,339 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Support of the task param 'batch-compile' for gcc, clang and msvc. Changed
+ C/C++ files of a task are compiled by one compiler process for several
+ files. It's similar to waflib/extras/batched_cc.py but it doesn't replace
+ Task classes 'c' and 'cxx' globally and object files have the same names
+ as without batches.
+
+ Each compiling task (slave) is still a separate Waf task with its own
+ signature, so only changed files are compiled. Slaves don't run the compiler
+ but they are marked as pending and the batch task (master) after them
+ compiles all pending files of its batch at once and then it finishes
+ slaves in the same way as Waf does it after running of a task.
+
+ Compiler writes object files into the current directory with names from
+ the names of source files, so each master runs the compiler in its own
+ directory and files with the same names are compiled by different
+ invocations. Object files are moved to their usual places after compiling.
+"""
+
+import os
+import re
+import types
+import traceback
+
+from waflib import Task, Utils, Errors
+from waflib.TaskGen import feature, after_method
+from waflib.Tools import c, cxx # pylint: disable = unused-import
+from zm.pyutils import asmethod
+from zm import log
+
+DEFAULT_BATCH_SIZE = 16
+
+# extension of object files written by the compiler itself
+_COMPILERS = {
+    'gcc' : '.o',
+    'clang' : '.o',
+    'msvc' : '.obj',
+}
+
+_LANGS = {
+    # lang: (compiler env var, flags env var)
+    'c' :   ('CC', 'CFLAGS'),
+    'cxx' : ('CXX', 'CXXFLAGS'),
+}
+
+_RE_UNSAFE_CHARS = re.compile(r'[^\w.-]')
+
+_RUN_STR = '${%(cc)s} ${ARCH_ST:ARCH} ${%(flags)s} ${FRAMEWORKPATH_ST:FRAMEWORKPATH} ' \
+           '${CPPPATH_ST:ZMBATCH_INCPATHS} ${DEFINES_ST:DEFINES} ${ZMBATCH_FLAGS} ' \
+           '${ZMBATCH_SRC} ${CPPFLAGS}'
+
+def _objName(task, ext):
+    name = task.inputs[0].name
+    idx = name.rfind('.')
+    return (name[:idx] if idx > 0 else name) + ext
+
+def _splitByNames(tasks, ext):
+    """
+    Split tasks into lists for separate invocations of the compiler where
+    object files in each list have different names
+    """
+
+    invocations = []
+    for task in tasks:
+        name = _objName(task, ext)
+        for names, group in invocations:
+            if name not in names:
+                break
+        else:
+            names, group = set(), []
+            invocations.append((names, group))
+        names.add(name)
+        group.append(task)
+    return [x[1] for x in invocations]
+
+def _deferredProcess(self):
+    """
+    Replacement of the Task.process for slaves
+    """
+
+    # the same as in the Task.process: the task must be executed again
+    # in case of failure
+    try:
+        del self.generator.bld.task_sigs[self.uid()]
+    except KeyError:
+        pass
+
+    self.zmBatchPending = True
+    self.hasrun = Task.SUCCESS
+
+class _BatchTaskBase(Task.Task):
+    """
+    Compile pending files of the batch. Outputs are outputs of the slaves.
+    """
+
+    color = 'GREEN'
+    nocache = True
+    lang = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slaves = []
+        self.num = 0
+        self.batchDir = None
+        self.uid_ = None
+
+    def keyword(self):
+        return 'Compiling'
+
+    def __str__(self):
+        pending = len([x for x in self.slaves if getattr(x, 'zmBatchPending', False)])
+        return '%d file%s of %r' % (pending, '' if pending == 1 else 's',
+                                    self.generator.name)
+
+    def uid(self):
+        if self.uid_ is None:
+            tgen = self.generator
+            self.uid_ = Utils.h_list([self.__class__.__name__, tgen.path.abspath(),
+                                      tgen.name, tgen.idx, self.num])
+        return self.uid_
+
+    def compileFunc(self):
+        """
+        Run the compiler. It's replaced by a function from Task.compile_fun
+        in the class for each lang.
+        """
+
+        raise NotImplementedError
+
+    def addSlave(self, task):
+        """ Add compiling task into the batch """
+
+        self.slaves.append(task)
+        self.set_run_after(task)
+        task.process = types.MethodType(_deferredProcess, task)
+
+    def get_cwd(self):
+        return self.batchDir
+
+    def runnable_status(self):
+        for task in self.run_after:
+            if not task.hasrun:
+                return Task.ASK_LATER
+            if task.hasrun < Task.SKIPPED:
+                return Task.CANCEL_ME
+
+        if any(getattr(x, 'zmBatchPending', False) for x in self.slaves):
+            return Task.RUN_ME
+        return Task.SKIP_ME
+
+    def _collect(self, slaves):
+        """
+        Run slaves without the compiler. Results of some of them can be taken
+        from the build cache. Returns slaves that must be compiled.
+        """
+
+        queued = []
+        for task in slaves:
+            task.zmBatchQueued = False
+            task.zmBatchCollect = True
+            try:
+                ret = task.run()
+            finally:
+                task.zmBatchCollect = False
+            if ret:
+                task.err_code = ret
+                task.hasrun = Task.CRASHED
+            elif task.zmBatchQueued:
+                for node in task.outputs:
+                    # stale object file must not be used by anything
+                    try:
+                        os.remove(node.abspath())
+                    except OSError:
+                        pass
+                queued.append(task)
+        return queued
+
+    def _compile(self, slaves, ext):
+        """
+        Compile files of slaves by one invocation of the compiler
+        """
+
+        cwd = self.generator.get_cwd().abspath()
+        env = self.env
+        env.ZMBATCH_INCPATHS = [os.path.normpath(os.path.join(cwd, x))
+                                for x in env.INCPATHS]
+        env.ZMBATCH_SRC = [x.inputs[0].abspath() for x in slaves]
+
+        ret = self.compileFunc()
+        if ret:
+            for task in slaves:
+                task.err_code = ret
+                task.hasrun = Task.CRASHED
+            return ret
+
+        batchDir = self.batchDir.abspath()
+        for task in slaves:
+            name = _objName(task, ext)
+            target = task.outputs[0].abspath()
+            os.replace(os.path.join(batchDir, name), target)
+            depfile = os.path.join(batchDir, name[:-len(ext)] + '.d')
+            if os.path.isfile(depfile):
+                # depfile from the compiler, see zm.waf.depscanner
+                os.replace(depfile, target[:target.rfind('.')] + '.d')
+        return 0
+
+    def run(self):
+        """
+        Compile pending files of slaves and finish slaves
+        """
+
+        slaves = [x for x in self.slaves if getattr(x, 'zmBatchPending', False)]
+        for task in slaves:
+            task.zmBatchPending = False
+
+        queued = self._collect(slaves)
+        ext = _COMPILERS[self.env['%s_NAME' % _LANGS[self.lang][0]]]
+
+        invocations = _splitByNames(queued, ext)
+        if invocations:
+            self.batchDir.mkdir()
+
+        ret = 0
+        for tasks in invocations:
+            ret = self._compile(tasks, ext) or ret
+
+        bld = self.generator.bld
+        for task in slaves:
+            if task.hasrun == Task.SUCCESS:
+                # the same as in the Task.process
+                try:
+                    task.post_run()
+                except Errors.WafError:
+                    pass
+                except Exception: # pylint: disable = broad-except
+                    task.err_msg = traceback.format_exc()
+                    task.hasrun = Task.EXCEPTION
+                    ret = ret or 1
+
+            if task.hasrun != Task.SUCCESS:
+                ret = ret or getattr(task, 'err_code', None) or 1
+                try:
+                    # rescan dependencies on next run
+                    del bld.imp_sigs[task.uid()]
+                except KeyError:
+                    pass
+
+        return ret
+
+    def post_run(self):
+        """
+        Do nothing: the batch has no own signature, signatures of slaves
+        are saved by their post_run.
+        """
+
+def _makeTaskClass(lang):
+    ccVar, flagsVar = _LANGS[lang]
+    runStr = _RUN_STR % { 'cc' : ccVar, 'flags' : flagsVar }
+    func, _ = Task.compile_fun(runStr)
+    return type('batch%s' % lang, (_BatchTaskBase,), {
+        'lang' : lang,
+        'compileFunc' : func,
+    })
+
+for _lang in _LANGS:
+    _makeTaskClass(_lang)
+
+    @asmethod(Task.classes[_lang], 'run', saveOrigAs = '_zmOrigRun')
+    def _slaveRun(self):
+        if getattr(self, 'zmBatchCollect', False):
+            self.zmBatchQueued = True
+            return 0
+        return self._zmOrigRun() # pylint: disable = protected-access
+
+def _batchSize(tgen):
+
+    zmTaskParams = getattr(tgen, 'zm-task-params', {})
+    param = zmTaskParams.get('batch-compile', False)
+    if not param:
+        return 0
+    if param is True:
+        return DEFAULT_BATCH_SIZE
+    return param
+
+@feature('c', 'cxx')
+@after_method('process_source', 'apply_link', 'propagate_uselib_vars',
+              'apply_incpaths', 'applyPch')
+def applyBatchCompile(tgen):
+    """
+    Group compiling tasks into batches for tasks with the param 'batch-compile'
+    """
+
+    batchSize = _batchSize(tgen)
+    if batchSize <= 1:
+        return
+
+    bld = tgen.bld
+    groups = {}
+    for task in getattr(tgen, 'compiled_tasks', []):
+        lang = task.__class__.__name__
+        if lang not in _LANGS:
+            continue
+        env = task.env
+        if env['%s_NAME' % _LANGS[lang][0]] not in _COMPILERS or env.ZM_MSVCDEPS:
+            # msvc reports dependencies by its output for each file
+            continue
+        # only files with the same command line can be compiled together
+        key = (lang, bld.hash_env_vars(env, task.vars))
+        groups.setdefault(key, []).append(task)
+
+    name = _RE_UNSAFE_CHARS.sub('_', tgen.name)
+    linkTask = getattr(tgen, 'link_task', None)
+    num = 0
+    for (lang, _), tasks in groups.items():
+        for start in range(0, len(tasks), batchSize):
+            batch = tasks[start:start + batchSize]
+            if len(batch) == 1:
+                continue
+
+            master = tgen.create_task('batch%s' % lang)
+            master.env = batch[0].env.derive()
+            master.env.ZMBATCH_FLAGS = master.env['%s_TGT_F' % _LANGS[lang][0]][:-1]
+            master.num = num
+            master.batchDir = tgen.path.get_bld().make_node(
+                '%s.%d.batch-%d' % (name, tgen.idx, num))
+            num += 1
+            for task in batch:
+                master.addSlave(task)
+            if linkTask is not None:
+                linkTask.set_run_after(master)
+
+    if num:
+        log.debug('batchcc: task %r has %d batches' % (tgen.name, num))
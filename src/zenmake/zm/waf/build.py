@@ -8,20 +8,28 @@
 
 import os
 import sys
+import pickle
 
+from waflib import Context, Node, Utils, Errors
 from waflib.ConfigSet import ConfigSet
 from waflib.Build import BuildContext as WafBuildContext, inst as InstallTask
+from waflib.Build import SAVED_ATTRS
 from zm.constants import DEFAULT_BUILDWORKNAME
 from zm.pyutils import asmethod
-from zm.utils import Timer
-from zm import log, db, error
+from zm.utils import Timer, statFile
+from zm import log, db, error, cli
 from zm.waf.assist import makeTasksCachePath
+from zm.waf import buildstate, buildcache, globindex, critpath, jobserver, throttle
+from zm.waf import fastpartial, hashcache
 from zm.edeps import produceExternalDeps
 
 joinpath = os.path.join
 
 BuildContext = WafBuildContext
 
+# Waf build states preloaded with preloadBuildState: {path: (stat, nodeClass, data)}
+_preloadedStates = {}
+
 # WafBuildContext is used for many other waf commands as the base class
 # and therefore the decorator @asmethod is used to insert new methods into this class.
 
@@ -72,6 +80,25 @@ def _loadTasksDataForClean(self, bconf, cachePath):
 
     return tasksDb.load()
 
+class _LazyTaskEnvs(dict):
+    """
+    Dict of envs for BuildContext.all_envs where task envs are made only
+    on demand.
+    """
+
+    __slots__ = ('_taskenvs', )
+
+    def __init__(self, envs, taskenvs):
+        super().__init__(envs)
+        self._taskenvs = taskenvs
+
+    def __missing__(self, key):
+        table = self._taskenvs[key]
+        env = ConfigSet()
+        env.table = table
+        self[key] = env
+        return env
+
 @asmethod(WafBuildContext, 'loadTasks')
 def _loadTasks(self):
 
@@ -98,15 +125,117 @@ def _loadTasks(self):
     self.zmtasks = tasks = tasksData['tasks']
     taskenvs = tasksData['taskenvs']
 
-    for taskParams in tasks.values():
-        taskVariant = taskParams['$task.variant']
-        env = ConfigSet()
-        env.table = taskenvs[taskVariant]
-        self.all_envs[taskVariant] = env
+    if isinstance(taskenvs, db.LazyDict) and self.cmd != 'clean':
+        # don't load envs of tasks that are not used in the current build
+        self.all_envs = _LazyTaskEnvs(self.all_envs, taskenvs)
+    else:
+        for taskParams in tasks.values():
+            taskVariant = taskParams['$task.variant']
+            env = ConfigSet()
+            env.table = taskenvs[taskVariant]
+            self.all_envs[taskVariant] = env
 
     self.zmOrdTaskNames = tuple(tasksData['ordered-tasknames'])
     self.zmdepconfs = tasksData['depconfs']
 
+def preloadBuildState(variantDir):
+    """
+    Load Waf build state (see waflib.Build.SAVED_ATTRS) for the variant
+    directory and keep it in memory for the next call of
+    BuildContext.restore. It's used by the ZenMake daemon.
+    """
+
+    dbfn = joinpath(variantDir, Context.DBFILE)
+    _preloadedStates.pop(dbfn, None)
+
+    try:
+        stat = statFile(dbfn)
+        data = Utils.readf(dbfn, 'rb')
+    except (EnvironmentError, EOFError):
+        return
+
+    # The same way as in the Waf Context.__init__
+    nodeClass = type('Nod3', (Node.Node,), {})
+    nodeClass.__module__ = 'waflib.Node'
+    nodeClass.ctx = None
+
+    with Node.pickle_lock:
+        Node.Nod3 = nodeClass
+        try:
+            data = pickle.loads(data)
+        except Exception: # pylint: disable = broad-except
+            return
+
+    _preloadedStates[dbfn] = (stat, nodeClass, data)
+
+def _popPreloadedBuildState(dbfn):
+
+    stat, nodeClass, data = _preloadedStates.pop(dbfn, (None, None, None))
+    if stat is None:
+        return None, None
+
+    try:
+        if statFile(dbfn) != stat:
+            return None, None
+    except EnvironmentError:
+        return None, None
+
+    return nodeClass, data
+
+@asmethod(WafBuildContext, 'restoreTools')
+def _restoreTools(self):
+    """
+    Set up Waf tools from the 'build.config.py' file.
+    It's the first part of the Waf BuildContext.restore.
+    """
+
+    try:
+        env = ConfigSet(joinpath(self.cache_dir, 'build.config.py'))
+    except EnvironmentError:
+        pass
+    else:
+        if env.version < Context.HEXVERSION:
+            raise Errors.WafError('Project was configured with a different '
+                                  'version of Waf, please reconfigure it')
+        for tool in env.tools:
+            self.setup(**tool)
+
+@asmethod(WafBuildContext, 'restore', saveOrigAs = '_wafRestore')
+def _restore(self):
+
+    if db.isBuildStateSharded():
+        buildstate.restore(self)
+        return
+
+    if not _preloadedStates:
+        self._wafRestore() # pylint: disable = protected-access
+        return
+
+    dbfn = joinpath(self.variant_dir, Context.DBFILE)
+    nodeClass, data = _popPreloadedBuildState(dbfn)
+    if nodeClass is None:
+        self._wafRestore() # pylint: disable = protected-access
+        return
+
+    # The same as in the Waf BuildContext.restore but without reading of dbfn
+    self.restoreTools()
+
+    nodeClass.ctx = self
+    self.node_class = nodeClass
+    for name in SAVED_ATTRS:
+        setattr(self, name, data.get(name, {}))
+
+    self.init_dirs()
+
+@asmethod(WafBuildContext, 'store', saveOrigAs = '_wafStore')
+def _store(self):
+
+    if db.isBuildStateSharded():
+        buildstate.store(self)
+        return
+
+    self._wafStore() # pylint: disable = protected-access
+
 @asmethod(WafBuildContext, 'init_dirs', wrap = True, callOrigFirst = True)
 def _initDirs(self):
     if self.buildWorkDirName:
@@ -116,12 +245,29 @@ def _initDirs(self):
 @asmethod(WafBuildContext, 'execute_build')
 def _executeBuild(self):
 
+    globindex.setUp(self)
+    jobserver.setUp(self)
+    try:
+        _runBuild(self)
+    finally:
+        jobserver.finish(self)
+
+def _runBuild(self):
+
     if self.cmd in ('build', 'install', 'uninstall'):
         produceExternalDeps(self)
         log.printStep(self.cmd.capitalize() + 'ing')
 
     self.recurse([self.run_dir])
 
+    withCritPathReport = self.cmd == 'build' and cli.selected.args.get('criticalPath')
+    if self.cmd == 'build':
+        buildcache.setUp(self)
+        critpath.setUp(self, withCritPathReport)
+        fastpartial.setUp(self)
+    hashcache.setUp(self)
+    throttle.setUp(self)
+
     # display the time elapsed in the progress bar
     self.timer = Timer()
 
@@ -140,6 +286,11 @@ def _executeBuild(self):
                 'c2': colors.cursor_on,
             }
             log.info(msg, extra = logExtra)
+        globindex.finish(self)
+
+    buildcache.finish(self)
+    if withCritPathReport:
+        critpath.report(self, self.jobs)
 
     try:
         self.producer.bld = None
@@ -0,0 +1,561 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Content-addressed local cache of build results (see general.build-cache).
+ Output files of build tasks are stored in a local directory by a key made
+ from the task signature and then they can be reused instead of running
+ the same task again: after 'cleanall', in another branch or in another
+ checkout of the same project.
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import threading
+from urllib.parse import urlsplit
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+
+from waflib import Task, Utils, Build, Runner
+from waflib.Build import BuildContext as WafBuildContext
+from waflib.Tools.ccroot import vnum as VNumTask
+from zm.pyutils import asmethod, stringtype
+from zm import log, error, cacheproto
+
+joinpath = os.path.join
+isdir = os.path.isdir
+
+DEFAULT_MAX_SIZE = 10 * 1024 ** 3
+
+# minimal interval between checks of the cache size
+_TRIM_INTERVAL = 3 * 60
+_TRIM_STAMP_FILENAME = '.trim-stamp'
+
+_HTTP_TIMEOUT = 60
+
+_SIZE_SUFFIXES = { '' : 1, 'K' : 1024, 'M' : 1024 ** 2, 'G' : 1024 ** 3, 'T' : 1024 ** 4 }
+_RE_SIZE = re.compile(r'^\s*(\d+)\s*([KMGT]?)B?\s*$', re.IGNORECASE)
+
+def defaultCacheDir():
+    """ Get default directory for the build cache """
+
+    path = os.environ.get('XDG_CACHE_HOME')
+    if not path:
+        path = joinpath(os.path.expanduser('~'), '.cache')
+    return joinpath(path, 'zenmake', 'build-cache')
+
+def parseSize(value):
+    """
+    Convert value like 100000, '500M' or '10G' into amount of bytes
+    """
+
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+
+    match = _RE_SIZE.match(str(value))
+    if not match:
+        raise error.ZenMakeError("Invalid size value: %r" % value)
+    return int(match.group(1)) * _SIZE_SUFFIXES[match.group(2).upper()]
+
+def _copyFile(src, dst):
+    tmp = '%s.%d.%d.tmp' % (dst, os.getpid(), threading.get_ident())
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+class BuildCache(object):
+    """
+    Local directory store of build results with LRU eviction
+    """
+
+    __slots__ = (
+        'dirpath', 'maxSize', '_lock', 'requests', 'hits', 'stored',
+    )
+
+    def __init__(self, dirpath, maxSize = DEFAULT_MAX_SIZE):
+        self.dirpath = dirpath
+        self.maxSize = maxSize
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+        self.stored = 0
+
+    def _entryPath(self, key):
+        return joinpath(self.dirpath, key[:2], key)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def fetch(self, key, paths):
+        """
+        Copy cached files into paths. Returns True on success.
+        """
+
+        self._count('requests')
+
+        entryPath = self._entryPath(key)
+        try:
+            for idx, path in enumerate(paths):
+                _copyFile(joinpath(entryPath, str(idx)), path)
+            # mark as recently used
+            os.utime(entryPath)
+        except EnvironmentError:
+            return False
+
+        self._count('hits')
+        return True
+
+    def _storeLocal(self, key, paths):
+
+        entryPath = self._entryPath(key)
+        if isdir(entryPath):
+            return False
+
+        tmpPath = '%s.%d.%d.tmp' % (entryPath, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(tmpPath)
+            for idx, path in enumerate(paths):
+                shutil.copy2(path, joinpath(tmpPath, str(idx)))
+            os.rename(tmpPath, entryPath)
+        except EnvironmentError:
+            # the same entry can be stored by another process at the same time
+            shutil.rmtree(tmpPath, ignore_errors = True)
+            return False
+
+        return True
+
+    def store(self, key, paths):
+        """
+        Store files into the cache
+        """
+
+        if self._storeLocal(key, paths):
+            self._count('stored')
+
+    def query(self, keys):
+        """
+        Hint that entries with these keys are going to be fetched soon.
+        It's used by remote cache to ask about many keys at once.
+        """
+
+    def trim(self, force = False):
+        """
+        Remove least recently used entries to fit the cache into maxSize.
+        Without 'force' it's done not often than once in a few minutes.
+        """
+
+        stampPath = joinpath(self.dirpath, _TRIM_STAMP_FILENAME)
+        if not force:
+            try:
+                if time.time() - os.stat(stampPath).st_mtime < _TRIM_INTERVAL:
+                    return
+            except EnvironmentError:
+                pass
+
+        try:
+            with open(stampPath, 'wb'):
+                pass
+            entries, totalSize = cacheproto.gatherEntries(self.dirpath)
+        except EnvironmentError:
+            return
+
+        if totalSize <= self.maxSize:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            shutil.rmtree(path, ignore_errors = True)
+            totalSize -= size
+            if totalSize <= self.maxSize:
+                break
+
+    def _statsMsg(self):
+        misses = self.requests - self.hits
+        ratio = 100.0 * self.hits / self.requests
+        msg = 'Build cache: %d hits, %d misses (%.1f%% hit ratio), %d stored'
+        return msg % (self.hits, misses, ratio, self.stored)
+
+    def printStats(self):
+        """ Print statistics of the cache usage """
+
+        if not self.requests:
+            return
+
+        log.info(self._statsMsg(), extra = { 'c1': log.colors.CYAN })
+
+class RemoteBuildCache(BuildCache):
+    """
+    Local build cache backed by remote HTTP server (see zm.cacheproto
+    for the protocol). Entries missed in the local cache are downloaded
+    from the server and new entries are uploaded to the server.
+    """
+
+    __slots__ = (
+        'url', 'upload', 'remoteHits', 'uploaded',
+        '_conninfo', '_threadData', '_remoteKeys', '_disabled',
+    )
+
+    def __init__(self, dirpath, url, maxSize = DEFAULT_MAX_SIZE, upload = True):
+        super().__init__(dirpath, maxSize)
+
+        parsed = urlsplit(url)
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            raise error.ZenMakeError("Invalid URL for the build cache: %r" % url)
+
+        self.url = url
+        self.upload = upload
+        self.remoteHits = 0
+        self.uploaded = 0
+        self._conninfo = (parsed.scheme, parsed.netloc, parsed.path.rstrip('/'))
+        self._threadData = threading.local()
+        # {key: True/False} - known existence of entries on the server
+        self._remoteKeys = {}
+        self._disabled = False
+
+    def _connection(self):
+        conn = getattr(self._threadData, 'conn', None)
+        if conn is None:
+            scheme, netloc, _ = self._conninfo
+            connCls = HTTPSConnection if scheme == 'https' else HTTPConnection
+            conn = self._threadData.conn = connCls(netloc, timeout = _HTTP_TIMEOUT)
+        return conn
+
+    def _request(self, method, path, body = None, headers = None):
+        """
+        Send request and return response. Returns None on a network
+        error and then the remote cache is disabled for the rest of the build.
+        """
+
+        if self._disabled:
+            return None
+
+        url = self._conninfo[2] + path
+        headers = headers or {}
+        for attempt in (0, 1):
+            conn = self._connection()
+            try:
+                conn.request(method, url, body() if callable(body) else body, headers)
+                return conn.getresponse()
+            except (OSError, HTTPException) as ex:
+                conn.close()
+                self._threadData.conn = None
+                # a persistent connection can be closed by the server
+                # so it's allowed to try again once
+                if attempt:
+                    self._disable(ex)
+        return None
+
+    def _disable(self, ex):
+        with self._lock:
+            if self._disabled:
+                return
+            self._disabled = True
+        log.warn('Remote build cache %r is not available: %s' % (self.url, ex))
+
+    def _download(self, key, paths):
+
+        resp = self._request('GET', cacheproto.OBJECTS_PATH + key)
+        if resp is None:
+            return False
+        if resp.status != 200:
+            resp.read()
+            return False
+
+        tmpPaths = ['%s.%d.tmp' % (x, threading.get_ident()) for x in paths]
+        try:
+            fileInfo = cacheproto.readEntryHeader(resp.read)
+            if len(fileInfo) != len(paths):
+                raise ValueError('Wrong amount of files in the entry')
+            for (size, mode), tmpPath in zip(fileInfo, tmpPaths):
+                with open(tmpPath, 'wb') as file:
+                    while size > 0:
+                        chunk = resp.read(min(size, cacheproto.CHUNK_SIZE))
+                        if not chunk:
+                            raise ValueError('Truncated entry')
+                        file.write(chunk)
+                        size -= len(chunk)
+                os.chmod(tmpPath, mode)
+            for tmpPath, path in zip(tmpPaths, paths):
+                os.replace(tmpPath, path)
+        except (OSError, HTTPException, ValueError) as ex:
+            for tmpPath in tmpPaths:
+                if os.path.exists(tmpPath):
+                    os.remove(tmpPath)
+            if not isinstance(ex, ValueError):
+                self._disable(ex)
+            self._threadData.conn = None
+            return False
+
+        return True
+
+    def query(self, keys):
+
+        keys = [x for x in keys if x not in self._remoteKeys]
+        if not keys or self._disabled:
+            return
+
+        found = set()
+        for idx in range(0, len(keys), cacheproto.MAX_EXISTS_KEYS):
+            body = { 'keys' : keys[idx:idx + cacheproto.MAX_EXISTS_KEYS] }
+            body = json.dumps(body).encode('utf-8')
+            headers = { 'Content-Type' : 'application/json' }
+            resp = self._request('POST', cacheproto.EXISTS_PATH, body, headers)
+            if resp is None:
+                return
+            data = resp.read()
+            if resp.status != 200:
+                return
+            try:
+                found.update(json.loads(data.decode('utf-8'))['found'])
+            except (ValueError, KeyError, TypeError):
+                return
+
+        with self._lock:
+            self._remoteKeys.update((x, x in found) for x in keys)
+
+    def fetch(self, key, paths):
+
+        if super().fetch(key, paths):
+            return True
+
+        if not self._remoteKeys.get(key, True) or not self._download(key, paths):
+            return False
+
+        self._storeLocal(key, paths)
+        with self._lock:
+            self.hits += 1
+            self.remoteHits += 1
+        return True
+
+    def store(self, key, paths):
+
+        super().store(key, paths)
+
+        if not self.upload or self._remoteKeys.get(key, False):
+            return
+
+        size, _ = cacheproto.entryChunks(paths)
+        headers = {
+            'Content-Type' : 'application/octet-stream',
+            'Content-Length' : str(size),
+        }
+
+        def body():
+            return cacheproto.entryChunks(paths)[1]
+
+        resp = self._request('PUT', cacheproto.OBJECTS_PATH + key, body, headers)
+        if resp is None:
+            return
+        resp.read()
+        if resp.status == 201:
+            self._count('uploaded')
+
+    def _statsMsg(self):
+        msg = super()._statsMsg()
+        return msg + ', %d remote hits, %d uploaded' % (self.remoteHits, self.uploaded)
+
+def _makeKey(task):
+
+    key = getattr(task, 'zmCacheKey', None)
+    if key is not None:
+        return key
+
+    bld = task.generator.bld
+    srcnode = bld.srcnode
+    zmTaskParams = getattr(task.generator, 'zm-task-params', {})
+
+    hasher = Utils.md5()
+    update = hasher.update
+    update(task.__class__.__name__.encode())
+    update(zmTaskParams.get('$task.variant', '').encode())
+    for node in task.inputs + task.outputs:
+        update(node.path_from(srcnode).encode())
+    update(task.signature())
+    task.zmCacheKey = key = Utils.to_hex(hasher.digest())
+    return key
+
+def _isCacheable(cls):
+
+    if getattr(cls, 'nocache', False) or getattr(cls, 'always_run', False):
+        return False
+    return not issubclass(cls, (Build.inst, VNumTask))
+
+def _wrapTaskClass(cls):
+
+    origRun = getattr(cls, 'run', None)
+    if origRun is None or getattr(origRun, 'zmCacheWrapped', False):
+        # abstract class or wrapped already (can be inherited)
+        return
+    if not _isCacheable(cls):
+        return
+
+    origPostRun = cls.post_run
+
+    def run(self):
+        cache = getattr(self.generator.bld, 'zmBuildCache', None)
+        self.zmCacheMiss = False
+        if cache is None or not self.outputs:
+            return origRun(self)
+
+        if cache.fetch(_makeKey(self), [x.abspath() for x in self.outputs]):
+            # the same attr as in the waflib.extras.wafcache
+            self.cached = True
+            return 0
+        self.zmCacheMiss = True
+        return origRun(self)
+
+    def postRun(self):
+        ret = origPostRun(self)
+        if getattr(self, 'zmCacheMiss', False):
+            key = self.zmCacheKey
+            paths = [x.abspath() for x in self.outputs]
+            if all(os.path.isfile(x) for x in paths):
+                self.generator.bld.zmBuildCache.store(key, paths)
+        return ret
+
+    run.zmCacheWrapped = True
+    cls.run = run
+    cls.post_run = postRun
+
+def _stripRootPath(value, rootdir):
+    """
+    Remove the path of the project root from the repr of env values. The path
+    is removed anywhere in the values (also inside flags like -I/root/include)
+    but only if it's followed by a path separator or by the end of a string,
+    so a sibling directory with the same prefix stays as is.
+    """
+
+    # paths in the repr have escaped backslashes on Windows
+    root = repr(rootdir)[1:-1]
+    seps = [re.escape(repr(x)[1:-1]) for x in (os.sep, os.altsep) if x]
+    pattern = r'%s(?=%s|[\'"])' % (re.escape(root), '|'.join(seps))
+    return re.sub(pattern, '', value)
+
+@asmethod(WafBuildContext, 'hash_env_vars', saveOrigAs = '_wafHashEnvVars')
+def _hashEnvVars(self, env, varsList):
+    """
+    Hash env vars without the path of the project root when the build cache
+    is used. It makes task signatures the same in different checkouts.
+    """
+
+    if getattr(self, 'zmBuildCache', None) is None:
+        return self._wafHashEnvVars(env, varsList) # pylint: disable = protected-access
+
+    if not env.table:
+        env = env.parent
+        if not env:
+            return Utils.SIG_NIL
+
+    idx = str(id(env)) + str(varsList)
+    try:
+        cache = self.cache_env
+    except AttributeError:
+        cache = self.cache_env = {}
+    else:
+        try:
+            return cache[idx]
+        except KeyError:
+            pass
+
+    value = str([env[x] for x in varsList])
+    value = _stripRootPath(value, self.srcnode.abspath())
+    result = Utils.md5(value.encode()).digest()
+    cache[idx] = result
+    return result
+
+@asmethod(Runner.Parallel, 'refill_task_list', wrap = True, callOrigFirst = True)
+def _refillTaskList(self):
+    """
+    Ask remote build cache about all tasks that are ready to run at once
+    instead of one request per task.
+    """
+
+    cache = getattr(self.bld, 'zmBuildCache', None)
+    if not isinstance(cache, RemoteBuildCache):
+        return
+
+    taskSigs = self.bld.task_sigs
+    keys = []
+    for task in self.outstanding:
+        if task.hasrun or getattr(task, 'zmCacheQueried', False):
+            continue
+        task.zmCacheQueried = True
+        if not task.outputs or not getattr(task.run, 'zmCacheWrapped', False):
+            continue
+        try:
+            if taskSigs.get(task.uid()) == task.signature():
+                # the task is probably up to date
+                continue
+            keys.append(_makeKey(task))
+        except Exception: # pylint: disable = broad-except
+            # it will be reported by the task itself
+            continue
+
+    if keys:
+        cache.query(keys)
+
+def getConfig(bconf):
+    """
+    Get dict with params from general.build-cache of the buildconf
+    or None if the build cache is disabled.
+    """
+
+    param = bconf.general.get('build-cache', False)
+    if not param:
+        return None
+
+    dirpath = None
+    config = { 'max-size' : DEFAULT_MAX_SIZE, 'url' : None, 'upload' : True }
+    if isinstance(param, stringtype):
+        dirpath = param
+    elif isinstance(param, dict):
+        dirpath = param.get('dir')
+        config['max-size'] = parseSize(param.get('max-size', DEFAULT_MAX_SIZE))
+        config['url'] = param.get('url')
+        config['upload'] = param.get('upload', True)
+
+    if not dirpath:
+        dirpath = defaultCacheDir()
+    dirpath = os.path.expanduser(dirpath)
+    if not os.path.isabs(dirpath):
+        dirpath = joinpath(bconf.startdir, dirpath)
+
+    config['dir'] = os.path.normpath(dirpath)
+    return config
+
+def setUp(bld):
+    """
+    Enable the build cache for the build context if it's set in buildconf
+    """
+
+    config = getConfig(bld.bconfManager.root)
+    if config is None:
+        bld.zmBuildCache = None
+        return
+
+    dirpath, maxSize, url = config['dir'], config['max-size'], config['url']
+    if url:
+        cache = RemoteBuildCache(dirpath, url, maxSize, config['upload'])
+    else:
+        cache = BuildCache(dirpath, maxSize)
+    bld.zmBuildCache = cache
+
+    for cls in list(Task.classes.values()):
+        _wrapTaskClass(cls)
+
+def finish(bld):
+    """
+    Print statistics and trim the cache
+    """
+
+    cache = getattr(bld, 'zmBuildCache', None)
+    if cache is None:
+        return
+
+    cache.printStats()
+    cache.trim()
@@ -0,0 +1,232 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Sharded storage for the Waf build state (see waflib.Build.SAVED_ATTRS).
+ Waf stores all the build state including the whole node tree in one pickle
+ file and loads it completely on each run. With the db format 'sharded'
+ the state is stored in separate files (shards): one shard for each task
+ variant (it means one shard for each build task). A shard is loaded only
+ when the task generator of this shard is posted and it is rewritten only
+ if it has been changed. Nodes are stored as paths, so the node tree is
+ not stored at all.
+
+ All other attrs from SAVED_ATTRS (for example zmTgenRecords from fastpartial
+ and zmFileHashes from hashcache) cannot be split by task variants and are
+ stored in the common shard '@common'. So the size of this shard is
+ proportional to the size of the whole project, and it is loaded on each
+ build and rewritten each time any of these attrs has been changed.
+"""
+
+import os
+import pickle
+import shutil
+from collections import defaultdict
+
+from waflib import Build, TaskGen
+from zm.pyutils import asmethod
+from zm.utils import toListSimple
+
+joinpath = os.path.join
+
+SHARDS_DIRNAME = '.zmstate'
+
+_PICKLE_PROTOCOL = 4
+
+# attrs of the Waf build state where keys or values are task uids
+_SHARDED_ATTRS = ('task_sigs', 'imp_sigs', 'raw_deps', 'node_deps', 'node_sigs')
+
+# shard for all the data that cannot be assigned to any task variant
+_COMMON_SHARD = '@common'
+
+def _shardName(tgen):
+    zmTaskParams = getattr(tgen, 'zm-task-params', None)
+    if not zmTaskParams:
+        return _COMMON_SHARD
+    return zmTaskParams.get('$task.variant', _COMMON_SHARD)
+
+def _extraAttrs():
+    return [x for x in Build.SAVED_ATTRS if x != 'root' and x not in _SHARDED_ATTRS]
+
+class ShardedState(object):
+    """
+    Loaded shards of the Waf build state for one build context
+    """
+
+    __slots__ = ('dirpath', 'loaded', 'shardOfUid')
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+
+        # {shard name: pickled content of the loaded shard or None}
+        self.loaded = {}
+        # {task uid: shard name} for all task uids from loaded shards
+        self.shardOfUid = {}
+
+    def _shardPath(self, name):
+        return joinpath(self.dirpath, name)
+
+    def load(self, bld, name):
+        """
+        Load shard into the build context if it has not been loaded yet
+        """
+
+        if name in self.loaded:
+            return
+
+        self.loaded[name] = None
+        try:
+            with open(self._shardPath(name), 'rb') as file:
+                dump = file.read()
+            data = pickle.loads(dump)
+        except Exception: # pylint: disable = broad-except
+            # missing/invalid shard means that its tasks must be rebuilt
+            return
+
+        self.loaded[name] = dump
+
+        makeNode = bld.root.make_node
+        shardOfUid = self.shardOfUid
+        for attr in ('task_sigs', 'imp_sigs', 'raw_deps'):
+            items = data.get(attr, {})
+            getattr(bld, attr).update(items)
+            shardOfUid.update((uid, name) for uid in items)
+
+        nodeDeps = bld.node_deps
+        for uid, paths in data.get('node_deps', {}).items():
+            nodeDeps[uid] = [makeNode(x) for x in paths]
+            shardOfUid[uid] = name
+
+        nodeSigs = bld.node_sigs
+        for path, uid in data.get('node_sigs', {}).items():
+            nodeSigs[makeNode(path)] = uid
+            shardOfUid[uid] = name
+
+        for attr, items in data.get('extras', {}).items():
+            setattr(bld, attr, items)
+
+    def clear(self):
+        """
+        Remove all shards
+        """
+
+        shutil.rmtree(self.dirpath, ignore_errors = True)
+        self.loaded = { x:None for x in self.loaded }
+        self.shardOfUid = {}
+
+    def _gatherShards(self, bld):
+
+        shardOfUid = dict(self.shardOfUid)
+        for group in bld.groups:
+            for tgen in group:
+                name = _shardName(tgen)
+                for task in getattr(tgen, 'tasks', []):
+                    shardOfUid[task.uid()] = name
+
+        shards = defaultdict(lambda: { x:{} for x in _SHARDED_ATTRS })
+
+        def getShard(uid):
+            return shards[shardOfUid.get(uid, _COMMON_SHARD)]
+
+        for attr in ('task_sigs', 'imp_sigs', 'raw_deps'):
+            for uid, val in getattr(bld, attr).items():
+                getShard(uid)[attr][uid] = val
+        for uid, nodes in bld.node_deps.items():
+            getShard(uid)['node_deps'][uid] = [x.abspath() for x in nodes]
+        for node, uid in bld.node_sigs.items():
+            getShard(uid)['node_sigs'][node.abspath()] = uid
+
+        shards[_COMMON_SHARD]['extras'] = {
+            attr: getattr(bld, attr, {}) for attr in _extraAttrs()
+        }
+        return shards
+
+    def store(self, bld):
+        """
+        Store all changed shards
+        """
+
+        shards = self._gatherShards(bld)
+        names = set(self.loaded.keys())
+        names.update(shards.keys())
+        names.add(_COMMON_SHARD)
+
+        if not os.path.isdir(self.dirpath):
+            os.makedirs(self.dirpath)
+
+        for name in names:
+            data = shards.get(name)
+            if data is None:
+                # all entries of the loaded shard have gone
+                data = { x:{} for x in _SHARDED_ATTRS }
+            dump = pickle.dumps(data, _PICKLE_PROTOCOL)
+            if dump == self.loaded.get(name):
+                continue
+
+            path = self._shardPath(name)
+            tmppath = path + '.tmp'
+            with open(tmppath, 'wb') as file:
+                file.write(dump)
+            os.replace(tmppath, path)
+            self.loaded[name] = dump
+
+def restore(bld):
+    """
+    Alternative implementation of the Waf BuildContext.restore for sharded
+    build state. It doesn't load any shard except the common one.
+    """
+
+    bld.restoreTools()
+
+    for attr in Build.SAVED_ATTRS:
+        if attr != 'root':
+            setattr(bld, attr, {})
+
+    state = ShardedState(joinpath(bld.variant_dir, SHARDS_DIRNAME))
+    bld.zmBuildState = state
+    state.load(bld, _COMMON_SHARD)
+
+    bld.init_dirs()
+
+def store(bld):
+    """
+    Alternative implementation of the Waf BuildContext.store for sharded
+    build state.
+    """
+
+    state = getattr(bld, 'zmBuildState', None)
+    if state is None:
+        state = bld.zmBuildState = \
+            ShardedState(joinpath(bld.variant_dir, SHARDS_DIRNAME))
+    state.store(bld)
+
+@asmethod(TaskGen.task_gen, 'post', wrap = True, callOrigFirst = False)
+def _tgenPost(self):
+
+    if getattr(self, 'posted', False):
+        return
+
+    state = getattr(self.bld, 'zmBuildState', None)
+    if state is None:
+        return
+
+    state.load(self.bld, _shardName(self))
+
+    # Tasks of dependencies can be checked before their task generators
+    # are posted, so their shards must be loaded too.
+    for name in toListSimple(getattr(self, 'use', [])):
+        try:
+            other = self.bld.get_tgen_by_name(name)
+        except Exception: # pylint: disable = broad-except
+            continue
+        state.load(self.bld, _shardName(other))
+
+@asmethod(Build.CleanContext, 'clean', wrap = True, callOrigFirst = True)
+def _bldClean(self):
+
+    state = getattr(self, 'zmBuildState', None)
+    if state is not None:
+        state.clear()
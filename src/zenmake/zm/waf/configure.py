@@ -1072,11 +1072,13 @@ def execute(self):
         self.zmMetaConfAttrs.update({
             'last-python-ver': '.'.join(str(x) for x in sys.version_info[:3]),
             'last-dbformat': db.getformat(),
+            'last-hash-algo': utils.defaultHashAlgoName(),
         })
         zmMetaFilePath = bconfPaths.zmmetafile
 
         zmmeta = AutoDict(
             monitfiles = self.monitFiles,
+            monitstat = bconf.general.get('monitor-files-stat', True),
             attrs = self.zmMetaConfAttrs,
             buildtype = bconf.selectedBuildType,
             cliargs = cli.selected.args,
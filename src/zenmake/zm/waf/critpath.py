@@ -0,0 +1,262 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Critical path aware scheduling of build tasks. By default the Waf runner
+ gives a task higher priority if more tasks depend on it, but it knows
+ nothing about how long tasks run. Here durations of executed tasks are
+ stored in the Waf build state and then the priority of a task is the
+ length of the longest path from this task to the end of the build
+ (the task itself with all tasks that depend on it). So long chains like
+ 'heavy compiling -> linking -> linking of dependent targets' start as
+ early as possible and cores are not idle at the end of the build.
+"""
+
+import sys
+import time
+
+from waflib import Build, Task, TaskGen, Runner
+from waflib.Build import BuildContext as WafBuildContext
+from zm.pyutils import asmethod
+from zm import log
+
+# Durations of executed tasks are stored in the Waf build state
+# as {task uid: (duration in seconds, task class name)}
+_TIMES_ATTR = 'zmTaskTimes'
+if _TIMES_ATTR not in Build.SAVED_ATTRS:
+    Build.SAVED_ATTRS.append(_TIMES_ATTR)
+
+# duration of a task without any known durations of similar tasks
+_DEFAULT_DURATION = 1.0
+
+# Priority from the Waf (tree_weight with amount of dependent tasks) is used
+# only to order tasks with the same durations: it's scaled to be much less
+# than any real difference of durations.
+_WAF_PRIO_SCALE = 1e-6
+
+# max amount of tasks in the printed critical path
+_MAX_PATH_TO_SHOW = 10
+
+def _taskDeps(task):
+    """
+    Get tasks that must be done before the task
+    """
+
+    result = []
+    for dep in task.run_after:
+        if isinstance(dep, Task.TaskGroup):
+            result.extend(dep.prev)
+        else:
+            result.append(dep)
+    return result
+
+def _makeEstimator(times):
+    """
+    Make function to get expected duration of a task. Unknown tasks
+    get average duration of known tasks of the same class.
+    """
+
+    sums = {}
+    for duration, clsName in times.values():
+        total, count = sums.get(clsName, (0.0, 0))
+        sums[clsName] = (total + duration, count + 1)
+    averages = { k: total / count for k, (total, count) in sums.items() }
+
+    def estimate(task):
+        known = times.get(task.uid())
+        if known is not None:
+            return known[0]
+        return averages.get(task.__class__.__name__, _DEFAULT_DURATION)
+
+    return estimate
+
+@asmethod(Runner.Parallel, 'prio_and_split', saveOrigAs = '_wafPrioAndSplit')
+def _prioAndSplit(self, tasks):
+    """
+    Set priorities of tasks as lengths of the longest remaining paths
+    by known durations of tasks. It's the same as in the Waf but with
+    durations instead of amounts of dependent tasks. The Waf priority is
+    kept only as a tie-breaker.
+    """
+
+    # Waf method detects cycles and fills self.revdeps
+    ready, waiting = self._wafPrioAndSplit(tasks) # pylint: disable = protected-access
+
+    bld = self.bld
+    seen = getattr(bld, 'zmSeenTaskUids', None)
+    if seen is not None:
+        seen.update(x.uid() for x in tasks if not isinstance(x, Task.TaskGroup))
+
+    deps = getattr(bld, 'zmTaskDeps', None)
+    if deps is not None:
+        # run_after is changed by the runner during the build
+        for task in tasks:
+            deps[task] = _taskDeps(task)
+
+    times = getattr(bld, _TIMES_ATTR, None)
+    if not times:
+        return ready, waiting
+
+    estimate = _makeEstimator(times)
+    reverse = self.revdeps
+    costs = {}
+
+    def visit(task):
+        if isinstance(task, Task.TaskGroup):
+            return max((visit(x) for x in task.next), default = 0)
+
+        cost = costs.get(task)
+        if cost is not None:
+            return cost
+
+        # mark to avoid infinite recursion, cycles were checked already
+        costs[task] = 0
+        cost = estimate(task)
+        if task in reverse:
+            cost += max((visit(x) for x in reverse[task]), default = 0)
+        costs[task] = cost
+        # prio_order is set by the Waf method at this moment
+        task.prio_order = cost + task.prio_order * _WAF_PRIO_SCALE
+        return cost
+
+    for task in tasks:
+        visit(task)
+
+    return ready, waiting
+
+@asmethod(Task.Task, 'process', saveOrigAs = '_wafProcess')
+def _process(self):
+
+    started = time.perf_counter()
+    result = self._wafProcess() # pylint: disable = protected-access
+    finished = time.perf_counter()
+
+    if self.hasrun != Task.SUCCESS:
+        return result
+
+    bld = self.generator.bld
+    spans = getattr(bld, 'zmTaskSpans', None)
+    if spans is not None:
+        spans.append((self, started, finished))
+
+    if not getattr(self, 'cached', False):
+        # results from the build cache say nothing about duration of the task
+        times = getattr(bld, _TIMES_ATTR, None)
+        if times is None:
+            times = {}
+            setattr(bld, _TIMES_ATTR, times)
+        times[self.uid()] = (finished - started, self.__class__.__name__)
+
+    return result
+
+def setUp(bld, withReport):
+    """
+    Prepare for the build. Spans of executed tasks are gathered only if
+    the report is requested.
+    """
+
+    bld.zmSeenTaskUids = set()
+    if withReport:
+        bld.zmTaskSpans = []
+        bld.zmTaskDeps = {}
+
+def _prune(bld):
+    """
+    Remove durations of tasks that were not seen in the build: sources can be
+    removed or renamed and other branches can have other tasks. It's done only
+    if tasks of all task generators were created, otherwise tasks of skipped
+    task generators would be removed as well. Returns True if something has
+    been removed.
+    """
+
+    seen = getattr(bld, 'zmSeenTaskUids', None)
+    times = getattr(bld, _TIMES_ATTR, None)
+    if seen is None or not times:
+        return False
+    bld.zmSeenTaskUids = None
+
+    # task generators which were not posted by the fast partial
+    # build are marked as posted
+    if getattr(bld, 'zmFastPartialSkipped', 0):
+        return False
+    for group in bld.groups:
+        for tgen in group:
+            if isinstance(tgen, TaskGen.task_gen) and not getattr(tgen, 'posted', False):
+                return False
+
+    unseen = [x for x in times if x not in seen]
+    for uid in unseen:
+        del times[uid]
+    return bool(unseen)
+
+@asmethod(WafBuildContext, 'is_dirty', saveOrigAs = '_zmIsDirtyNoTimes')
+def _isDirty(self):
+    # It's called before storing of the build state after the build.
+    # Not all tasks were processed after an error or an interruption
+    # (in this case it's called in the handler of KeyboardInterrupt).
+    dirty = self._zmIsDirtyNoTimes() # pylint: disable = protected-access
+    if self.producer.error or sys.exc_info()[0] is not None:
+        return dirty
+    return _prune(self) or dirty
+
+def report(bld, jobs):
+    """
+    Print the achieved build time of executed tasks with the critical path
+    of these tasks and the theoretical minimum of the build time
+    """
+
+    spans = getattr(bld, 'zmTaskSpans', None)
+    if not spans:
+        log.info('Critical path: no tasks were executed')
+        return
+
+    durations = { task: finished - started for task, started, finished in spans }
+    deps = bld.zmTaskDeps
+
+    # longest path in the DAG of executed tasks by their real durations
+    paths = {}
+    for task, _, _ in sorted(spans, key = lambda x: x[2]):
+        prev = None
+        length = 0.0
+        for dep in deps.get(task, []):
+            depPath = paths.get(dep)
+            if depPath is not None and depPath[0] > length:
+                length, prev = depPath[0], dep
+        paths[task] = (length + durations[task], prev)
+
+    last = max(paths, key = lambda x: paths[x][0])
+    critLength = paths[last][0]
+    chain = []
+    task = last
+    while task is not None:
+        chain.append(task)
+        task = paths[task][1]
+    chain.reverse()
+
+    elapsed = max(x[2] for x in spans) - min(x[1] for x in spans)
+    totalWork = sum(durations.values())
+    lowerBound = max(critLength, totalWork / max(jobs, 1))
+
+    log.info('Critical path: %.3fs through %d of %d executed tasks' % \
+             (critLength, len(chain), len(spans)))
+    shown = chain if len(chain) <= _MAX_PATH_TO_SHOW else \
+            chain[:_MAX_PATH_TO_SHOW // 2] + [None] + chain[-_MAX_PATH_TO_SHOW // 2:]
+    for task in shown:
+        if task is None:
+            log.info('  ...')
+            continue
+        log.info('  %8.3fs  %s' % (durations[task], _taskName(task)))
+
+    efficiency = 100.0 * lowerBound / elapsed if elapsed > 0 else 100.0
+    log.info('Tasks time: %.3fs, total work: %.3fs on %d jobs, '
+             'theoretical minimum: %.3fs (%.0f%%)' % \
+             (elapsed, totalWork, jobs, lowerBound, efficiency))
+
+def _taskName(task):
+    node = task.outputs[0] if task.outputs else (task.inputs[0] if task.inputs else None)
+    if node is None:
+        return task.__class__.__name__
+    return '%s: %s' % (task.__class__.__name__, node.path_from(node.ctx.launch_node()))
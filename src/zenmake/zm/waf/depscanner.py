@@ -0,0 +1,133 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Support of the task param 'dep-scanner'. By default header dependencies of
+ C/C++ files are found by the python C preprocessor (waflib.Tools.c_preproc).
+ With 'dep-scanner' = 'compiler' the compiler reports them during compilation
+ instead: gcc/clang/icc write depfiles with -MMD (see waflib/extras/gccdeps.py)
+ and msvc prints them with /showIncludes (see waflib/extras/msvcdeps.py).
+ These dependencies are stored in the Waf build state (node_deps) in the same
+ way as results of the python scanner.
+"""
+
+from waflib import Task, TaskGen
+from waflib.TaskGen import feature, before_method
+
+_LANG_VARS = (
+    # feature, flags var, compiler name var
+    ('c', 'CFLAGS', 'CC_NAME'),
+    ('cxx', 'CXXFLAGS', 'CXX_NAME'),
+)
+
+_local = {}
+
+def _fixCachedPostRun(cls, isEnabled):
+    """
+    Compiler doesn't run if the result of a task was taken from the build
+    cache (see zm.waf.buildcache) and there are no reported dependencies.
+    The python scanner is used for such tasks.
+    """
+
+    origPostRun = cls.post_run
+
+    def postRun(self):
+        if not getattr(self, 'cached', False) or not isEnabled(self):
+            return origPostRun(self)
+
+        bld = self.generator.bld
+        key = self.uid()
+        bld.node_deps[key], bld.raw_deps[key] = super(cls, self).scan()
+        try:
+            del self.cache_sig
+        except AttributeError:
+            pass
+        return Task.Task.post_run(self)
+
+    cls.post_run = postRun
+
+def _gateMsvcTaskClass(cls):
+    """
+    Extra msvcdeps works for all tasks with msvc. Here it's limited by tasks
+    with 'dep-scanner' = 'compiler'.
+    """
+
+    def gated(name):
+        func = getattr(cls, name)
+        def method(self, *args, **kwargs):
+            if self.env.ZM_MSVCDEPS:
+                return func(self, *args, **kwargs)
+            return getattr(super(cls, self), name)(*args, **kwargs)
+        setattr(cls, name, method)
+
+    for name in ('post_run', 'scan', 'sig_implicit_deps', 'exec_command'):
+        gated(name)
+
+def _load():
+    """
+    Load extras gccdeps/msvcdeps. They replace Task classes 'c' and 'cxx'
+    with derived classes, so it must be done before any such task is created.
+    """
+
+    if _local:
+        return
+
+    # pylint: disable = import-outside-toplevel
+    from waflib.extras import gccdeps
+    for name in ('c', 'cxx'):
+        cls = Task.classes[name]
+        _fixCachedPostRun(cls, lambda tsk: tsk.__class__.__name__ in tsk.env.ENABLE_GCCDEPS)
+
+    from waflib.extras import msvcdeps
+    for name in ('c', 'cxx'):
+        cls = Task.classes[name]
+        _gateMsvcTaskClass(cls)
+        _fixCachedPostRun(cls, lambda tsk: bool(tsk.env.ZM_MSVCDEPS))
+
+    # flags are applied in the applyCompilerDepScanner
+    TaskGen.task_gen.apply_msvcdeps_flags = lambda tgen: None
+
+    _local['gccdeps'] = gccdeps
+    _local['msvcdeps'] = msvcdeps
+
+def setUp(tasks):
+    """
+    Prepare for the build with tasks from zm.waf.wscriptimpl.build
+    """
+
+    for taskParams in tasks:
+        if taskParams.get('dep-scanner') == 'compiler':
+            _load()
+            break
+
+@feature('c', 'cxx')
+@before_method('process_source')
+def applyCompilerDepScanner(tgen):
+    """
+    Set compiler flags and env vars for tasks with 'dep-scanner' = 'compiler'
+    """
+
+    zmTaskParams = getattr(tgen, 'zm-task-params', {})
+    if zmTaskParams.get('dep-scanner') != 'compiler':
+        return
+
+    _load() # it's loaded already in normal case
+    gccdeps = _local['gccdeps']
+    msvcdeps = _local['msvcdeps']
+
+    env = tgen.env
+    for lang, flagsVar, compilerVar in _LANG_VARS:
+        if lang not in tgen.features:
+            continue
+
+        compiler = env[compilerVar]
+        if compiler in gccdeps.supported_compilers:
+            env.append_unique('ENABLE_GCCDEPS', lang)
+            env.append_unique(flagsVar, gccdeps.gccdeps_flags)
+        elif compiler in msvcdeps.supported_compilers:
+            env.ZM_MSVCDEPS = True
+            env.append_unique(flagsVar, msvcdeps.PREPROCESSOR_FLAG)
+        # else the python scanner is used
@@ -0,0 +1,235 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Fast partial rebuilds (general param 'fast-partial'). Waf posts all task
+ generators and so it creates all task objects and computes their
+ signatures before it can detect that almost everything is up to date.
+ It's similar to waflib/extras/fast_partial.py but it works with globbing,
+ variants and task params of ZenMake and it doesn't split the build state.
+
+ After a build the hash of the task params and env of each task generator
+ is stored in the Waf build state with modification times and sizes of all
+ files of its tasks: inputs, outputs and dependencies found by scanners.
+ A task generator is not posted in the next build if the hash and all
+ these files are the same and nothing it depends on has been changed.
+ Task generators which depend on a changed task generator by the param
+ 'use' or by its output files are posted and task generators from their
+ 'use' are posted as well because Waf needs their tasks to link.
+"""
+
+import os
+from collections import defaultdict
+
+from waflib import Build, Task, TaskGen, Utils
+from waflib.Build import BuildContext as WafBuildContext
+from zm.pyutils import asmethod, stringtype
+from zm.utils import toListSimple
+from zm.version import current as currentVersion
+from zm import log, cli
+
+# Records of task generators are stored in the Waf build state
+# as {tgen key: (hash, ((path, stamp), ...), (output path, ...))}
+_RECORDS_ATTR = 'zmTgenRecords'
+if _RECORDS_ATTR not in Build.SAVED_ATTRS:
+    Build.SAVED_ATTRS.append(_RECORDS_ATTR)
+
+def _tgenKey(tgen):
+    zmTaskParams = getattr(tgen, 'zm-task-params', {})
+    return zmTaskParams.get('$task.variant', tgen.name)
+
+def _tgenHash(tgen, globalHash):
+    """
+    Hash of all params and env vars of the task generator. Params with '$'
+    are derived from other params and they can have values that are
+    different in each run.
+    """
+
+    zmTaskParams = getattr(tgen, 'zm-task-params', {})
+    source = getattr(tgen, 'source', None)
+    if source is not None and not isinstance(source, (list, tuple, stringtype)):
+        # nodes are found lazily by default but changes of the found
+        # files must be detected
+        tgen.source = zmTaskParams['source'] = list(source)
+
+    params = sorted((k, v) for k, v in zmTaskParams.items() if k[0] != '$')
+    envVars = sorted(tgen.env.get_merged_dict().items())
+    return Utils.h_list([globalHash, repr(params), repr(envVars)])
+
+def _stamp(path, cache):
+    try:
+        return cache[path]
+    except KeyError:
+        pass
+    try:
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = None
+    cache[path] = stamp
+    return stamp
+
+def _isTracked(task):
+    """
+    Detect that Waf can skip the task if its signature is the same. Tasks
+    with 'always_run' must be executed in each build.
+    """
+
+    return not getattr(task, 'always_run', False)
+
+def selectToPost(tgens, changed, consumers, deps):
+    """
+    Get set of task generators to post. Param 'changed' is a set of changed
+    task generators, 'consumers' is a dict {tgen: tgens that depend on it}
+    and 'deps' is a dict {tgen: tgens from its 'use'}.
+    """
+
+    dirty = set()
+    stack = list(changed)
+    while stack:
+        tgen = stack.pop()
+        if tgen in dirty:
+            continue
+        dirty.add(tgen)
+        stack.extend(consumers.get(tgen, ()))
+
+    result = set()
+    stack = list(dirty)
+    while stack:
+        tgen = stack.pop()
+        if tgen in result:
+            continue
+        result.add(tgen)
+        stack.extend(deps.get(tgen, ()))
+
+    return { x for x in tgens if x in result }
+
+def _globalHash(bld):
+    general = bld.bconfManager.root.general
+    return Utils.h_list([currentVersion(), repr(sorted(general.items()))])
+
+def _makeGraph(tgens, records, producers):
+    """
+    Make graph of task generators from the 'use' params and from the
+    recorded files that are produced by other task generators.
+    Returns tuple (consumers, deps).
+    """
+
+    consumers = defaultdict(set)
+    deps = defaultdict(set)
+    byName = { x.name: x for x in tgens }
+    for tgen in tgens:
+        for name in toListSimple(getattr(tgen, 'use', [])):
+            other = byName.get(name)
+            if other is not None:
+                deps[tgen].add(other)
+                consumers[other].add(tgen)
+
+        record = records.get(_tgenKey(tgen))
+        if record is not None:
+            for path, _ in record[1]:
+                other = producers.get(path)
+                if other is not None and other is not tgen:
+                    consumers[other].add(tgen)
+
+    return consumers, deps
+
+def setUp(bld):
+    """
+    Mark task generators that are up to date as posted, so Waf doesn't
+    create their tasks at all.
+    """
+
+    bld.zmFastPartial = None
+    bld.zmFastPartialSkipped = 0
+    if cli.selected.name != 'build' or \
+            not bld.bconfManager.root.general.get('fast-partial', False):
+        return
+
+    records = getattr(bld, _RECORDS_ATTR, None)
+    if records is None:
+        records = {}
+        setattr(bld, _RECORDS_ATTR, records)
+
+    globalHash = _globalHash(bld)
+    tgens = [x for group in bld.groups for x in group \
+                if isinstance(x, TaskGen.task_gen)]
+    hashes = { x:_tgenHash(x, globalHash) for x in tgens }
+
+    changed = set()
+    producers = {}
+    stamps = {}
+    for tgen in tgens:
+        record = records.get(_tgenKey(tgen))
+        if record is None or record[0] != hashes[tgen]:
+            changed.add(tgen)
+            continue
+        if any(_stamp(path, stamps) != stamp for path, stamp in record[1]):
+            changed.add(tgen)
+        for path in record[2]:
+            producers[path] = tgen
+
+    consumers, deps = _makeGraph(tgens, records, producers)
+    toPost = selectToPost(tgens, changed, consumers, deps)
+    for tgen in tgens:
+        if tgen not in toPost:
+            # Waf doesn't post it again
+            tgen.posted = True
+
+    log.debug('fastpartial: %d of %d task generators are up to date' % \
+              (len(tgens) - len(toPost), len(tgens)))
+    bld.zmFastPartial = { x: hashes[x] for x in toPost }
+    bld.zmFastPartialSkipped = len(tgens) - len(toPost)
+
+def _record(bld):
+    """
+    Update records of posted task generators. Returns True if the records
+    have been changed.
+    """
+
+    hashes = getattr(bld, 'zmFastPartial', None)
+    if not hashes:
+        return False
+    bld.zmFastPartial = None
+
+    records = getattr(bld, _RECORDS_ATTR)
+    nodeDeps = bld.node_deps
+    stamps = {}
+    changed = False
+    for tgen, tgenHash in hashes.items():
+        key = _tgenKey(tgen)
+        if not getattr(tgen, 'posted', False):
+            continue
+
+        tasks = tgen.tasks
+        if not all(x.hasrun in (Task.SUCCESS, Task.SKIPPED) and \
+                    _isTracked(x) for x in tasks):
+            # it must be posted in the next build
+            changed = records.pop(key, None) is not None or changed
+            continue
+
+        paths = set()
+        outputs = set()
+        for task in tasks:
+            paths.update(x.abspath() for x in task.inputs)
+            paths.update(x.abspath() for x in task.dep_nodes)
+            paths.update(x.abspath() for x in nodeDeps.get(task.uid(), ()))
+            outputs.update(x.abspath() for x in task.outputs)
+        paths.update(outputs)
+
+        files = tuple((x, _stamp(x, stamps)) for x in sorted(paths))
+        record = (tgenHash, files, tuple(sorted(outputs)))
+        if records.get(key) != record:
+            records[key] = record
+            changed = True
+
+    return changed
+
+@asmethod(WafBuildContext, 'is_dirty', saveOrigAs = '_wafIsDirty')
+def _isDirty(self):
+    # it's called after the build to detect that the state must be stored
+    recordsChanged = _record(self)
+    return self._wafIsDirty() or recordsChanged # pylint: disable = protected-access
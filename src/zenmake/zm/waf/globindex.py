@@ -0,0 +1,203 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Persistent index of directory listings for path patterns like '**/*.cpp'
+ in the task param 'source' and similar params. Waf method Node.ant_glob
+ lists every directory and checks every entry with os.path.isdir on each
+ build. The index stores listings of directories with their mtimes between
+ builds, so only one os.stat is needed for each visited directory and
+ a directory is listed again only if its mtime has changed. Mtime of
+ a directory is changed on adding, removing and renaming of entries in it,
+ so listings from the index are always up to date.
+"""
+
+import os
+import time
+import pickle
+
+from waflib import Node as WafNode
+from zm import log
+
+joinpath = os.path.join
+
+INDEX_FILENAME = 'glob-index'
+
+_PICKLE_PROTOCOL = 4
+
+# Listing of a directory with a so recent mtime is not trusted next time
+# because the directory can be changed later with the same mtime
+# (filesystems with coarse timestamps).
+_RACY_INTERVAL_NS = 2 * 10 ** 9
+
+# the same as in the Waf Node.ant_iter
+_MAX_DEPTH = 25
+
+_local = {}
+
+class GlobIndex(object):
+    """
+    Index of directory listings: {dirpath: (mtime in ns, entries)} where
+    entries is a tuple of (name, isdir) ordered by names.
+    """
+
+    __slots__ = ('path', 'dirs', 'changed', 'trusted', 'visited')
+
+    def __init__(self, path):
+        self.path = path
+        self.dirs = {}
+        self.changed = False
+
+        # container of dirs with listings that can be used without checking
+        # of their mtimes (see zm.watch)
+        self.trusted = None
+        self.visited = set()
+
+    def load(self):
+        """ Load index from the file """
+
+        try:
+            with open(self.path, 'rb') as file:
+                self.dirs = pickle.load(file)
+        except Exception: # pylint: disable = broad-except
+            # missing/invalid file means empty index
+            self.dirs = {}
+
+    def save(self):
+        """ Save index into the file if it has been changed """
+
+        if not self.changed:
+            return
+
+        tmppath = '%s.%d.tmp' % (self.path, os.getpid())
+        try:
+            with open(tmppath, 'wb') as file:
+                pickle.dump(self.dirs, file, _PICKLE_PROTOCOL)
+            os.replace(tmppath, self.path)
+        except EnvironmentError as ex:
+            log.debug('glob-index: cannot save %r: %s' % (self.path, ex))
+            return
+
+        self.changed = False
+
+    def listdir(self, dirpath):
+        """
+        Get listing of the directory as a tuple of (name, isdir)
+        """
+
+        self.visited.add(dirpath)
+        cached = self.dirs.get(dirpath)
+        trusted = self.trusted
+        if cached is not None and trusted is not None and dirpath in trusted:
+            return cached[1]
+
+        try:
+            mtime = os.stat(dirpath).st_mtime_ns
+        except OSError:
+            if self.dirs.pop(dirpath, None) is not None:
+                self.changed = True
+            raise
+
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        now = int(time.time() * 10 ** 9)
+        with os.scandir(dirpath) as entries:
+            listing = sorted((x.name, x.is_dir()) for x in entries)
+        listing = tuple(listing)
+
+        if now - mtime < _RACY_INTERVAL_NS:
+            mtime = None
+        self.dirs[dirpath] = (mtime, listing)
+        self.changed = True
+        return listing
+
+    def glob(self, startNode, incl, excl, ignorecase = False, withDirs = False):
+        """
+        Find nodes in the same way as the Waf Node.ant_glob with the
+        params remove = False and src = True.
+        """
+
+        # pylint: disable = too-many-arguments
+
+        pats = (WafNode.ant_matcher(incl, ignorecase),
+                WafNode.ant_matcher(excl, ignorecase))
+        result = []
+        self._walk(startNode, pats, withDirs, _MAX_DEPTH, result)
+        return result
+
+    def _walk(self, dirNode, pats, withDirs, maxdepth, result):
+
+        # pylint: disable = too-many-arguments
+
+        try:
+            listing = self.listdir(dirNode.abspath())
+        except OSError:
+            return
+
+        try:
+            dirNode.children
+        except AttributeError:
+            dirNode.children = dirNode.dict_class()
+
+        matcher = WafNode.ant_sub_matcher
+        for name, isdir in listing:
+            npats = matcher(name, pats)
+            if not npats or not npats[0]:
+                continue
+
+            node = dirNode.make_node([name])
+            if [] in npats[0] and (withDirs or not isdir):
+                result.append(node)
+
+            if isdir:
+                node.cache_isdir = True
+                if maxdepth:
+                    self._walk(node, npats, withDirs, maxdepth - 1, result)
+
+def setUp(bld):
+    """
+    Set up the glob index for the build context
+    """
+
+    bconf = bld.bconfManager.root
+    if not bconf.general.get('glob-index', True):
+        return
+
+    path = joinpath(bconf.confPaths.zmcachedir, INDEX_FILENAME)
+    index = GlobIndex(path)
+    index.load()
+    index.trusted = _local.get('trusted')
+    _local['index'] = index
+    bld.zmGlobIndex = index
+
+def finish(bld):
+    """
+    Save the glob index of the build context
+    """
+
+    index = getattr(bld, 'zmGlobIndex', None)
+    if index is not None and os.path.isdir(os.path.dirname(index.path)):
+        index.save()
+
+def trustDirs(dirs):
+    """
+    Set container of dirs that are known to be unchanged since their
+    listings were made. Mtimes of these dirs are not checked.
+    """
+
+    _local['trusted'] = dirs
+
+def lastVisitedDirs():
+    """
+    Get set of dirs visited with the glob index in the last build.
+    It's empty if the index was not saved.
+    """
+
+    index = _local.get('index')
+    if index is None or index.changed:
+        return set()
+    return index.visited
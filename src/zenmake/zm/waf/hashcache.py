@@ -0,0 +1,95 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Support of the general param 'hash-mode'. With the mode 'content' Waf reads
+ each source/header/output file completely to get its signature in each build.
+ With the mode 'stat-then-content' digests of files are stored in the Waf
+ build state with stat data (size, mtime in ns, inode) of the files and a file
+ is read again only if its stat data has been changed. It's similar to
+ the idea of waflib/extras/md5_tstamp.py.
+
+ Digests are stored for each hash algo separately, so a change of the param
+ 'hash-algo' doesn't use digests made by other algo.
+"""
+
+import time
+
+from waflib import Build, Node
+from waflib.Build import BuildContext as WafBuildContext
+from zm.pyutils import asmethod
+from zm.utils import statFile, defaultHashAlgoName
+
+# Digests are stored in the Waf build state
+# as {hash algo name: {path: (stat data, digest)}}
+_HASHES_ATTR = 'zmFileHashes'
+if _HASHES_ATTR not in Build.SAVED_ATTRS:
+    Build.SAVED_ATTRS.append(_HASHES_ATTR)
+
+# A file can be changed in the same tick of mtime after hashing, so
+# recently modified files are not cached. Some file systems have
+# mtime with resolution of 2 seconds.
+_RACY_INTERVAL_NS = 2 * 10**9
+
+class _HashCache(object):
+
+    __slots__ = ('hashes', 'dirty')
+
+    def __init__(self, hashes):
+        self.hashes = hashes
+        self.dirty = False
+
+    def get(self, path, hashFunc):
+        """
+        Get digest of the file by using stored digest if possible
+        """
+
+        stat = statFile(path)
+        entry = self.hashes.get(path)
+        if entry is not None and entry[0] == stat:
+            return entry[1]
+
+        digest = hashFunc()
+        # time.time_ns() is not available in python 3.6
+        if int(time.time() * 1e9) - stat[1] >= _RACY_INTERVAL_NS:
+            self.hashes[path] = (stat, digest)
+            self.dirty = True
+        elif entry is not None:
+            del self.hashes[path]
+            self.dirty = True
+        return digest
+
+def setUp(bld):
+    """
+    Turn on/off stored digests for the build according to the 'hash-mode'
+    """
+
+    bld.zmHashCache = None
+    mode = bld.bconfManager.root.general.get('hash-mode', 'content')
+    if mode != 'stat-then-content':
+        return
+
+    algoName = defaultHashAlgoName()
+    allHashes = getattr(bld, _HASHES_ATTR, None) or {}
+    hashes = allHashes.get(algoName, {})
+    # digests of other algos are not needed anymore
+    setattr(bld, _HASHES_ATTR, { algoName : hashes })
+    bld.zmHashCache = _HashCache(hashes)
+
+@asmethod(Node.Node, 'h_file', saveOrigAs = '_zmHashFileContent')
+def _hFile(self):
+    cache = getattr(self.ctx, 'zmHashCache', None)
+    if cache is None:
+        return self._zmHashFileContent() # pylint: disable = protected-access
+    return cache.get(self.abspath(),
+                     self._zmHashFileContent) # pylint: disable = protected-access
+
+@asmethod(WafBuildContext, 'is_dirty', saveOrigAs = '_zmIsDirtyNoHashes')
+def _isDirty(self):
+    # new digests must be stored even if all tasks are up to date
+    cache = getattr(self, 'zmHashCache', None)
+    dirty = self._zmIsDirtyNoHashes() # pylint: disable = protected-access
+    return dirty or (cache is not None and cache.dirty)
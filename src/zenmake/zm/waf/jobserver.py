@@ -0,0 +1,320 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Support of the GNU make jobserver protocol. Each process of a build can run
+ one job without any token (the implicit token) and must take a token from
+ the jobserver for each other concurrent job. Tokens are bytes in a pipe:
+ a token is taken by reading of one byte and returned by writing of the
+ same byte back. So ZenMake, external dependencies with ZenMake/make and
+ commands of the 'run' task param share one global amount of jobs.
+
+ If ZenMake is run by 'make' with a jobserver then ZenMake is a client of this
+ jobserver. Otherwise ZenMake is the jobserver for its child processes with
+ the amount of jobs from --jobs. Pipe file descriptors of the jobserver are
+ passed into child processes and both forms of the MAKEFLAGS option
+ '--jobserver-auth' are supported: 'R,W' and 'fifo:PATH' (GNU make 4.4+).
+ MAKEFLAGS of the own jobserver is set only for child processes that get
+ these file descriptors, other processes (compilers, linkers) would find
+ closed or unrelated file descriptors by this option.
+ The jobserver of GNU make on Windows uses a semaphore and it is not
+ supported.
+"""
+
+import os
+import select
+import threading
+
+from waflib import Runner, Task, Utils
+from zm.constants import PLATFORM
+from zm.pyutils import asmethod
+from zm import log, cli
+
+_AUTH_PREFIXES = ('--jobserver-auth=', '--jobserver-fds=')
+
+# timeout to check the implicit token while waiting for a token in the pipe
+_POLL_INTERVAL = 0.1
+
+_local = {}
+
+class JobServer(object):
+    """
+    Jobserver or client of a jobserver
+    """
+
+    __slots__ = ('rfd', 'wfd', 'owned', '_implicit', '_lock')
+
+    def __init__(self, rfd, wfd, owned = False):
+        self.rfd = rfd
+        self.wfd = wfd
+        # fds are closed on close() if they were opened by ZenMake
+        self.owned = owned
+        self._implicit = True
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, jobs):
+        """
+        Create new jobserver with tokens for the amount of jobs
+        """
+
+        rfd, wfd = os.pipe()
+        for fd in (rfd, wfd):
+            os.set_inheritable(fd, True)
+        # the implicit token is not in the pipe
+        os.write(wfd, b'+' * (jobs - 1))
+        return cls(rfd, wfd, owned = True)
+
+    @classmethod
+    def connect(cls, auth):
+        """
+        Connect to an existing jobserver with the value of '--jobserver-auth'.
+        Raises OSError if the jobserver is not available.
+        """
+
+        if auth.startswith('fifo:'):
+            fd = os.open(auth[5:], os.O_RDWR)
+            return cls(fd, fd, owned = True)
+
+        try:
+            rfd, wfd = [int(x) for x in auth.split(',')]
+        except ValueError as ex:
+            raise OSError('unsupported jobserver %r' % auth) from ex
+
+        # make doesn't pass fds into commands that are not recursive
+        os.fstat(rfd)
+        os.fstat(wfd)
+        return cls(rfd, wfd)
+
+    @property
+    def fds(self):
+        """ File descriptors that must be inherited by child processes """
+        return (self.rfd, self.wfd) if self.rfd != self.wfd else ()
+
+    def makeflags(self, jobs):
+        """ Get value for MAKEFLAGS options in child processes """
+        return '-j%d --jobserver-auth=%d,%d' % (jobs, self.rfd, self.wfd)
+
+    def acquire(self):
+        """
+        Take a token. It blocks until a token is available.
+        Returns None for the implicit token.
+        """
+
+        while True:
+            with self._lock:
+                if self._implicit:
+                    self._implicit = False
+                    return None
+
+            # the implicit token can be released while waiting
+            if not select.select([self.rfd], [], [], _POLL_INTERVAL)[0]:
+                continue
+            # another process can take the token first and then it waits
+            # for next token
+            token = os.read(self.rfd, 1)
+            if token:
+                return token
+
+            raise OSError('jobserver has been closed')
+
+    def release(self, token):
+        """ Return a token taken by acquire() """
+
+        if token is None:
+            with self._lock:
+                self._implicit = True
+            return
+
+        try:
+            os.write(self.wfd, token)
+        except OSError:
+            # the jobserver has been closed by the parent process
+            pass
+
+    def close(self):
+        """ Close opened file descriptors """
+
+        if not self.owned:
+            return
+        for fd in set((self.rfd, self.wfd)):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.owned = False
+
+def _parseMakeFlags(makeflags):
+    """
+    Get value of the jobserver option from MAKEFLAGS, list of other options
+    and list of variables (after '--'). The last jobserver option is used
+    as in GNU make.
+    """
+
+    args = makeflags.split()
+    try:
+        idx = args.index('--')
+    except ValueError:
+        idx = len(args)
+    args, variables = args[:idx], args[idx:]
+
+    auth = None
+    flags = []
+    for arg in args:
+        prefix = [x for x in _AUTH_PREFIXES if arg.startswith(x)]
+        if prefix:
+            auth = arg[len(prefix[0]):]
+        elif not arg.startswith('-j'):
+            flags.append(arg)
+    return auth, flags, variables
+
+def get():
+    """ Get current jobserver or None """
+    return _local.get('jobserver')
+
+def popenFds():
+    """ Get file descriptors of the jobserver to pass into child processes """
+
+    jobserver = _local.get('jobserver')
+    return jobserver.fds if jobserver is not None else ()
+
+def popenEnv(env):
+    """
+    Get copy of the env for child processes that get popenFds()
+    """
+
+    env = dict(env)
+    makeflags = _local.get('makeflags')
+    if makeflags is not None:
+        env['MAKEFLAGS'] = makeflags
+    return env
+
+def setUp(bld):
+    """
+    Set up the jobserver for the build context
+    """
+
+    if PLATFORM == 'windows':
+        return
+
+    bconf = bld.bconfManager.root
+    if not bconf.general.get('jobserver', True):
+        return
+
+    makeflags = os.environ.get('MAKEFLAGS')
+    auth, flags, variables = _parseMakeFlags(makeflags or '')
+
+    if auth is not None:
+        try:
+            jobserver = JobServer.connect(auth)
+        except OSError as ex:
+            # the same as GNU make does in this case
+            if cli.selected.args.get('jobs') is None:
+                bld.jobs = 1
+            log.warn("jobserver is unavailable (%s): using --jobs=%d. "
+                     "Add '+' to the parent make rule." % (ex, bld.jobs))
+            return
+        log.debug('jobserver: client of %r' % auth)
+    else:
+        jobserver = JobServer.create(bld.jobs)
+        flags.append(jobserver.makeflags(bld.jobs))
+        _local['makeflags'] = ' '.join(flags + variables)
+        log.debug('jobserver: server with %d jobs' % bld.jobs)
+
+    _local['jobserver'] = jobserver
+
+def finish(_):
+    """
+    Close the jobserver of the build context
+    """
+
+    jobserver = _local.pop('jobserver', None)
+    if jobserver is None:
+        return
+
+    _local.pop('makeflags', None)
+    jobserver.close()
+
+class _Consumer(Runner.Consumer):
+    """
+    Consumer that returns the token of its task into the jobserver
+    """
+
+    def __init__(self, spawner, task, jobserver, token):
+        self.jobserver = jobserver
+        self.token = token
+        super().__init__(spawner, task)
+
+    def run(self):
+
+        # It's the same as Runner.Consumer.run but the token is returned
+        # before the task is reported as done: the main thread can close
+        # the jobserver right after the last task is done.
+        spawner = self.spawner
+        master = spawner.master
+        task = self.task
+        try:
+            try:
+                if not master.stop:
+                    master.process_task(task)
+            finally:
+                self.jobserver.release(self.token)
+        finally:
+            spawner.sem.release()
+            master.out.put(task)
+            self.task = None
+            self.spawner = None
+
+@asmethod(Runner.Spawner, 'loop', saveOrigAs = '_wafLoop')
+def _spawnerLoop(self):
+
+    if _local.get('jobserver') is None:
+        self._wafLoop() # pylint: disable = protected-access
+        return
+
+    jobserver = _local['jobserver']
+    master = self.master
+    while 1:
+        task = master.ready.get()
+        self.sem.acquire()
+        token = None
+        if jobserver is not None:
+            try:
+                token = jobserver.acquire()
+            except OSError as ex:
+                # An exception here would stop this thread and the build
+                # would hang. So the rest of the build is done as without
+                # the jobserver.
+                log.warn("jobserver has become unavailable (%s): using --jobs=%d" % \
+                         (ex, master.numjobs))
+                jobserver = None
+        if not master.stop:
+            task.log_display(task.generator.bld)
+        if jobserver is None:
+            Runner.Consumer(self, task)
+        else:
+            _Consumer(self, task, jobserver, token)
+
+@asmethod(Task.Task, 'exec_command', saveOrigAs = '_wafExecCommand')
+def _execCommand(self, cmd, **kwargs):
+
+    # only commands of the 'run' task param can run nested builds
+    fds = popenFds()
+    if fds and getattr(self.generator, 'runcmdTask', None) is self:
+        kwargs.setdefault('pass_fds', fds)
+        kwargs['env'] = popenEnv(kwargs.get('env') or self.env.env or os.environ)
+    return self._wafExecCommand(cmd, **kwargs) # pylint: disable = protected-access
+
+_wafRunProcess = Utils.run_process
+
+@asmethod(Utils, 'run_process')
+def _runProcess(cmd, kwargs, cargs = None):
+
+    cargs = cargs or {}
+    if 'pass_fds' in kwargs:
+        # pre-forked processes cannot inherit file descriptors
+        return Utils.run_regular_process(cmd, kwargs, cargs)
+    return _wafRunProcess(cmd, kwargs, cargs)
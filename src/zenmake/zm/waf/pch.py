@@ -0,0 +1,202 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Support of the task param 'pch' (precompiled header) for gcc, clang and msvc.
+ It's similar to waflib/extras/pch.py but it works with C and C++, with msvc
+ and without separate task generators.
+
+ The header is included by a generated header (wrapper) in the build
+ directory and the wrapper is compiled into the precompiled header. All
+ files of the task are compiled with the wrapper as a forced include. Gcc and
+ clang use the precompiled header in this case if it exists and matches
+ flags of the compiling file, otherwise the wrapper and so the original
+ header are included as usual. Msvc needs a compiled source file for its
+ precompiled header and object file of this source file is linked with
+ the target.
+
+ Tasks with the param 'use' get the precompiled header of the used task
+ if they don't have own one.
+"""
+
+import re
+
+from waflib import Task
+from waflib.TaskGen import feature, after_method
+from waflib.Tools import c_preproc
+from zm import error, log
+
+# ext of the precompiled header, flags to compile it, flags to use it
+_COMPILERS = {
+    'gcc' :  ('.gch', ['-x', '%(lang)s-header'], ['-Winvalid-pch', '-include', '%(wrapper)s']),
+    'clang': ('.pch', ['-x', '%(lang)s-header'], ['-include', '%(wrapper)s']),
+    'msvc' : ('.pch', ['/Yc%(wrapper)s', '/Fp%(pch)s'],
+              ['/FI%(wrapper)s', '/Yu%(wrapper)s', '/Fp%(pch)s']),
+}
+
+_LANGS = {
+    # lang: (lang for gcc/clang, compiler env var, flags env var, ext of msvc source)
+    'c' :   ('c', 'CC', 'CFLAGS', '.c'),
+    'cxx' : ('c++', 'CXX', 'CXXFLAGS', '.cpp'),
+}
+
+_RE_UNSAFE_CHARS = re.compile(r'[^\w.-]')
+
+_RUN_STR = '${%(cc)s} ${ARCH_ST:ARCH} ${%(flags)s} ${FRAMEWORKPATH_ST:FRAMEWORKPATH} ' \
+           '${CPPPATH_ST:INCPATHS} ${DEFINES_ST:DEFINES} ${ZMPCH_FLAGS} ' \
+           '${%(cc)s_SRC_F}${ZMPCH_SRC} ${%(cc)s_TGT_F}${ZMPCH_TGT} ${CPPFLAGS}'
+
+def _wrapperText(wrapper, header):
+    path = header.path_from(wrapper.parent).replace('\\', '/')
+    return '#include "%s"\n' % path.replace('"', '\\"')
+
+class _PchTaskBase(Task.Task):
+    """
+    Compile precompiled header. Outputs: precompiled header, wrapper and
+    for msvc: source file and object file.
+    """
+
+    color = 'BLUE'
+    scan = c_preproc.scan
+
+    def keyword(self):
+        return 'Precompiling'
+
+    def __str__(self):
+        node = self.inputs[0]
+        return node.path_from(node.ctx.launch_node())
+
+    def compileFunc(self):
+        """
+        Run the compiler. It's replaced by a function from Task.compile_fun
+        in the class for each lang.
+        """
+
+        raise NotImplementedError
+
+    def run(self):
+        """
+        Write the wrapper and compile the precompiled header
+        """
+
+        wrapper = self.outputs[1]
+        wrapper.write(_wrapperText(wrapper, self.inputs[0]))
+        if len(self.outputs) > 2:
+            self.outputs[2].write('#include "%s"\n' % self.env.ZMPCH_WRAPPER)
+        return self.compileFunc()
+
+def _makeTaskClass(lang):
+    _, ccVar, flagsVar, _ = _LANGS[lang]
+    runStr = _RUN_STR % { 'cc' : ccVar, 'flags' : flagsVar }
+    func, dvars = Task.compile_fun(runStr)
+    return type('%spch' % lang, (_PchTaskBase,), {
+        'compileFunc' : func,
+        'vars' : dvars + ['ZMPCH_WRAPPER'],
+    })
+
+for _lang in _LANGS:
+    _makeTaskClass(_lang)
+
+def _compilerName(tgen, lang):
+    return tgen.env['%s_NAME' % _LANGS[lang][1]]
+
+def _createPchTask(tgen, lang, header):
+
+    compiler = _compilerName(tgen, lang)
+    pchExt, compileFlags, _ = _COMPILERS[compiler]
+    langName, _, _, srcExt = _LANGS[lang]
+
+    name = _RE_UNSAFE_CHARS.sub('_', tgen.name)
+    wrapper = tgen.path.find_or_declare('%s.%d.pch.h' % (name, tgen.idx))
+    pch = wrapper.parent.find_or_declare(wrapper.name + pchExt)
+    outputs = [pch, wrapper]
+    if compiler == 'msvc':
+        outputs.append(wrapper.change_ext(srcExt))
+        outputs.append(wrapper.change_ext('.obj'))
+
+    task = tgen.create_task('%spch' % lang, header, outputs)
+    task.env = env = tgen.env.derive()
+
+    wrapperPath = wrapper.abspath().replace('\\', '/')
+    subst = { 'lang' : langName, 'wrapper' : wrapperPath, 'pch' : pch.abspath() }
+    env.ZMPCH_WRAPPER = wrapperPath
+    env.ZMPCH_FLAGS = [x % subst for x in compileFlags]
+    if compiler == 'msvc':
+        # msvc compiles the generated source file into the object file
+        # and it writes the precompiled header by the flag /Fp
+        env.ZMPCH_SRC = outputs[2].abspath()
+        env.ZMPCH_TGT = outputs[3].abspath()
+    else:
+        env.ZMPCH_SRC = wrapperPath
+        env.ZMPCH_TGT = pch.abspath()
+    return task
+
+def _findPchTask(tgen, lang):
+
+    pchTasks = getattr(tgen.bld, 'zmPchTasks', {})
+    task = pchTasks.get(tgen.name)
+    if task is not None:
+        return task
+
+    for name in tgen.to_list(getattr(tgen, 'use', [])):
+        task = pchTasks.get(name)
+        if task is not None and task.__class__.__name__ == '%spch' % lang:
+            return task
+    return None
+
+@feature('c', 'cxx')
+@after_method('process_source', 'apply_link', 'propagate_uselib_vars', 'apply_incpaths')
+def applyPch(tgen):
+    """
+    Create task to compile precompiled header for tasks with the param 'pch'
+    and add flags to use it for all compiled files of the task
+    """
+
+    lang = 'cxx' if 'cxx' in tgen.features else 'c'
+    compiler = _compilerName(tgen, lang)
+    if compiler not in _COMPILERS:
+        return
+
+    zmTaskParams = getattr(tgen, 'zm-task-params', {})
+    header = zmTaskParams.get('pch')
+    if header:
+        node = tgen.path.find_resource(header)
+        if node is None:
+            msg = "Precompiled header %r for task %r not found" % (header, tgen.name)
+            raise error.ZenMakeError(msg)
+
+        if not hasattr(tgen.bld, 'zmPchTasks'):
+            tgen.bld.zmPchTasks = {}
+        tgen.bld.zmPchTasks[tgen.name] = _createPchTask(tgen, lang, node)
+
+    pchTask = _findPchTask(tgen, lang)
+    if pchTask is None:
+        return
+
+    pch, wrapper = pchTask.outputs[:2]
+    subst = {
+        'wrapper' : wrapper.abspath().replace('\\', '/'),
+        'pch' : pch.abspath(),
+    }
+    useFlags = [x % subst for x in _COMPILERS[compiler][2]]
+    flagsVar = _LANGS[lang][2]
+
+    for task in getattr(tgen, 'compiled_tasks', []):
+        if task.__class__.__name__ != lang:
+            continue
+        task.env = task.env.derive()
+        task.env.append_value(flagsVar, useFlags)
+        task.dep_nodes.append(pch)
+        task.set_run_after(pchTask)
+
+    if compiler == 'msvc':
+        linkTask = getattr(tgen, 'link_task', None)
+        if linkTask is not None:
+            # object file of the precompiled header must be linked
+            linkTask.inputs.append(pchTask.outputs[3])
+            linkTask.set_run_after(pchTask)
+
+    log.debug('pch: task %r uses %r' % (tgen.name, pchTask.inputs[0].abspath()))
@@ -0,0 +1,211 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Load and memory aware dispatching of build tasks. Amount of jobs from
+ --jobs is the max amount of running tasks but with options --max-load,
+ --min-free-mem and --link-mem new tasks are not started while the system
+ load average is too high or available memory is too low. One task is always
+ started if no tasks are running, so a build cannot hang.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+
+from waflib import Runner
+from waflib.Tools import ccroot
+from zm.pyutils import asmethod
+from zm import log, cli
+from zm.waf.buildcache import parseSize
+
+MEMINFO_PATH = '/proc/meminfo'
+
+# interval to check the system state again while waiting
+_POLL_INTERVAL = 0.5
+
+# Load average is updated by the system only once in a few seconds, so
+# each task started within this interval is counted as an extra load unit
+# (the same as GNU make does with its option -l).
+_RECENT_INTERVAL = 1.0
+
+_local = {}
+
+def availableMemory(path = MEMINFO_PATH):
+    """
+    Get available memory of the system in bytes. Returns None if it is unknown.
+    """
+
+    values = {}
+    try:
+        with open(path, 'rb') as file:
+            for line in file:
+                name, _, rest = line.partition(b':')
+                if name in (b'MemAvailable', b'MemFree', b'Cached'):
+                    values[name] = int(rest.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+    if b'MemAvailable' in values:
+        return values[b'MemAvailable']
+    if b'MemFree' in values:
+        # kernels before 3.14
+        return values[b'MemFree'] + values.get(b'Cached', 0)
+    return None
+
+def isLinkTask(task):
+    """
+    Detect task that links a program or a shared library. Such tasks often
+    need much more memory than other tasks.
+    """
+
+    return isinstance(task, ccroot.link_task) and \
+                not isinstance(task, ccroot.stlink_task)
+
+class Throttle(object):
+    """
+    Gate for starting of tasks by the system load and available memory
+    """
+
+    __slots__ = (
+        'maxLoad', 'minFreeMem', 'linkMem', 'getLoad', 'getMemory',
+        '_cond', '_running', '_runningLinks', '_started',
+    )
+
+    def __init__(self, maxLoad = None, minFreeMem = None, linkMem = None):
+        self.maxLoad = maxLoad
+        self.minFreeMem = minFreeMem or 0
+        self.linkMem = linkMem or 0
+
+        # os.getloadavg is not available on Windows
+        self.getLoad = getattr(os, 'getloadavg', None)
+        self.getMemory = availableMemory
+
+        self._cond = threading.Condition()
+        self._running = 0
+        self._runningLinks = 0
+        self._started = deque()
+
+    def _canStart(self, isLink):
+
+        if not self._running:
+            return True
+
+        if self.maxLoad and self.getLoad is not None:
+            now = time.monotonic()
+            started = self._started
+            while started and now - started[0] > _RECENT_INTERVAL:
+                started.popleft()
+            if self.getLoad()[0] + len(started) >= self.maxLoad:
+                return False
+
+        if self.minFreeMem or self.linkMem:
+            available = self.getMemory()
+            if available is not None:
+                # memory for running links is reserved because they
+                # can have not reached their peak usage yet
+                links = self._runningLinks + (1 if isLink else 0)
+                if available < self.minFreeMem + links * self.linkMem:
+                    return False
+
+        return True
+
+    def start(self, task, stopped = lambda: False):
+        """
+        Wait until the task can be started and register it as running
+        """
+
+        isLink = bool(self.linkMem) and isLinkTask(task)
+        with self._cond:
+            while not stopped() and not self._canStart(isLink):
+                self._cond.wait(_POLL_INTERVAL)
+
+            self._running += 1
+            if isLink:
+                self._runningLinks += 1
+            self._started.append(time.monotonic())
+
+    def finish(self, task):
+        """
+        Register the task started by start() as finished
+        """
+
+        isLink = bool(self.linkMem) and isLinkTask(task)
+        with self._cond:
+            self._running -= 1
+            if isLink:
+                self._runningLinks -= 1
+            self._cond.notify_all()
+
+class _ThrottledQueue(Runner.PriorityQueue):
+    """
+    Queue of ready tasks for the Waf Spawner. Tasks are taken from this queue
+    only when they can be started.
+    """
+
+    def __init__(self, master, throttle):
+        super().__init__(0)
+        self.master = master
+        self.throttle = throttle
+
+    def get(self, block = True, timeout = None):
+        task = super().get(block, timeout)
+        self.throttle.start(task, lambda: self.master.stop)
+        return task
+
+def _makeThrottle(bld):
+
+    cliArgs = cli.selected.args
+    maxLoad = cliArgs.get('maxLoad')
+    minFreeMem = cliArgs.get('minFreeMem')
+    linkMem = cliArgs.get('linkMem')
+    if not (maxLoad or minFreeMem or linkMem) or bld.jobs <= 1:
+        return None
+
+    if maxLoad and not hasattr(os, 'getloadavg'):
+        log.warn("Load average is unknown on this system: "
+                 "option '--max-load' is ignored")
+        maxLoad = None
+        if not (minFreeMem or linkMem):
+            return None
+
+    minFreeMem = parseSize(minFreeMem) if minFreeMem else None
+    linkMem = parseSize(linkMem) if linkMem else None
+    if (minFreeMem or linkMem) and availableMemory() is None:
+        log.warn("Available memory is unknown on this system: "
+                 "options '--min-free-mem' and '--link-mem' are ignored")
+
+    return Throttle(maxLoad, minFreeMem, linkMem)
+
+def setUp(bld):
+    """
+    Set up the throttle for the build context
+    """
+
+    _local['throttle'] = _makeThrottle(bld)
+
+@asmethod(Runner.Spawner, '__init__', wrap = True, callOrigFirst = False)
+def _spawnerInit(self, master):
+
+    # pylint: disable = unused-argument
+
+    # Spawner starts to get tasks from the queue in its constructor
+    throttle = _local.get('throttle')
+    if throttle is not None:
+        master.ready = _ThrottledQueue(master, throttle)
+
+@asmethod(Runner.Parallel, 'process_task', saveOrigAs = '_wafProcessTask')
+def _processTask(self, task):
+
+    # It's not done in Runner.Consumer.run because the jobserver
+    # has own consumer with the 'run' method.
+    try:
+        self._wafProcessTask(task) # pylint: disable = protected-access
+    finally:
+        ready = self.ready
+        if isinstance(ready, _ThrottledQueue):
+            ready.throttle.finish(task)
@@ -0,0 +1,126 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Support of the task param 'unity-build'. C/C++ files from the task param
+ 'source' are grouped into batches and each batch is compiled as one
+ generated file (unity file) with '#include' of all files of the batch.
+ Headers are parsed once for each batch instead of each file.
+
+ Files are grouped in the order of 'source', so the same files always get
+ the same batches and changing of one file recompiles only its batch. Unity
+ files are placed in the build directory and they are written only if the
+ list of files of their batches has been changed. Source files are found as
+ dependencies of unity files by the dependency scanner.
+"""
+
+import re
+
+from waflib import Task
+from waflib.TaskGen import feature, before_method
+from zm.features import FILE_EXTENSIONS_TO_LANG
+
+DEFAULT_BATCH_SIZE = 8
+
+# extensions of generated files
+_UNITY_EXTS = { 'c' : '.c', 'cxx' : '.cpp' }
+
+_RE_UNSAFE_CHARS = re.compile(r'[^\w.-]')
+
+class unity(Task.Task):
+    """
+    Write unity file with '#include' of the files of its batch
+    """
+
+    # pylint: disable = invalid-name
+
+    color = 'BLUE'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch = []
+
+    def keyword(self):
+        return 'Generating'
+
+    def __str__(self):
+        node = self.outputs[0]
+        return node.path_from(node.ctx.launch_node())
+
+    def makeText(self):
+        """ Make content of the unity file """
+
+        parent = self.outputs[0].parent
+        lines = []
+        for node in self.batch:
+            path = node.path_from(parent).replace('\\', '/')
+            lines.append('#include "%s"\n' % path.replace('"', '\\"'))
+        return ''.join(lines)
+
+    def sig_vars(self):
+        """
+        Add the list of files of the batch into the signature. The unity file
+        doesn't depend on the content of these files, they are dependencies
+        of the compiling task.
+        """
+
+        super().sig_vars()
+        self.m.update(self.makeText().encode())
+
+    def run(self):
+        """ Write the unity file """
+        self.outputs[0].write(self.makeText())
+
+def _unityBatchSize(tgen):
+
+    zmTaskParams = getattr(tgen, 'zm-task-params', {})
+    param = zmTaskParams.get('unity-build', False)
+    if not param or 'qt5' in tgen.features:
+        # qt5 moc files must be compiled with their source files
+        return 0
+    if param is True:
+        return DEFAULT_BATCH_SIZE
+    return param
+
+@feature('c', 'cxx')
+@before_method('process_source')
+def applyUnityBuild(tgen):
+    """
+    Replace C/C++ files in the 'source' with unity files for tasks with
+    the param 'unity-build'
+    """
+
+    batchSize = _unityBatchSize(tgen)
+    if batchSize <= 1:
+        return
+
+    langs = [x for x in _UNITY_EXTS if x in tgen.features]
+    source = []
+    files = { x: [] for x in langs }
+    for node in tgen.to_nodes(getattr(tgen, 'source', [])):
+        ext = node.name[node.name.rfind('.'):]
+        lang = FILE_EXTENSIONS_TO_LANG.get(ext)
+        if lang in files:
+            files[lang].append(node)
+        else:
+            source.append(node)
+
+    name = _RE_UNSAFE_CHARS.sub('_', tgen.name)
+    for lang in langs:
+        nodes = files[lang]
+        for num, start in enumerate(range(0, len(nodes), batchSize)):
+            batch = nodes[start:start + batchSize]
+            if len(batch) == 1:
+                source.extend(batch)
+                continue
+
+            filename = '%s.%d.unity-%d%s' % (name, tgen.idx, num, _UNITY_EXTS[lang])
+            unityNode = tgen.path.find_or_declare(filename)
+            task = tgen.create_task('unity', [], unityNode)
+            task.batch = batch
+            source.append(unityNode)
+
+    tgen.source = source
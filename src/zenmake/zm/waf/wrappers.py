@@ -128,7 +128,8 @@ def execute(ctx):
         rootdir    = bconfPaths.rootdir
         zmcachedir = bconfPaths.zmcachedir
         buildtype  = bconf.selectedBuildType
-        if assist.needToConfigure(zmMeta, rootdir, zmcachedir, buildtype, cliargs):
+        if assist.needToConfigure(zmMeta, rootdir, zmcachedir, buildtype, cliargs,
+                                  bconfPaths.zmmetafile):
             runConfigAndCommand(ctx)
             return
 
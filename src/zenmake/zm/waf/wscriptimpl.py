@@ -26,7 +26,7 @@
 from zm.constants import WAF_CONFIG_LOG, CONFTEST_DIR_PREFIX, CWD
 from zm import utils, cli, error, log
 from zm.buildconf.scheme import KNOWN_TASK_PARAM_NAMES
-from zm.waf import assist
+from zm.waf import assist, depscanner, unity, pch, batchcc # pylint: disable = unused-import
 
 joinpath = os.path.join
 abspath = os.path.abspath
@@ -199,6 +199,8 @@ def build(bld):
         _pairedCmdInfo['bld'] = bld
         _pairedCmdInfo['task-names'] = taskNames
 
+    depscanner.setUp([tasks[x] for x in taskNames])
+
     baseDropKeys = [x for x in KNOWN_TASK_PARAM_NAMES if not x.endswith('.select')]
     baseDropKeys = set(baseDropKeys) - assist.allowedTGenAttrs()
 
@@ -0,0 +1,639 @@
+# coding=utf-8
+#
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+
+ Implementation of the 'watch' command. It runs the 'build', 'test' or 'run'
+ command each time some files of the project are changed. Changes are
+ detected with Linux inotify or by polling of the file system on other
+ platforms. Like the 'daemon' command it keeps processed buildconf files,
+ the ZenMake tasks db and the Waf build state in memory and each build is run
+ in a forked process. Besides it keeps signatures of source files computed
+ in previous builds and listings of directories visited by the glob index
+ (see zm.waf.globindex): only changed files are hashed again and only
+ changed directories are checked in the next build.
+"""
+
+import os
+import sys
+import time
+import struct
+import pickle
+import select
+import signal
+
+from zm.constants import CWD, PLATFORM
+from zm.cmd import Command as _Command
+from zm.error import ZenMakeError
+from zm.utils import toList
+from zm import log, cli, daemon
+
+joinpath = os.path.join
+normpath = os.path.normpath
+
+WATCH_SUPPORTED = hasattr(os, 'fork')
+
+_WATCHED_CMDS = frozenset(('build', 'test', 'run'))
+
+# time without changes after the last change to start the build, in seconds
+_DEBOUNCE_DELAY = 0.1
+
+_POLL_INTERVAL = 0.5
+
+def _isIgnoredName(name):
+    # hidden files/dirs (VCS, editor swap files) and editor backups
+    return name.startswith('.') or name.endswith('~') or name == '__pycache__'
+
+def _patternPrefix(pattern):
+    """
+    Get the part of the path pattern before the first part with wildcards
+    """
+
+    parts = []
+    for part in pattern.replace('\\', '/').split('/'):
+        if '*' in part or '?' in part:
+            break
+        parts.append(part)
+    return os.sep.join(parts)
+
+class WatchSpec(object):
+    """
+    Set of files and directories of the project to watch
+    """
+
+    __slots__ = ('trees', 'files', 'excluded')
+
+    def __init__(self):
+        # dirs to watch with all subdirs
+        self.trees = set()
+        # files outside of the 'trees' to watch
+        self.files = set()
+        # dirs to ignore
+        self.excluded = set()
+
+    def addTree(self, path):
+        """ Add dir to watch with all subdirs """
+        self.trees.add(normpath(path))
+
+    def addFile(self, path):
+        """ Add file to watch """
+        self.files.add(normpath(path))
+
+    def _treeOf(self, path):
+        trees = self.trees
+        excluded = self.excluded
+        cur = path
+        while True:
+            if cur in excluded:
+                return None
+            if cur in trees:
+                return cur
+            parent, name = os.path.split(cur)
+            if parent == cur or _isIgnoredName(name):
+                return None
+            cur = parent
+
+    def isWatched(self, path):
+        """ Return True if the file or dir is watched """
+        return path in self.files or self._treeOf(path) is not None
+
+    def finalize(self):
+        """
+        Remove nested and missing trees and files inside the trees
+        """
+
+        trees = sorted(x for x in self.trees if os.path.isdir(x))
+        self.trees = set()
+        for path in trees:
+            if self._treeOf(path) is None:
+                self.trees.add(path)
+        self.files = set(x for x in self.files if self._treeOf(x) is None)
+
+    def dirs(self):
+        """
+        Get all dirs to watch: dirs of the trees with all subdirs and
+        dirs with separate files
+        """
+
+        result = []
+        for top in sorted(self.trees):
+            for dirpath, dirnames, _ in os.walk(top):
+                result.append(dirpath)
+                dirnames[:] = [x for x in dirnames if not _isIgnoredName(x) \
+                               and joinpath(dirpath, x) not in self.excluded]
+
+        result.extend(sorted(set(os.path.dirname(x) for x in self.files)))
+        return result
+
+def makeWatchSpec(bconfManager):
+    """
+    Make WatchSpec from the buildconf files: all buildconf files, files from
+    the 'monitor-files' and paths from the task params 'source' and 'includes'.
+    """
+
+    spec = WatchSpec()
+    for bconf in bconfManager.configs:
+        spec.addFile(bconf.path)
+        monitFiles = bconf.general.get('monitor-files')
+        if monitFiles:
+            for path in monitFiles.abspaths():
+                spec.addFile(path)
+
+        for taskParams in bconf.tasks.values():
+            for item in toList(taskParams.get('source', [])):
+                if not isinstance(item, dict):
+                    continue
+                startdir = joinpath(bconf.rootdir, item.get('startdir', '.'))
+                patterns = item.get('incl', [])
+                if not patterns and 'excl' in item:
+                    patterns = ['**']
+                for pattern in toList(patterns):
+                    spec.addTree(joinpath(startdir, _patternPrefix(pattern)))
+                for path in item.get('paths', []):
+                    spec.addFile(joinpath(startdir, path))
+
+            includes = taskParams.get('includes')
+            if includes:
+                for path in includes.abspaths():
+                    spec.addTree(path)
+
+    bconf = bconfManager.root
+    spec.excluded.add(normpath(bconf.confPaths.buildroot))
+    spec.finalize()
+    return spec
+
+class Changes(object):
+    """
+    Changes detected by a watcher
+    """
+
+    __slots__ = ('paths', 'dirs', 'trees', 'overflow')
+
+    def __init__(self):
+        # changed/created/removed files
+        self.paths = set()
+        # dirs with created/removed entries
+        self.dirs = set()
+        # created/removed dirs
+        self.trees = set()
+        # some changes were lost
+        self.overflow = False
+
+    def __bool__(self):
+        return bool(self.paths or self.dirs or self.trees or self.overflow)
+
+    def _inTrees(self, path):
+        trees = self.trees
+        cur = path
+        while True:
+            if cur in trees:
+                return True
+            parent = os.path.dirname(cur)
+            if parent == cur:
+                return False
+            cur = parent
+
+    def isChangedDir(self, path):
+        """ Return True if listing of the dir can be changed """
+        return path in self.dirs or self._inTrees(path)
+
+    def isChangedFile(self, path):
+        """ Return True if the file can be changed """
+        return path in self.paths or self._inTrees(path)
+
+class InotifyWatcher(object):
+    """
+    Watcher with Linux inotify
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+
+    _WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | \
+                  IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | \
+                  IN_MOVE_SELF | IN_ONLYDIR
+    _ENTRY_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    _EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, spec):
+
+        import ctypes
+        import ctypes.util
+
+        self._spec = spec
+        self._libc = libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno = True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        self._dirs = {}
+        for dirpath in spec.dirs():
+            self._addWatch(dirpath)
+
+    def _addWatch(self, dirpath):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), self._WATCH_MASK)
+        if wd >= 0:
+            self._dirs[wd] = dirpath
+
+    def _addTree(self, top):
+        for dirpath, dirnames, _ in os.walk(top):
+            self._addWatch(dirpath)
+            dirnames[:] = [x for x in dirnames if not _isIgnoredName(x)]
+
+    def close(self):
+        """ Close the watcher """
+        os.close(self._fd)
+
+    def _handleEvent(self, mask, dirpath, name, changes):
+
+        spec = self._spec
+        path = joinpath(dirpath, name) if name else dirpath
+        if not spec.isWatched(path):
+            return False
+
+        if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+            changes.trees.add(path)
+            return True
+
+        if mask & self.IN_ISDIR:
+            if not mask & self._ENTRY_MASK:
+                return False
+            changes.dirs.add(dirpath)
+            changes.trees.add(path)
+            if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                self._addTree(path)
+            return True
+
+        if mask & self._ENTRY_MASK:
+            changes.dirs.add(dirpath)
+        changes.paths.add(path)
+        return True
+
+    def read(self, changes, timeout):
+        """
+        Wait for events for the timeout (None means infinite time) and add
+        them into the changes. Returns True if there are any relevant changes.
+        """
+
+        try:
+            ready = select.select([self._fd], [], [], timeout)[0]
+        except InterruptedError:
+            return False
+        if not ready:
+            return False
+
+        try:
+            data = os.read(self._fd, 256 * 1024)
+        except BlockingIOError:
+            return False
+
+        found = False
+        header = self._EVENT_HEADER
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, nameLen = header.unpack_from(data, offset)
+            offset += header.size
+            name = data[offset:offset + nameLen].rstrip(b'\0')
+            offset += nameLen
+
+            if mask & self.IN_Q_OVERFLOW:
+                changes.overflow = found = True
+                continue
+            dirpath = self._dirs.get(wd)
+            if dirpath is None:
+                continue
+            if mask & self.IN_IGNORED:
+                del self._dirs[wd]
+                continue
+            name = os.fsdecode(name)
+            if _isIgnoredName(name):
+                continue
+            if self._handleEvent(mask, dirpath, name, changes):
+                found = True
+
+        return found
+
+class PollingWatcher(object):
+    """
+    Watcher that checks stat data of all watched files periodically
+    """
+
+    def __init__(self, spec, interval = _POLL_INTERVAL):
+        self._spec = spec
+        self._interval = interval
+        self._snapshot = self._makeSnapshot()
+
+    def _makeSnapshot(self):
+
+        spec = self._spec
+        snapshot = {}
+        for dirpath in spec.dirs():
+            try:
+                dirEntries = list(os.scandir(dirpath))
+            except OSError:
+                continue
+
+            entries = snapshot[dirpath] = {}
+            for entry in dirEntries:
+                if _isIgnoredName(entry.name) or not spec.isWatched(entry.path):
+                    continue
+                try:
+                    stat = entry.stat()
+                    isdir = entry.is_dir()
+                except OSError:
+                    continue
+                entries[entry.name] = (isdir, stat.st_size,
+                                       stat.st_mtime_ns, stat.st_ino)
+        return snapshot
+
+    def close(self):
+        """ Close the watcher """
+        self._snapshot = {}
+
+    def read(self, changes, timeout):
+        """
+        Check changes after some time (it's no more than the timeout if the
+        timeout is not None) and add them into the changes.
+        Returns True if there are any relevant changes.
+        """
+
+        interval = self._interval
+        if timeout is not None:
+            interval = min(interval, timeout)
+        time.sleep(interval)
+
+        old = self._snapshot
+        new = self._snapshot = self._makeSnapshot()
+
+        found = False
+        for dirpath in set(old) - set(new):
+            changes.trees.add(dirpath)
+            found = True
+
+        for dirpath, entries in new.items():
+            oldEntries = old.get(dirpath)
+            if oldEntries is None:
+                changes.trees.add(dirpath)
+                found = True
+                continue
+            if entries == oldEntries:
+                continue
+            found = True
+            if set(entries) != set(oldEntries):
+                changes.dirs.add(dirpath)
+            for name in set(entries) | set(oldEntries):
+                info = entries.get(name)
+                if info == oldEntries.get(name):
+                    continue
+                path = joinpath(dirpath, name)
+                if info is not None and info[0]:
+                    changes.trees.add(path)
+                else:
+                    changes.paths.add(path)
+
+        return found
+
+def makeWatcher(spec, usePolling = False):
+    """
+    Make the best watcher for the current platform
+    """
+
+    if not usePolling and PLATFORM == 'linux':
+        try:
+            return InotifyWatcher(spec)
+        except (OSError, AttributeError) as ex:
+            log.warn("Cannot use inotify (%s), polling is used" % ex)
+    return PollingWatcher(spec)
+
+class _BuildState(object):
+    """
+    Data from previous builds that is passed into the next build
+    """
+
+    __slots__ = ('sigs', 'visitedDirs')
+
+    def __init__(self):
+        # {path: signature} of watched files
+        self.sigs = {}
+        # dirs visited by the glob index that can be used without checking
+        # or None if nothing is known
+        self.visitedDirs = None
+
+    def reset(self):
+        """ Forget everything """
+        self.sigs = {}
+        self.visitedDirs = None
+
+    def applyChanges(self, changes):
+        """ Forget everything that can be affected by the changes """
+
+        if changes.overflow:
+            self.reset()
+            return
+
+        sigs = self.sigs
+        for path in [x for x in sigs if changes.isChangedFile(x)]:
+            del sigs[path]
+
+        if self.visitedDirs is not None:
+            self.visitedDirs = set(x for x in self.visitedDirs \
+                                   if not changes.isChangedDir(x))
+
+def _runInChild(prepared, spec, state, pipeFd):
+
+    from waflib import Node
+    from zm.pyutils import asmethod
+    from zm.waf import globindex
+
+    knownSigs = state.sigs
+    newSigs = {}
+
+    @asmethod(Node.Node, 'h_file', saveOrigAs = '_zmWatchHFile')
+    def _hFile(self):
+        path = self.abspath()
+        sig = knownSigs.get(path)
+        if sig is None:
+            sig = self._zmWatchHFile() # pylint: disable = protected-access
+            if spec.isWatched(path):
+                newSigs[path] = sig
+        return sig
+
+    if state.visitedDirs is not None:
+        globindex.trustDirs(state.visitedDirs)
+
+    retcode = daemon.runInChild(prepared)
+
+    visitedDirs = [x for x in globindex.lastVisitedDirs() if spec.isWatched(x)]
+    with os.fdopen(pipeFd, 'wb') as file:
+        pickle.dump((newSigs, visitedDirs), file, pickle.HIGHEST_PROTOCOL)
+    return retcode
+
+def _readPipe(pipeFd):
+    with os.fdopen(pipeFd, 'rb') as file:
+        return file.read()
+
+def runBuild(prepared, spec, state):
+    """
+    Run the prepared command in a forked process with the state from
+    previous builds and update the state. Returns exit code.
+    """
+
+    daemon.applyGlobals(prepared)
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    readFd, writeFd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # child process
+        os.close(readFd)
+        os._exit(_runInChild(prepared, spec, state, writeFd)) # pylint: disable = protected-access
+
+    os.close(writeFd)
+    try:
+        data = _readPipe(readFd)
+    finally:
+        status = None
+        while status is None:
+            try:
+                status = os.waitpid(pid, 0)[1]
+            except InterruptedError:
+                pass
+            except KeyboardInterrupt:
+                os.kill(pid, signal.SIGINT)
+
+    try:
+        newSigs, visitedDirs = pickle.loads(data)
+    except Exception: # pylint: disable = broad-except
+        # the build was killed, nothing is known about visited dirs
+        state.visitedDirs = None
+    else:
+        state.sigs.update(newSigs)
+        state.visitedDirs = set(visitedDirs)
+
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    return 1
+
+def waitForChanges(watcher):
+    """
+    Wait for changes and return them when there are no more changes
+    for some time.
+    """
+
+    changes = Changes()
+    while not watcher.read(changes, None):
+        pass
+    while watcher.read(changes, _DEBOUNCE_DELAY):
+        pass
+    return changes
+
+def _prepareCmd(argv):
+
+    try:
+        prepared = daemon.prepareCmd(argv)
+    except SystemExit as ex:
+        if ex.code:
+            raise ZenMakeError("Invalid command line for the 'watch' command") from ex
+        return None
+
+    if prepared is None:
+        msg = "Only commands %s can be watched" % \
+              ', '.join(repr(x) for x in sorted(_WATCHED_CMDS))
+        raise ZenMakeError(msg)
+    return prepared
+
+def _prepareToWatch(argv, watcher, poll):
+    """
+    Prepare the command and make new watcher for its files.
+    Returns tuple (prepared, spec, watcher) or None if the buildconf is
+    invalid and it has been changed after that.
+    """
+
+    try:
+        prepared = _prepareCmd(argv)
+    except ZenMakeError as ex:
+        if watcher is None:
+            raise
+        # wait for fixing of the buildconf
+        log.error(ex.msg)
+        waitForChanges(watcher)
+        return None
+
+    spec = makeWatchSpec(prepared.bconfManager)
+    if watcher is not None:
+        watcher.close()
+    return prepared, spec, makeWatcher(spec, poll)
+
+class Command(_Command):
+    """
+    Watch changes in the project and rebuild it.
+    It's implementation of command 'watch'.
+    """
+
+    def _run(self, cliArgs):
+
+        if not WATCH_SUPPORTED:
+            log.error("The 'watch' command is not supported on this platform")
+            return 1
+
+        from zm.starter import findTopLevelBuildConfDir
+        if findTopLevelBuildConfDir(CWD) is None:
+            log.error('Config buildconf.py/.yaml not found. Check one '
+                      'exists in the project directory.')
+            return 1
+
+        args = list(cliArgs.cmdArgs or ['build'])
+        notparsed = cli.selected.notparsed
+        if notparsed:
+            args += ['--'] + list(notparsed)
+        argv = [sys.argv[0]] + args
+
+        daemon.loadModules()
+
+        from zm.waf import assist
+
+        prepared = None
+        spec = watcher = None
+        state = _BuildState()
+        try:
+            while True:
+                if prepared is None:
+                    result = _prepareToWatch(argv, watcher, cliArgs.poll)
+                    if result is None:
+                        continue
+                    prepared, spec, watcher = result
+                    state.reset()
+
+                runBuild(prepared, spec, state)
+
+                daemon.warmUp(prepared)
+                self._info("Watching for changes in %r (Ctrl+C to stop) ..." % CWD)
+                changes = waitForChanges(watcher)
+                state.applyChanges(changes)
+
+                if assist.areMonitoredFilesChanged(prepared.monit):
+                    prepared = None
+        except KeyboardInterrupt:
+            pass
+        except ZenMakeError as ex:
+            log.error(ex.msg)
+            return 1
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+        return 0
@@ -65,6 +65,13 @@ def main():
     if realcwd != cwd:
         os.chdir(realcwd)
 
+    # Try to use running ZenMake daemon at first. It's as cheap as possible
+    # if there is no running daemon.
+    from zm import daemonconn
+    retcode = daemonconn.runByDaemon(sys.argv)
+    if retcode is not None:
+        return retcode
+
     try:
         from zm import starter
     except ImportError:
@@ -0,0 +1,313 @@
+# coding=utf-8
+#
+
+# pylint: disable = wildcard-import, unused-wildcard-import
+# pylint: disable = missing-docstring, invalid-name
+# pylint: disable = unused-argument, no-member, attribute-defined-outside-init
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import re
+import fnmatch
+import pytest
+
+from tests.func_utils import *
+
+BATCH_COMPILE_PRJDIR = joinpath('cpp', '12-batch-compile')
+PCH_PRJDIR = joinpath('cpp', '13-pch')
+UNITY_BUILD_PRJDIR = joinpath('cpp', '14-unity-build')
+FAST_PARTIAL_PRJDIR = joinpath('cpp', '03-withshlib')
+
+def _changeFile(testSuit, path, text):
+    with open(joinpath(testSuit.cwd, path), 'a') as file:
+        file.write(text)
+
+def _compiledItems(testSuit, cmdLine):
+    returncode, stdout, _ = runZm(testSuit, cmdLine)
+    assert returncode == 0
+    events = gatherEventsFromOutput(stdout)
+    return sorted(x[1] for x in events['build']['events'] if x[0] == 'compiling')
+
+@pytest.mark.usefixtures("unsetEnviron")
+class TestBatchCompile(object):
+
+    @pytest.fixture(params = getZmExecutables(), autouse = True)
+    def allZmExe(self, request):
+        self.zmExe = zmExes[request.param]
+
+    @pytest.fixture(params = [BATCH_COMPILE_PRJDIR])
+    def project(self, request, tmpdir):
+
+        def teardown():
+            printErrorOnFailed(self, request)
+
+        request.addfinalizer(teardown)
+        setupTest(self, request, tmpdir)
+
+    def testBuild(self, project):
+
+        cmdLine = ['build', '-j4']
+        compiled = _compiledItems(self, cmdLine)
+        assert "3 files of 'util'" in compiled
+        assert "4 files of 'app'" in compiled
+        checkBuildResults(self, cmdLine, resultExists = True)
+
+        # object files with the same names are compiled correctly
+        returncode, stdout, _ = runZm(self, ['run', 'app'])
+        assert returncode == 0
+        lines = stdout.splitlines()
+        for line in ('add = 5', 'add ext = 6', 'mul = 6'):
+            assert line in lines
+
+        assert _compiledItems(self, cmdLine) == []
+
+        # only changed file of the batch is compiled
+        _changeFile(self, joinpath('app', 'ext', 'add.cpp'), '\nint unusedVar = 1;\n')
+        assert _compiledItems(self, cmdLine) == ["1 file of 'app'", 'app/ext/add.cpp']
+
+        # all dependent files are compiled after change of the header
+        _changeFile(self, joinpath('util', 'calc.h'), '\n// changed\n')
+        compiled = _compiledItems(self, cmdLine)
+        assert "3 files of 'util'" in compiled
+        # app/main.cpp doesn't include this header
+        assert "3 files of 'app'" in compiled
+        assert 'app/main.cpp' not in compiled
+
+    def testFailedBatch(self, project):
+
+        cmdLine = ['build', '-j4']
+        _changeFile(self, joinpath('app', 'mul.cpp'), '\n#error broken\n')
+        returncode, _, _ = runZm(self, cmdLine)
+        assert returncode != 0
+
+        # failed files are compiled again
+        with open(joinpath(self.cwd, 'app', 'mul.cpp')) as file:
+            text = file.read()
+        with open(joinpath(self.cwd, 'app', 'mul.cpp'), 'w') as file:
+            file.write(text.replace('#error broken', ''))
+
+        compiled = _compiledItems(self, cmdLine)
+        assert 'app/mul.cpp' in compiled
+        checkBuildResults(self, cmdLine, resultExists = True)
+
+@pytest.mark.usefixtures("unsetEnviron")
+class TestPch(object):
+
+    @pytest.fixture(params = getZmExecutables(), autouse = True)
+    def allZmExe(self, request):
+        self.zmExe = zmExes[request.param]
+
+    @pytest.fixture(params = [PCH_PRJDIR])
+    def project(self, request, tmpdir):
+
+        def teardown():
+            printErrorOnFailed(self, request)
+
+        request.addfinalizer(teardown)
+        setupTest(self, request, tmpdir)
+
+    def testBuild(self, project):
+
+        cmdLine = ['build', '-v']
+        returncode, stdout, _ = runZm(self, cmdLine)
+        assert returncode == 0
+        checkBuildResults(self, cmdLine, resultExists = True)
+        assert 'Precompiling engine/pch.h' in stdout.replace('\\', '/')
+        assert 'invalid-pch' not in stdout.replace('-Winvalid-pch', '')
+
+        # 'app' uses the precompiled header of 'engine' from the 'use'
+        runners = [x for x in stdout.splitlines() \
+                        if 'runner' in x and "main.cpp'," in x]
+        assert len(runners) == 1
+        assert re.search(r'engine\.\d+\.pch\.h', runners[0])
+
+        returncode, stdout, _ = runZm(self, ['run', 'app'])
+        assert returncode == 0
+        assert 'precompiled header works' in stdout.splitlines()
+
+        assert _compiledItems(self, cmdLine) == []
+
+        _changeFile(self, joinpath('engine', 'engine.cpp'), '\nint unusedVar = 1;\n')
+        assert _compiledItems(self, cmdLine) == ['engine/engine.cpp']
+
+        # all files of both tasks are compiled after change of the header
+        _changeFile(self, joinpath('engine', 'pch.h'), '\n// changed\n')
+        assert _compiledItems(self, cmdLine) == [
+            'app/main.cpp', 'engine/engine.cpp', 'engine/print.cpp',
+        ]
+
+@pytest.mark.usefixtures("unsetEnviron")
+class TestUnityBuild(object):
+
+    @pytest.fixture(params = getZmExecutables(), autouse = True)
+    def allZmExe(self, request):
+        self.zmExe = zmExes[request.param]
+
+    @pytest.fixture(params = [UNITY_BUILD_PRJDIR])
+    def project(self, request, tmpdir):
+
+        def teardown():
+            printErrorOnFailed(self, request)
+
+        request.addfinalizer(teardown)
+        setupTest(self, request, tmpdir)
+
+    def _findBuildFiles(self, pattern):
+        result = {}
+        for dirpath, _, filenames in os.walk(joinpath(self.cwd, 'build')):
+            for name in fnmatch.filter(filenames, pattern):
+                result[name] = joinpath(dirpath, name)
+        return result
+
+    def _unityFiles(self):
+        result = {}
+        for name, path in self._findBuildFiles('app.*.unity-*.cpp').items():
+            with open(path) as file:
+                result[name] = [x.split('/')[-1] for x in file.read().splitlines()]
+        return result
+
+    def _compiledUnits(self, cmdLine):
+        compiled = _compiledItems(self, cmdLine)
+        # unity files are in the build directory
+        return sorted(x.split('/')[-1] for x in compiled)
+
+    def testBuild(self, project):
+
+        cmdLine = ['build']
+        assert self._compiledUnits(cmdLine) == [
+            'app.5.unity-0.cpp', 'app.5.unity-1.cpp', 'triangle.cpp',
+        ]
+        checkBuildResults(self, cmdLine, resultExists = True)
+
+        # files are grouped in the order of the 'source'
+        unityFiles = self._unityFiles()
+        assert unityFiles == {
+            'app.5.unity-0.cpp' : ['circle.cpp"', 'main.cpp"'],
+            'app.5.unity-1.cpp' : ['rectangle.cpp"', 'square.cpp"'],
+        }
+        # object files of batches use the 'objfile-index'
+        objFiles = sorted(self._findBuildFiles('*.o'))
+        assert objFiles == [
+            'app.5.unity-0.cpp.5.o', 'app.5.unity-1.cpp.5.o', 'triangle.cpp.5.o',
+        ]
+
+        returncode, stdout, _ = runZm(self, ['run', 'app'])
+        assert returncode == 0
+        assert 'areas: 3 4 6 10' in stdout.splitlines()
+
+        assert self._compiledUnits(cmdLine) == []
+
+        # only the batch of the changed file is compiled
+        _changeFile(self, joinpath('src', 'square.cpp'), '\nint unusedVar = 1;\n')
+        assert self._compiledUnits(cmdLine) == ['app.5.unity-1.cpp']
+        assert self._unityFiles() == unityFiles
+
+        # the same batches after a clean build
+        assert runZm(self, ['clean'])[0] == 0
+        assert self._compiledUnits(cmdLine) == [
+            'app.5.unity-0.cpp', 'app.5.unity-1.cpp', 'triangle.cpp',
+        ]
+        assert self._unityFiles() == unityFiles
+
+    def testRegroup(self, project):
+
+        cmdLine = ['build']
+        assert runZm(self, cmdLine)[0] == 0
+
+        with open(joinpath(self.cwd, 'src', 'ellipse.cpp'), 'w') as file:
+            file.write('double ellipseArea(double a, double b) { return 3.0 * a * b; }\n')
+
+        # batches after the new file are regrouped
+        assert self._compiledUnits(cmdLine) == [
+            'app.5.unity-0.cpp', 'app.5.unity-1.cpp', 'app.5.unity-2.cpp',
+        ]
+        assert self._unityFiles() == {
+            'app.5.unity-0.cpp' : ['circle.cpp"', 'ellipse.cpp"'],
+            'app.5.unity-1.cpp' : ['main.cpp"', 'rectangle.cpp"'],
+            'app.5.unity-2.cpp' : ['square.cpp"', 'triangle.cpp"'],
+        }
+        assert self._compiledUnits(cmdLine) == []
+
+        returncode, stdout, _ = runZm(self, ['run', 'app'])
+        assert returncode == 0
+        assert 'areas: 3 4 6 10' in stdout.splitlines()
+
+@pytest.mark.usefixtures("unsetEnviron")
+class TestFastPartial(object):
+
+    @pytest.fixture(params = getZmExecutables(), autouse = True)
+    def allZmExe(self, request):
+        self.zmExe = zmExes[request.param]
+
+    @pytest.fixture(params = [FAST_PARTIAL_PRJDIR])
+    def project(self, request, tmpdir):
+
+        def teardown():
+            printErrorOnFailed(self, request)
+
+        request.addfinalizer(teardown)
+        setupTest(self, request, tmpdir)
+        _changeFile(self, 'buildconf.yaml', '\ngeneral:\n  fast-partial: true\n')
+
+    def _build(self):
+        """
+        Run build and get tuple (amount of task generators that were not
+        posted, compiled files, linked targets)
+        """
+
+        returncode, stdout, _ = runZm(self, ['build', '-vvv'])
+        assert returncode == 0
+        match = re.search(r'fastpartial (\d+) of 2 task generators', stdout)
+        assert match
+        events = gatherEventsFromOutput(stdout)['build']['events']
+        compiled = sorted(x[1] for x in events if x[0] == 'compiling')
+        linked = sorted(x[1] for x in events if x[0] == 'linking')
+        return int(match.group(1)), compiled, linked
+
+    def testBuild(self, project):
+
+        assert self._build() == (0, ['prog/test.cpp', 'shlib/util.cpp'], ['prog', 'util'])
+        checkBuildResults(self, ['build'], resultExists = True)
+
+        # nothing is posted
+        assert self._build() == (2, [], [])
+
+        # 'prog' is posted with 'util' from its 'use'
+        _changeFile(self, joinpath('shlib', 'util.h'), '\n// changed\n')
+        assert self._build() == (0, ['prog/test.cpp', 'shlib/util.cpp'], [])
+        assert self._build() == (2, [], [])
+
+        # new file is found by the glob pattern
+        with open(joinpath(self.cwd, 'shlib', 'extra.cpp'), 'w') as file:
+            file.write('int extraVar = 1;\n')
+        assert self._build() == (0, ['shlib/extra.cpp'], ['prog', 'util'])
+        assert self._build() == (2, [], [])
+
+        os.remove(joinpath(self.cwd, 'shlib', 'extra.cpp'))
+        assert self._build() == (0, [], ['prog', 'util'])
+        assert self._build() == (2, [], [])
+
+    def testFailedTask(self, project):
+
+        assert self._build()[0] == 0
+
+        path = joinpath(self.cwd, 'prog', 'test.cpp')
+        with open(path) as file:
+            text = file.read()
+        stat = os.stat(path)
+
+        _changeFile(self, path, '\n#error broken\n')
+        returncode, _, _ = runZm(self, ['build'])
+        assert returncode != 0
+
+        # the same file as in the first build: the task generator must be
+        # posted because its record has been dropped after the failed build
+        with open(path, 'w') as file:
+            file.write(text)
+        os.utime(path, ns = (stat.st_atime_ns, stat.st_mtime_ns))
+        assert self._build() == (0, ['prog/test.cpp'], [])
+        assert self._build() == (2, [], [])
+        checkBuildResults(self, ['build'], resultExists = True)
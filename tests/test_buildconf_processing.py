@@ -11,13 +11,15 @@
 """
 
 import os
+import multiprocessing
 from copy import deepcopy
 import pytest
 
 from zm.error import *
 from zm.constants import *
 from zm.pathutils import unfoldPath
-from zm.buildconf.processing import Config as BuildConfig
+from zm.buildconf import processing
+from zm.buildconf.processing import Config as BuildConfig, ConfManager
 from tests.common import asRealConf, randomstr
 
 joinpath = os.path.join
@@ -542,3 +544,34 @@ def testCustomToolchains(self, testingBuildConf, capsys):
         assert "doesn't exist" in captured.err
         # to force covering of cache
         assert bconf.customToolchains == expected
+
+    @pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(),
+                        reason = "buildconf files are not loaded in a pool")
+    def testConfManagerPool(self, tmpdir, monkeypatch):
+
+        rootdir = tmpdir.realpath()
+        subdirs = ['d%d' % i for i in range(6)]
+        rootdir.join('buildconf.yml').write('subdirs: [ %s ]\n' % ', '.join(subdirs))
+        for i, name in enumerate(subdirs):
+            subdir = rootdir.mkdir(name)
+            if i == 2:
+                subdir.join('buildconf.py').write("tasks = { 't2' : {} }\n")
+                continue
+            subdir.join('buildconf.yml').write('subdirs: [ sub ]\n'
+                                               'tasks: { t%d: { source: a.c } }\n' % i)
+            subdir.mkdir('sub').join('buildconf.yml').write('tasks: { s%d: {} }\n' % i)
+
+        def makeConfigs():
+            manager = ConfManager(str(rootdir), clivars = {}, clihandler = None)
+            return [(x.path, sorted(x.tasks), x.tasks.get('t0', {}).get('source'))
+                    for x in manager.configs]
+
+        monkeypatch.setattr(processing, '_POOL_SUPPORTED', False)
+        expected = makeConfigs()
+        assert len(expected) == 12
+        assert expected[1][1] == ['t0'] and expected[2][1] == ['s0']
+
+        monkeypatch.setattr(processing, '_POOL_SUPPORTED', True)
+        monkeypatch.setattr(processing, '_POOL_WORKERS', 2)
+        monkeypatch.setattr(processing, '_MIN_CONFS_FOR_POOL', 2)
+        assert makeConfigs() == expected
@@ -106,6 +106,9 @@ def testCmdBuild(self):
         baseExpectedArgs = {
             'buildtype' : self.defaults['buildtype'],
             'jobs' : None,
+            'maxLoad' : None,
+            'minFreeMem' : None,
+            'linkMem' : None,
             'configure': False,
             'color': 'auto',
             'clean': False,
@@ -113,11 +116,14 @@ def testCmdBuild(self):
             'cleanall': False,
             'distclean': False,
             'tasks': [],
+            'criticalPath': False,
             'verbose': 0,
             'verboseConfigure' : None,
             'verboseBuild' : None,
             'withTests': 'no',
             'runTests': 'none',
+            'testShard': None,
+            'testTimings': None,
             'buildroot' : None,
             'forceExternalDeps' : False,
             'cacheCfgActionResults' : False,
@@ -222,6 +228,9 @@ def testCmdTest(self):
         baseExpectedArgs = {
             'buildtype' : self.defaults['buildtype'],
             'jobs' : None,
+            'maxLoad' : None,
+            'minFreeMem' : None,
+            'linkMem' : None,
             'configure': False,
             'color': 'auto',
             'clean': False,
@@ -229,11 +238,14 @@ def testCmdTest(self):
             'cleanall': False,
             'distclean': False,
             'tasks': [],
+            'criticalPath': False,
             'verbose': 0,
             'verboseConfigure' : None,
             'verboseBuild' : None,
             'withTests': 'yes',
             'runTests': 'all',
+            'testShard': None,
+            'testTimings': None,
             'buildroot' : None,
             'forceExternalDeps' : False,
             'cacheCfgActionResults' : False,
@@ -304,6 +316,16 @@ def testCmdTest(self):
                 expectedArgsUpdate = {'runTests': 'on-changes'},
                 wafArgs = ['build', CMDNAME] + CMNOPTS,
             ),
+            dict(
+                args = [CMDNAME, '--test-shard', '2/3'],
+                expectedArgsUpdate = {'testShard': '2/3'},
+                wafArgs = ['build', CMDNAME] + CMNOPTS,
+            ),
+            dict(
+                args = [CMDNAME, '--test-shard', '1/2', '--test-timings', 't.json'],
+                expectedArgsUpdate = {'testShard': '1/2', 'testTimings': 't.json'},
+                wafArgs = ['build', CMDNAME] + CMNOPTS,
+            ),
             dict(
                 args = [CMDNAME, '--progress'],
                 expectedArgsUpdate = {'progress': True},
@@ -522,6 +544,9 @@ def checkCmdInstall(self, cmd):
         baseExpectedArgs = {
             'buildtype' : self.defaults['buildtype'],
             'jobs' : None,
+            'maxLoad' : None,
+            'minFreeMem' : None,
+            'linkMem' : None,
             'color': 'auto',
             'configure': False,
             'clean': False,
@@ -539,7 +564,8 @@ def checkCmdInstall(self, cmd):
         baseExpectedArgs.update(INSTALL_DIRVAR_CLI_DEFAULTS)
 
         if cmd == 'uninstall':
-            for name in ('configure', 'jobs', 'clean', 'cleanall', 'distclean'):
+            for name in ('configure', 'jobs', 'maxLoad', 'minFreeMem', 'linkMem',
+                         'clean', 'cleanall', 'distclean'):
                 baseExpectedArgs.pop(name)
 
         CMDNAME = cmd
@@ -640,6 +666,86 @@ def testCmdSysInfo(self):
 
         self._assertAllsForCmd(CMDNAME, checks, baseExpectedArgs)
 
+    def testCmdDaemon(self):
+
+        baseExpectedArgs = {
+            'verbose': 0,
+            'color': 'auto',
+            'stop': False,
+        }
+
+        CMDNAME = 'daemon'
+        checks = [
+            dict(
+                args = [CMDNAME],
+                expectedArgsUpdate = {},
+                wafArgs = [CMDNAME, '--color=auto'],
+            ),
+            dict(
+                args = [CMDNAME, '--stop'],
+                expectedArgsUpdate = {'stop': True},
+                wafArgs = [CMDNAME, '--color=auto'],
+            ),
+        ]
+
+        self._assertAllsForCmd(CMDNAME, checks, baseExpectedArgs)
+
+    def testCmdCacheserver(self):
+
+        baseExpectedArgs = {
+            'verbose': 0,
+            'color': 'auto',
+            'bind': None,
+            'cacheDir': None,
+            'maxSize': None,
+        }
+
+        CMDNAME = 'cacheserver'
+        checks = [
+            dict(
+                args = [CMDNAME],
+                expectedArgsUpdate = {},
+                wafArgs = [CMDNAME, '--color=auto'],
+            ),
+            dict(
+                args = [CMDNAME, '--bind', ':9000', '--cache-dir', 'cache',
+                        '--max-size', '1G'],
+                expectedArgsUpdate = {
+                    'bind': ':9000', 'cacheDir': 'cache', 'maxSize': '1G',
+                },
+                wafArgs = [CMDNAME, '--color=auto'],
+            ),
+        ]
+
+        self._assertAllsForCmd(CMDNAME, checks, baseExpectedArgs)
+
+    def testCmdWatch(self):
+
+        baseExpectedArgs = {
+            'verbose': 0,
+            'color': 'auto',
+            'poll': False,
+            'cmdArgs': [],
+        }
+
+        CMDNAME = 'watch'
+        checks = [
+            dict(
+                args = [CMDNAME],
+                expectedArgsUpdate = {},
+                wafArgs = [CMDNAME, '--color=auto'],
+            ),
+            dict(
+                args = [CMDNAME, '--poll', 'test', '-j', '2', 'mytask'],
+                expectedArgsUpdate = {
+                    'poll': True, 'cmdArgs': ['test', '-j', '2', 'mytask'],
+                },
+                wafArgs = [CMDNAME, '--color=auto'],
+            ),
+        ]
+
+        self._assertAllsForCmd(CMDNAME, checks, baseExpectedArgs)
+
 def parse(cfgdefaults, args):
     return cli.CmdLineParser('test', cfgdefaults).parse(args).args
 
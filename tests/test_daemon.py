@@ -0,0 +1,185 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import os
+import socket
+import threading
+
+import pytest
+
+from zm.autodict import AutoDict
+from zm.error import ZenMakeError
+from zm import daemonconn, daemon
+
+pytestmark = pytest.mark.skipif(not daemonconn.DAEMON_SUPPORTED,
+                                reason = "daemon is not supported")
+
+def testMsgRoundTrip(tmpdir):
+
+    path = str(tmpdir.join('out.txt'))
+    data = { 'argv' : ['build', '-v'], 'env' : { 'X' : 'y' * 100000 } }
+
+    sock1, sock2 = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    with sock1, sock2, open(path, 'w') as file:
+
+        daemonconn.sendMsg(sock1, { 'a' : 1 })
+        assert daemonconn.recvMsg(sock2) == ({ 'a' : 1 }, [])
+
+        fd = file.fileno()
+        thread = threading.Thread(target = daemonconn.sendMsg,
+                                  args = (sock1, data, [fd, fd, fd]))
+        thread.start()
+        received, fds = daemonconn.recvMsg(sock2, withFds = True)
+        thread.join()
+
+        assert received == data
+        assert len(fds) == 3
+        os.write(fds[1], b'hello')
+        for x in fds:
+            assert x != fd
+            os.close(x)
+
+        # message without fds can be received with withFds = True
+        daemonconn.sendMsg(sock1, { 'b' : 2 })
+        assert daemonconn.recvMsg(sock2, withFds = True) == ({ 'b' : 2 }, [])
+
+        sock1.close()
+        with pytest.raises(EOFError):
+            daemonconn.recvMsg(sock2, withFds = True)
+
+    with open(path) as file:
+        assert file.read() == 'hello'
+
+def _startFakeDaemon(workdir, reply):
+
+    sockpath = daemonconn.socketPath(workdir)
+    os.makedirs(os.path.dirname(sockpath), mode = 0o700, exist_ok = True)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(sockpath)
+    sock.listen(1)
+
+    requests = []
+    def serve():
+        conn, _ = sock.accept()
+        with conn:
+            request, fds = daemonconn.recvMsg(conn, withFds = True)
+            for fd in fds:
+                os.close(fd)
+            requests.append((request, len(fds)))
+            daemonconn.sendMsg(conn, reply)
+        sock.close()
+        os.remove(sockpath)
+
+    thread = threading.Thread(target = serve)
+    thread.start()
+    return thread, requests
+
+def testRunByDaemon(tmpdir, monkeypatch):
+
+    workdir = str(tmpdir.realpath())
+    monkeypatch.setenv('XDG_RUNTIME_DIR', workdir)
+    monkeypatch.delenv('ZENMAKE_NO_DAEMON', raising = False)
+    monkeypatch.delenv('ZENMAKE_TESTING_MODE', raising = False)
+    argv = ['build', '-v']
+
+    # no running daemon
+    assert daemonconn.runByDaemon(argv, workdir) is None
+
+    # daemon declines the command
+    thread, requests = _startFakeDaemon(workdir, { 'status' : 'declined' })
+    assert daemonconn.runByDaemon(argv, workdir) is None
+    thread.join()
+    assert requests[0][0]['argv'] == argv
+    assert requests[0][1] == 3
+
+    thread, requests = _startFakeDaemon(workdir, { 'status' : 'done', 'retcode' : 3 })
+    assert daemonconn.runByDaemon(argv, workdir) == 3
+    thread.join()
+
+    # daemon must not be used
+    monkeypatch.setenv('ZENMAKE_NO_DAEMON', '1')
+    assert daemonconn.runByDaemon(argv, workdir) is None
+
+def testUnsafeSocketDir(tmpdir, monkeypatch):
+
+    workdir = str(tmpdir.realpath())
+    monkeypatch.setenv('XDG_RUNTIME_DIR', workdir)
+    monkeypatch.delenv('ZENMAKE_NO_DAEMON', raising = False)
+    monkeypatch.delenv('ZENMAKE_TESTING_MODE', raising = False)
+    argv = ['build', '-v']
+
+    sockpath = daemonconn.socketPath(workdir)
+    sockdir = os.path.dirname(sockpath)
+    assert daemonconn.makeSocketDir(sockpath)
+    assert daemonconn.isSafeSocketDir(sockdir)
+
+    # directory accessible by other users
+    os.chmod(sockdir, 0o755)
+    assert not daemonconn.isSafeSocketDir(sockdir)
+    assert not daemonconn.makeSocketDir(sockpath)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with sock:
+        sock.bind(sockpath)
+        sock.listen(1)
+        # client must not connect to the socket
+        assert daemonconn.runByDaemon(argv, workdir) is None
+        assert not daemonconn.stopDaemon(workdir)
+    os.remove(sockpath)
+
+    with pytest.raises(ZenMakeError):
+        daemon.Server(workdir)._bind()
+    assert not os.path.exists(sockpath)
+
+    # symlink to a directory
+    os.chmod(sockdir, 0o700)
+    os.rename(sockdir, sockdir + '-real')
+    os.symlink(sockdir + '-real', sockdir)
+    assert not daemonconn.isSafeSocketDir(sockdir)
+    with pytest.raises(ZenMakeError):
+        daemon.Server(workdir)._bind()
+    assert daemonconn.runByDaemon(argv, workdir) is None
+
+def testPreparedCmdInvalidated(tmpdir, monkeypatch):
+
+    workdir = str(tmpdir.realpath())
+    bconfPath = os.path.join(workdir, 'buildconf.py')
+    with open(bconfPath, 'w') as file:
+        file.write('tasks = {}\n')
+
+    calls = []
+    def prepareCmd(argv):
+        calls.append(argv)
+        if argv[0] not in ('build', 'test', 'run'):
+            return None
+        bconfManager = AutoDict(configs = [
+            AutoDict(path = bconfPath, general = AutoDict()),
+        ])
+        return daemon._PreparedCmd(cmd = None, bconfManager = bconfManager,
+                                   monit = daemon.makeMonitSnapshot(bconfManager))
+    monkeypatch.setattr(daemon, 'prepareCmd', prepareCmd)
+
+    server = daemon.Server(workdir)
+    prepared = server._prepareCmd(['build'])
+    assert prepared is not None
+    assert server._prepareCmd(['build']) is prepared
+    assert len(calls) == 1
+
+    # another command line
+    assert server._prepareCmd(['build', '-v']) is not prepared
+    assert len(calls) == 2
+    assert server._prepareCmd(['clean']) is None
+
+    with open(bconfPath, 'w') as file:
+        file.write('tasks = { "a" : {} }\n')
+
+    newPrepared = server._prepareCmd(['build'])
+    assert newPrepared is not prepared
+    assert len(calls) == 4
+    assert server._prepareCmd(['build']) is newPrepared
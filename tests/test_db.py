@@ -0,0 +1,107 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name
+# pylint: disable = protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import os
+import pickle
+import pytest
+from zm import db
+
+joinpath = os.path.join
+
+@pytest.mark.parametrize("dbformat", ['py', 'pickle', 'indexed'])
+def testSaveLoad(tmpdir, dbformat):
+
+    pathname = joinpath(str(tmpdir.realpath()), 'test')
+    data = {
+        'buildtype' : 'debug',
+        'names' : ['t1', 't2'],
+        'tasks' : { 't1' : { 'use' : ['t2'] }, 't2' : { 'a' : 1 } },
+    }
+
+    dbfile = db.factory(pathname, dbformat)
+    assert not dbfile.exists()
+    dbfile.save(data)
+    assert dbfile.exists()
+
+    loaded = dbfile.load()
+    assert loaded == data
+    assert dict(loaded['tasks']) == data['tasks']
+
+def testIndexedLazyLoad(tmpdir):
+
+    pathname = joinpath(str(tmpdir.realpath()), 'test')
+    data = {
+        'buildtype' : 'debug',
+        'tasks' : { 't%d' % i : { 'idx' : i } for i in range(10) },
+    }
+
+    dbfile = db.IndexedDBFile(pathname)
+    dbfile.save(data)
+
+    loaded = dbfile.load()
+    tasks = loaded['tasks']
+    assert isinstance(tasks, db.LazyDict)
+    assert loaded['buildtype'] == 'debug'
+    assert len(tasks) == 10
+    assert 't3' in tasks
+    assert 'tt' not in tasks
+    assert not tasks._loaded
+
+    assert tasks['t3'] == { 'idx' : 3 }
+    assert list(tasks._loaded) == ['t3']
+
+    tasks['new'] = { 'idx' : 100 }
+    del tasks['t0']
+    assert 'new' in tasks and 't0' not in tasks
+    assert sorted(tasks) == sorted(['t%d' % i for i in range(1, 10)] + ['new'])
+    assert pickle.loads(pickle.dumps(tasks)) == dict(tasks.items())
+
+def testIndexedAppend(tmpdir):
+
+    pathname = joinpath(str(tmpdir.realpath()), 'test')
+    data = {
+        'buildtype' : 'debug',
+        'tasks' : { 't%d' % i : { 'idx' : i } for i in range(20) },
+    }
+
+    dbfile = db.IndexedDBFile(pathname)
+    dbfile.save(data)
+    size = os.path.getsize(dbfile.path)
+
+    # nothing changed
+    dbfile.save(dbfile.load())
+    assert os.path.getsize(dbfile.path) == size
+
+    # only changed record and new index are appended
+    loaded = dbfile.load()
+    loaded['tasks']['t5'] = { 'idx' : 55 }
+    dbfile.save(loaded)
+    assert os.path.getsize(dbfile.path) > size
+
+    loaded = dbfile.load()
+    assert loaded['tasks']['t5'] == { 'idx' : 55 }
+    assert loaded['tasks']['t6'] == { 'idx' : 6 }
+
+    # too many unused records: file must be compacted
+    for i in range(50):
+        loaded = dbfile.load()
+        loaded['tasks']['t5'] = { 'idx' : i, 'data' : 'x' * 100 }
+        dbfile.save(loaded)
+    assert os.path.getsize(dbfile.path) < size * 4
+    assert dbfile.load()['tasks']['t5']['idx'] == 49
+
+    # invalid file
+    with open(dbfile.path, 'wb') as file:
+        file.write(b'trash' * 10)
+    with pytest.raises(ValueError):
+        dbfile.load()
+    dbfile.save(data)
+    assert dbfile.load() == data
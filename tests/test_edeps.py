@@ -0,0 +1,118 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import os
+import time
+import threading
+
+import pytest
+
+from zm.autodict import AutoDict
+from zm.error import ZenMakeProcessFailed
+# zm.edeps can be imported only after zm.waf because of circular imports
+import zm.waf # pylint: disable = unused-import
+from zm import edeps
+
+joinpath = os.path.join
+
+class _FakeCtx(object):
+
+    def __init__(self, rootdir, jobs):
+        self.jobs = jobs
+        self.bconfManager = AutoDict()
+        self.bconfManager.root.rootdir = rootdir
+
+    def log_command(self, cmd, kwargs):
+        pass
+
+def _makeRule(name, cwd = '.', cmd = 'true', **kwargs):
+    rule = {
+        'name' : name, 'cmd' : cmd, 'cwd' : cwd, 'env' : {},
+        'timeout' : None, 'shell' : True, '$dep-type' : 'rule',
+    }
+    rule.update(kwargs)
+    return rule
+
+def testGatherRuleDeps(tmpdir):
+
+    rootdir = str(tmpdir.realpath())
+    rules = [
+        _makeRule('a1', cwd = 'a', **{'$dep-names' : ['a']}),
+        _makeRule('b1', cwd = 'b'),
+        _makeRule('a2', cwd = 'a2', **{'$dep-names' : ['a']}),
+        _makeRule('c1', cwd = 'c', **{'$dep-dirs' : [joinpath(rootdir, 'b')]}),
+        _makeRule('b2', cwd = 'b/../b'),
+        _makeRule('d1', cwd = 'd'),
+    ]
+
+    deps = edeps._gatherRuleDeps(rules, rootdir)
+    assert deps == [set(), set(), {0}, {1}, {3}, set()]
+
+def _runRules(monkeypatch, rootdir, rules, jobs, runRule):
+
+    monkeypatch.setattr(edeps, '_runRule', runRule)
+    edeps._runRules(_FakeCtx(rootdir, jobs), rules, True)
+
+def testRunRulesConflicting(tmpdir, monkeypatch):
+
+    rootdir = str(tmpdir.realpath())
+    rules = [
+        _makeRule('r1', cwd = 'x'),
+        _makeRule('r2', cwd = 'x'),
+        _makeRule('r3', cwd = 'y', **{'$dep-dirs' : [joinpath(rootdir, 'x')]}),
+        _makeRule('r4', cwd = 'z', **{'$dep-names' : ['dep']}),
+        _makeRule('r5', cwd = 'w', **{'$dep-names' : ['dep']}),
+    ]
+
+    events = []
+    lock = threading.Lock()
+    def runRule(ctx, rule, output = None, procs = None):
+        with lock:
+            events.append(('start', rule['name']))
+        time.sleep(0.02)
+        with lock:
+            events.append(('end', rule['name']))
+
+    _runRules(monkeypatch, rootdir, rules, 4, runRule)
+
+    for prev, rule in (('r1', 'r2'), ('r2', 'r3'), ('r4', 'r5')):
+        assert events.index(('end', prev)) < events.index(('start', rule))
+
+def testRunRulesIndependentOverlap(tmpdir, monkeypatch):
+
+    rootdir = str(tmpdir.realpath())
+    rules = [_makeRule('r1', cwd = 'x'), _makeRule('r2', cwd = 'y')]
+
+    # both rules must be running at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout = 5)
+    def runRule(ctx, rule, output = None, procs = None):
+        barrier.wait()
+
+    _runRules(monkeypatch, rootdir, rules, 2, runRule)
+
+def testRunRulesFailure(tmpdir):
+
+    rootdir = str(tmpdir.realpath())
+    for name in ('x', 'y'):
+        os.makedirs(joinpath(rootdir, name))
+
+    rules = [
+        _makeRule('ok', cwd = 'x', cmd = 'echo ok'),
+        _makeRule('bad', cwd = 'y', cmd = 'exit 3'),
+    ]
+
+    messages = []
+    for jobs in (1, 2):
+        with pytest.raises(ZenMakeProcessFailed) as excinfo:
+            edeps._runRules(_FakeCtx(rootdir, jobs), rules, True)
+        messages.append((excinfo.value.msg, excinfo.value.exitcode))
+
+    assert messages[0] == messages[1]
+    assert messages[0][1] == 3
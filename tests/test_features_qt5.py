@@ -321,3 +321,54 @@ def testApplyQt5_LangDirDefine(qt5tgen):
     assert tgen.env['DEFINES'] == [
         'TRANSLATIONS_DIR="%s"' % joinpath('app_data_dir', 'translations')
     ]
+
+def testFilterMocHeaders(tmpdir):
+
+    qt5 = _getQt5Module()
+
+    rootdir = tmpdir.mkdir("zm")
+    ctx = Context.Context(run_dir = str(rootdir))
+    ctx.zmMocHeaders = {}
+
+    rootdir.join('a.h').write('class A { Q_OBJECT };\n')
+    rootdir.join('b.h').write('// Q_OBJECT\nclass B {};\n')
+    nodes = [ctx.root.make_node(str(rootdir.join(x))) for x in ('a.h', 'b.h')]
+
+    assert qt5._filterMocHeaders(ctx, nodes) == nodes[:1]
+    assert len(ctx.zmMocHeaders) == 2
+
+    # cached result is used while stat data of the file is the same
+    path = nodes[1].abspath()
+    stat, sig, _ = ctx.zmMocHeaders[path]
+    ctx.zmMocHeaders[path] = (stat, sig, True)
+    assert qt5._filterMocHeaders(ctx, nodes) == nodes
+
+    # new content
+    ctx.cache_sig = {}
+    rootdir.join('a.h').write('class A {};\n')
+    rootdir.join('b.h').write('class B { Q_OBJECT; };\n\n')
+    assert qt5._filterMocHeaders(ctx, nodes) == nodes[1:]
+
+def testFilterMocHeadersPruned(tmpdir):
+
+    qt5 = _getQt5Module()
+
+    rootdir = tmpdir.mkdir("zm")
+    rootdir.join('a.h').write('class A { Q_OBJECT };\n')
+    path = str(rootdir.join('a.h'))
+    removedPath = str(rootdir.join('removed.h'))
+
+    ctx = Context.Context(run_dir = str(rootdir))
+    nodes = [ctx.root.make_node(path)]
+    assert qt5._filterMocHeaders(ctx, nodes) == nodes
+    info = ctx.zmMocHeaders[path]
+
+    # next build with the stored state
+    ctx = Context.Context(run_dir = str(rootdir))
+    ctx.zmMocHeaders = { path : info, removedPath : info }
+    nodes = [ctx.root.make_node(path)]
+    assert qt5._filterMocHeaders(ctx, nodes) == nodes
+    assert ctx.zmMocHeaders == { path : info }
+    # the same header is looked up again in the same build
+    assert qt5._filterMocHeaders(ctx, nodes) == nodes
+    assert ctx.zmMocHeaders == { path : info }
@@ -0,0 +1,222 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import time
+import logging
+import threading
+
+import pytest
+from waflib import Logs
+
+from zm.autodict import AutoDict
+from zm.utils import loadPyModule
+from zm.error import ZenMakeError
+from zm import features, log
+
+_local = {}
+
+def _getTestModule():
+
+    module = _local.get('test')
+    if module is None:
+        task = AutoDict()
+        task.features = ['test']
+        features.loadFeatures([ {'test': task} ])
+
+        module = _local['test'] = loadPyModule('zm.features.test', withImport = True)
+
+    return module
+
+def testParseTestShard():
+
+    test = _getTestModule()
+
+    assert test._parseTestShard(None) is None
+    assert test._parseTestShard('') is None
+    assert test._parseTestShard('1/1') == (0, 1)
+    assert test._parseTestShard('3/4') == (2, 4)
+
+    for value in ('0/2', '3/2', '1/0', '1', 'a/b', '1/2/3'):
+        with pytest.raises(ZenMakeError):
+            test._parseTestShard(value)
+
+def testSelectTestShard():
+
+    test = _getTestModule()
+
+    names = ['t%d' % i for i in range(10)]
+    timings = { 't0' : 10.0, 't1' : 4.0, 't2' : 3.0, 't3' : 3.0 }
+
+    for count in (1, 2, 3, 7, 12):
+        shards = [test._selectTestShard(names, timings, (i, count)) \
+                                                    for i in range(count)]
+        # all tests are selected and each of them only once
+        assert sorted(sum((list(x) for x in shards), [])) == names
+        # deterministic result
+        assert shards == [test._selectTestShard(names, timings, (i, count)) \
+                                                    for i in range(count)]
+
+    shards = [test._selectTestShard(names, timings, (i, 2)) for i in range(2)]
+    # tests without timings get the average time (5.0 here)
+    assert shards[0] == {'t0', 't1', 't6', 't8'} # 10 + 4 + 5 + 5
+    assert shards[1] == {'t2', 't3', 't4', 't5', 't7', 't9'} # 3 + 3 + 5 * 4
+
+def testShardsWithTimingsSnapshot(tmpdir, monkeypatch):
+
+    test = _getTestModule()
+
+    names = ['t%d' % i for i in range(1, 8)]
+    snapshotPath = str(tmpdir.join('snapshot.json'))
+    storePath = str(tmpdir.join('store', 'timings.json'))
+    test.saveTestTimings(snapshotPath, { 't1' : 7.0, 't3' : 2.5, 't6' : 0.5 })
+
+    def runShards(snapshot):
+        monkeypatch.setattr(test._shared, 'testTimingsPath', snapshot)
+        shards = []
+        for i in range(3):
+            shard = test._selectTestShard(names, test._loadShardTimings(), (i, 3))
+            shards.append(shard)
+            # each shard records its times but they must not change other shards
+            test.saveTestTimings(storePath, { x: 100.0 + i for x in shard })
+        return shards
+
+    for snapshot in (snapshotPath, None):
+        shards = runShards(snapshot)
+        # union covers every test exactly once
+        assert sorted(sum((list(x) for x in shards), [])) == names
+
+    # all recorded times are merged
+    assert sorted(test.loadTestTimings(storePath)) == names
+
+    monkeypatch.setattr(test._shared, 'testTimingsPath', str(tmpdir.join('none')))
+    with pytest.raises(ZenMakeError):
+        test._loadShardTimings()
+
+class _FakeTestTask(object):
+
+    def __init__(self, name, use = None, runAfter = None):
+        self.name = name
+        self.run_after = set(runAfter or [])
+        self.generator = AutoDict()
+        setattr(self.generator, 'zm-task-params', { 'name' : name, 'use' : use or [] })
+
+    def __repr__(self):
+        return self.name
+
+class _FakeTestContext(object):
+
+    def __init__(self, jobs, runTest):
+        self.jobs = jobs
+        self._executeTest = runTest
+
+def _runTestsInParallel(jobs, tasks, runTest):
+    test = _getTestModule()
+    ctx = _FakeTestContext(jobs, runTest)
+    test.TestContext._executeTestsInParallel(ctx, tasks)
+
+def testGatherTestDeps():
+
+    test = _getTestModule()
+
+    lib = _FakeTestTask('lib')
+    app = _FakeTestTask('app', use = ['lib', 'zlib'])
+    other = _FakeTestTask('other', runAfter = [app, _FakeTestTask('notest')])
+    alone = _FakeTestTask('alone', use = ['alone'])
+
+    deps = test._gatherTestDeps([lib, app, other, alone])
+    assert deps == { lib : set(), app : {lib}, other : {app}, alone : set() }
+
+def testExecuteTestsInParallelOrder():
+
+    lib = _FakeTestTask('lib')
+    app = _FakeTestTask('app', use = ['lib'])
+    other = _FakeTestTask('other', runAfter = [app])
+    events = []
+    lock = threading.Lock()
+
+    def runTest(task):
+        with lock:
+            events.append(('start', task.name))
+        time.sleep(0.01)
+        with lock:
+            events.append(('end', task.name))
+
+    _runTestsInParallel(4, [other, app, lib], runTest)
+
+    for dep, task in (('lib', 'app'), ('app', 'other')):
+        assert events.index(('end', dep)) < events.index(('start', task))
+
+def testExecuteTestsInParallelFailure():
+
+    tasks = {}
+    for name, use in (('a', []), ('b', []), ('c', ['a']), ('d', ['b'])):
+        tasks[name] = _FakeTestTask(name, use = use)
+
+    executed = []
+    failure = RuntimeError('a has failed')
+
+    def runTest(task):
+        executed.append(task.name)
+        if task.name == 'a':
+            raise failure
+        # 'b' is finished after failure of 'a'
+        time.sleep(0.05)
+
+    with pytest.raises(RuntimeError) as excinfo:
+        _runTestsInParallel(2, list(tasks.values()), runTest)
+    assert excinfo.value is failure
+    # no tasks are submitted after the first failure
+    assert sorted(executed) == ['a', 'b']
+
+def testExecuteTestsInParallelCycle():
+
+    a = _FakeTestTask('a', use = ['b'])
+    b = _FakeTestTask('b', use = ['a'])
+    c = _FakeTestTask('c')
+    executed = []
+
+    def runTest(task):
+        executed.append(task.name)
+
+    with pytest.raises(ZenMakeError) as excinfo:
+        _runTestsInParallel(2, [a, b, c], runTest)
+    assert "'a', 'b'" in str(excinfo.value)
+    assert executed == ['c']
+
+def testExecuteTestsInParallelOutput():
+
+    class Handler(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.messages = []
+        def emit(self, record):
+            self.messages.append(record.getMessage())
+
+    handler = Handler()
+    Logs.log.addHandler(handler)
+
+    barrier = threading.Barrier(2, timeout = 5)
+    def runTest(task):
+        log.info('%s: first' % task.name)
+        # both tests write their output at the same time
+        barrier.wait()
+        log.info('%s: second' % task.name)
+
+    try:
+        _runTestsInParallel(2, [_FakeTestTask('a'), _FakeTestTask('b')], runTest)
+    finally:
+        Logs.log.removeHandler(handler)
+
+    messages = handler.messages
+    assert sorted(messages) == ['a: first', 'a: second', 'b: first', 'b: second']
+    for name in ('a', 'b'):
+        # output of each test is printed as one block
+        idx = messages.index('%s: first' % name)
+        assert messages[idx + 1] == '%s: second' % name
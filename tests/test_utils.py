@@ -236,3 +236,69 @@ def testVersionComparison():
     assert not Version('1.1') <  Version('1.0.1')
     assert     Version('1.1') <  Version('1.1.2')
     assert not Version('1.1') >  Version('1.1.2')
+
+def testSetDefaultHashAlgo(monkeypatch):
+
+    from waflib import Utils as wafutils
+    monkeypatch.setattr(wafutils, 'md5', wafutils.md5)
+
+    try:
+        utils.setDefaultHashAlgo('blake2b')
+        assert utils.defaultHashAlgoName() == 'blake2b'
+        assert wafutils.md5 is utils.defaultHashAlgo()
+        assert len(wafutils.h_list(['a'])) == 20
+        assert utils.defaultHashAlgo()(b'a').digest() != \
+                    utils._blake2s(b'a').digest()
+
+        monkeypatch.setattr(utils, '_XXHASH_EXISTS', False)
+        utils.setDefaultHashAlgo('xxh3')
+        assert utils.defaultHashAlgoName() == 'blake2b'
+
+        utils.setDefaultHashAlgo('unknown')
+        assert utils.defaultHashAlgoName() == 'sha1'
+    finally:
+        utils.setDefaultHashAlgo('sha1')
+
+def testProcCmdOutCallback():
+
+    # stderr is flooded while stdout is idle and the last line has no ending
+    script = "import sys; sys.stderr.write('e\\n' * 100000); " \
+             "sys.stdout.write('a\\r\\nb\\nc'); sys.stdout.flush()"
+    lines = { False: [], True: [] }
+    def callback(line, err):
+        lines[err].append(line)
+
+    procCmd = utils.ProcCmd([sys.executable, '-c', script], stdErrToOut = False,
+                            outCallback = callback)
+    result = procCmd.run(timeout = 60)
+    assert result.exitcode == 0
+    assert lines[False] == ['a\n', 'b\n', 'c']
+    assert lines[True] == ['e\n'] * 100000
+
+def testLineAssembler():
+
+    lines = []
+    assembler = utils._LineAssembler(lambda line, err: lines.append(line), False)
+    for chunk in (b'ab', b'c\r', b'\nd\n\n', b'e\rf', b''):
+        assembler.feed(chunk)
+    assert lines == ['abc\n', 'd\n', '\n', 'e\n', 'f']
+
+def testRunProcCmds():
+
+    lines = []
+    procCmds = [
+        utils.ProcCmd([sys.executable, '-c', 'print(%d)' % x],
+                      outCallback = lambda line, err: lines.append(line))
+        for x in range(5)
+    ]
+    procCmds.append(utils.ProcCmd([sys.executable, '-c', 'print(10); exit(3)'],
+                                  captureOutput = True))
+
+    results = utils.runProcCmds(procCmds, timeout = 60)
+    assert [x.exitcode for x in results] == [0] * 5 + [3]
+    assert sorted(lines) == ['%d\n' % x for x in range(5)]
+    assert results[-1].stdout == '10\n'
+
+    procCmd = utils.ProcCmd([sys.executable, '-c', 'import time; time.sleep(30)'])
+    with pytest.raises(error.ZenMakeProcessTimeoutExpired):
+        utils.runProcCmds([procCmd], timeout = 0.5)
@@ -82,12 +82,16 @@ def testWriteZenMakeMetaFile(tmpdir, monkeypatch):
     assert 'outdir' in cfgenv
     assert 'monitfiles' in cfgenv
     assert cfgenv.monitfiles == [ str(buildconffile), str(buildconffile2) ]
-    assert 'monithash' in cfgenv
     assert 'attrs' in cfgenv
     assert cfgenv.attrs == attrs
 
-    _hash = utils.hashFiles(cfgenv.monitfiles)
-    assert cfgenv.monithash == _hash
+    assert 'monitstats' in cfgenv
+    assert cfgenv.monitstats == utils.statFiles(cfgenv.monitfiles)
+    assert 'monithashes' in cfgenv
+    for path in cfgenv.monitfiles:
+        assert cfgenv.monithashes[path] == utils.hashFile(path)
+    # files are not hashed twice
+    assert 'monithash' not in cfgenv
 
     assert 'eparams' in cfgenv
     assert cfgenv.eparams[prevbuildtype] == prevZmMeta.eparams[prevbuildtype]
@@ -98,6 +102,80 @@ def testWriteZenMakeMetaFile(tmpdir, monkeypatch):
     }
     assert cfgenv.eparams[buildtype] == curParams
 
+def testAreMonitoredFilesChanged(tmpdir):
+    buildconffile = tmpdir.join("buildconf.py")
+    buildconffile.write("buildconf")
+    zmmetafile = str(tmpdir.join("zmmetafile"))
+
+    def writeMeta(monitstat):
+        zmmeta = AutoDict(
+            monitfiles = [str(buildconffile)],
+            monitstat = monitstat,
+            attrs = {},
+            buildtype = 'dbg',
+            cliargs = {},
+            envvars = [],
+        )
+        assist.writeZenMakeMetaFile(zmmetafile, zmmeta, None)
+        return assist.loadZenMakeMetaFile(zmmetafile)
+
+    for monitstat in (True, False):
+        buildconffile.write("buildconf")
+        zmMetaConf = writeMeta(monitstat)
+        assert ('monitstats' in zmMetaConf) == monitstat
+        assert ('monithash' in zmMetaConf) != monitstat
+        assert not assist.areMonitoredFilesChanged(zmMetaConf)
+
+        # the same content with changed stat data
+        mtime = os.stat(str(buildconffile)).st_mtime
+        os.utime(str(buildconffile), (mtime + 10, mtime + 10))
+        assert not assist.areMonitoredFilesChanged(zmMetaConf)
+
+        buildconffile.write("buildconf2")
+        assert assist.areMonitoredFilesChanged(zmMetaConf)
+
+        buildconffile.remove()
+        assert assist.areMonitoredFilesChanged(zmMetaConf)
+
+def testMonitoredFilesStatRefreshed(tmpdir, monkeypatch):
+    buildconffile = tmpdir.join("buildconf.py")
+    buildconffile.write("buildconf")
+    zmmetafile = str(tmpdir.join("zmmetafile"))
+
+    zmmeta = AutoDict(
+        monitfiles = [str(buildconffile)],
+        attrs = {},
+        buildtype = 'dbg',
+        cliargs = {},
+        envvars = [],
+    )
+    assist.writeZenMakeMetaFile(zmmetafile, zmmeta, None)
+
+    # touch without changes of the content
+    mtime = os.stat(str(buildconffile)).st_mtime
+    os.utime(str(buildconffile), (mtime + 10, mtime + 10))
+
+    hashed = []
+    hashFile = assist.utils.hashFile
+    def hashFileCounted(path):
+        hashed.append(path)
+        return hashFile(path)
+    monkeypatch.setattr(assist.utils, 'hashFile', hashFileCounted)
+
+    zmMetaConf = assist.loadZenMakeMetaFile(zmmetafile)
+    assert not assist.areMonitoredFilesChanged(zmMetaConf, zmmetafile)
+    assert hashed == [str(buildconffile)]
+
+    # new stat data are stored, so the file is not hashed again
+    zmMetaConf = assist.loadZenMakeMetaFile(zmmetafile)
+    assert not assist.areMonitoredFilesChanged(zmMetaConf, zmmetafile)
+    assert hashed == [str(buildconffile)]
+    assert zmMetaConf.monitfiles == [str(buildconffile)]
+
+    buildconffile.write("buildconf2")
+    zmMetaConf = assist.loadZenMakeMetaFile(zmmetafile)
+    assert assist.areMonitoredFilesChanged(zmMetaConf, zmmetafile)
+
 def testMakeTasksCachePath():
     buildtype, zmcachedir = ('somename', 'somedir')
     path = assist.makeTasksCachePath(zmcachedir, buildtype)
@@ -0,0 +1,43 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+from waflib import Context, ConfigSet, Task
+from zm.waf import batchcc
+
+class _FakeTaskGen(object):
+
+    def __init__(self, param):
+        setattr(self, 'zm-task-params', { 'batch-compile': param })
+
+def testBatchSize():
+
+    assert batchcc._batchSize(_FakeTaskGen(False)) == 0
+    assert batchcc._batchSize(_FakeTaskGen(True)) == batchcc.DEFAULT_BATCH_SIZE
+    assert batchcc._batchSize(_FakeTaskGen(20)) == 20
+
+def testSplitByNames(tmpdir):
+
+    rootdir = str(tmpdir.realpath())
+    ctx = Context.Context(run_dir = rootdir)
+    rootNode = ctx.root.make_node(rootdir)
+
+    def makeTask(path):
+        task = Task.classes['cxx'](env = ConfigSet.ConfigSet())
+        task.inputs = [rootNode.make_node(path)]
+        return task
+
+    tasks = [makeTask(x) for x in (
+        'src/a.cpp', 'src/b.cpp', 'src/sub/a.cpp', 'src/c', 'src/x/a.cpp',
+    )]
+    assert batchcc._objName(tasks[0], '.o') == 'a.o'
+    assert batchcc._objName(tasks[3], '.obj') == 'c.obj'
+
+    invocations = batchcc._splitByNames(tasks, '.o')
+    assert invocations == [tasks[:2] + tasks[3:4], tasks[2:3], tasks[4:]]
@@ -0,0 +1,159 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import os
+import threading
+import pytest
+from zm.error import ZenMakeError
+from zm.waf import buildcache
+from zm import cacheserver, cacheproto
+
+joinpath = os.path.join
+
+def testParseSize():
+
+    assert buildcache.parseSize(1000) == 1000
+    assert buildcache.parseSize('1000') == 1000
+    assert buildcache.parseSize('10K') == 10 * 1024
+    assert buildcache.parseSize('500m') == 500 * 1024 ** 2
+    assert buildcache.parseSize('2 GB') == 2 * 1024 ** 3
+
+    for value in ('', 'G', '1.5G', '10X', True):
+        with pytest.raises(ZenMakeError):
+            buildcache.parseSize(value)
+
+def testStripRootPath():
+
+    def makeValues(rootdir):
+        return str([
+            ['-I' + joinpath(rootdir, 'include'), '-DDIR=' + rootdir, '-O2'],
+            rootdir, joinpath(os.sep + 'tmp', 'prj2', 'src'),
+        ])
+
+    rootdir = joinpath(os.sep + 'tmp', 'prj')
+    value = buildcache._stripRootPath(makeValues(rootdir), rootdir)
+    # sibling directory with the same prefix is not changed
+    assert value == str([
+        ['-I' + os.sep + 'include', '-DDIR=', '-O2'],
+        '', joinpath(os.sep + 'tmp', 'prj2', 'src'),
+    ])
+
+    # the same value in different checkouts
+    otherRoot = joinpath(os.sep + 'home', 'user', 'prj')
+    assert buildcache._stripRootPath(makeValues(otherRoot), otherRoot) == value
+
+def testStoreFetchTrim(tmpdir):
+
+    rootdir = str(tmpdir.realpath())
+    cache = buildcache.BuildCache(joinpath(rootdir, 'cache'), maxSize = 250)
+
+    paths = []
+    for idx in range(2):
+        path = joinpath(rootdir, 'out%d' % idx)
+        with open(path, 'w') as file:
+            file.write(str(idx) * 100)
+        paths.append(path)
+
+    assert not cache.fetch('aa11', paths)
+    cache.store('aa11', paths)
+    cache.store('aa11', paths)
+    assert cache.stored == 1
+
+    for path in paths:
+        os.remove(path)
+    assert cache.fetch('aa11', paths)
+    with open(paths[1]) as file:
+        assert file.read() == '1' * 100
+    assert (cache.requests, cache.hits) == (2, 1)
+
+    # least recently used entry must be removed
+    cache.store('bb22', paths)
+    os.utime(joinpath(cache.dirpath, 'aa', 'aa11'), (1, 1))
+    cache.trim()
+    assert not os.path.isdir(joinpath(cache.dirpath, 'aa', 'aa11'))
+    assert os.path.isdir(joinpath(cache.dirpath, 'bb', 'bb22'))
+
+def testGatherEntries(tmpdir):
+
+    rootdir = str(tmpdir.realpath())
+    # entry as a file (server) and entry as a directory (local cache)
+    os.makedirs(joinpath(rootdir, 'aa', 'aa11'))
+    os.makedirs(joinpath(rootdir, 'bb'))
+    files = {
+        joinpath('aa', 'aa11', '0') : 10, joinpath('aa', 'aa11', '1') : 20,
+        joinpath('bb', 'bb22') : 30, joinpath('bb', 'bb33.1.2.tmp') : 40,
+        'stamp' : 50,
+    }
+    for path, size in files.items():
+        with open(joinpath(rootdir, path), 'w') as file:
+            file.write('x' * size)
+
+    entries, totalSize = cacheproto.gatherEntries(rootdir)
+    assert totalSize == 60
+    assert sorted(x[1:] for x in entries) == [
+        (30, joinpath(rootdir, 'aa', 'aa11')), (30, joinpath(rootdir, 'bb', 'bb22')),
+    ]
+
+def testRemoteCache(tmpdir):
+
+    rootdir = str(tmpdir.realpath())
+    storage = cacheserver.Storage(joinpath(rootdir, 'server'))
+    server = cacheserver.Server(('127.0.0.1', 0), storage)
+    thread = threading.Thread(target = server.serve_forever)
+    thread.start()
+
+    try:
+        url = 'http://127.0.0.1:%d/' % server.server_address[1]
+        cache1 = buildcache.RemoteBuildCache(joinpath(rootdir, 'c1'), url)
+        cache2 = buildcache.RemoteBuildCache(joinpath(rootdir, 'c2'), url)
+
+        paths = []
+        for idx in range(3):
+            path = joinpath(rootdir, 'out%d' % idx)
+            with open(path, 'wb') as file:
+                file.write(os.urandom(1000 * idx))
+            paths.append(path)
+        os.chmod(paths[0], 0o755)
+        contents = []
+        for path in paths:
+            with open(path, 'rb') as file:
+                contents.append(file.read())
+
+        key1, key2 = 'a1' * 16, 'b2' * 16
+        cache1.store(key1, paths)
+        assert (cache1.stored, cache1.uploaded) == (1, 1)
+        assert storage.exists(key1)
+
+        cache2.query([key1, key2])
+        assert cache2._remoteKeys == { key1: True, key2: False }
+
+        for path in paths:
+            os.remove(path)
+        assert not cache2.fetch(key2, paths)
+        assert cache2.fetch(key1, paths)
+        assert (cache2.requests, cache2.hits, cache2.remoteHits) == (2, 1, 1)
+        for path, content in zip(paths, contents):
+            with open(path, 'rb') as file:
+                assert file.read() == content
+        assert os.stat(paths[0]).st_mode & 0o777 == 0o755
+
+        # it's in the local cache now
+        assert cache2.fetch(key1, paths)
+        assert cache2.remoteHits == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    # server is not available
+    cache3 = buildcache.RemoteBuildCache(joinpath(rootdir, 'c3'), url)
+    assert not cache3.fetch(key1, paths)
+    cache3.store(key2, paths)
+    assert (cache3.stored, cache3.uploaded) == (1, 0)
@@ -0,0 +1,187 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import os
+
+import pytest
+from waflib import Build, Context
+from zm.waf import buildstate
+
+joinpath = os.path.join
+
+class _FakeTask(object):
+
+    def __init__(self, uid):
+        self._uid = uid
+
+    def uid(self):
+        return self._uid
+
+class _FakeTaskGen(object):
+
+    def __init__(self, bld, name, variant, uids, use = None):
+        self.bld = bld
+        self.name = name
+        self.tasks = [_FakeTask(x) for x in uids]
+        self.use = use or []
+        self.posted = False
+        setattr(self, 'zm-task-params', { '$task.variant' : variant })
+
+class _FakeBld(object):
+
+    def __init__(self, rundir):
+        self.root = Context.Context(run_dir = rundir).root
+        self.variant_dir = joinpath(rundir, 'out')
+        self.groups = [[]]
+        for attr in Build.SAVED_ATTRS:
+            if attr != 'root':
+                setattr(self, attr, {})
+
+    def addTaskGen(self, *args, **kwargs):
+        tgen = _FakeTaskGen(self, *args, **kwargs)
+        self.groups[0].append(tgen)
+        return tgen
+
+    def get_tgen_by_name(self, name):
+        for tgen in self.groups[0]:
+            if tgen.name == name:
+                return tgen
+        raise Exception("no tgen %r" % name)
+
+    def restoreTools(self):
+        pass
+
+    def init_dirs(self):
+        pass
+
+@pytest.fixture
+def bldFactory(tmpdir, monkeypatch):
+    monkeypatch.setattr(Build, 'SAVED_ATTRS', Build.SAVED_ATTRS + ['zmExtra'])
+    rundir = str(tmpdir.realpath())
+
+    def make():
+        return _FakeBld(rundir)
+    return make
+
+def _fillState(bld):
+    bld.addTaskGen('lib', 'debug.lib', [b'u1', b'u2'])
+    bld.addTaskGen('app', 'debug.app', [b'u3'], use = ['lib'])
+
+    nodeA = bld.root.make_node(joinpath(bld.variant_dir, 'a.cpp'))
+    nodeB = bld.root.make_node(joinpath(bld.variant_dir, 'b.cpp'))
+    for uid in (b'u1', b'u2', b'u3'):
+        bld.task_sigs[uid] = b'sig-' + uid
+        bld.imp_sigs[uid] = b'imp-' + uid
+        bld.raw_deps[uid] = ['raw-%s' % uid.decode()]
+    bld.node_deps[b'u1'] = [nodeA, nodeB]
+    bld.node_deps[b'u3'] = [nodeB]
+    bld.node_sigs[nodeA] = b'u1'
+    bld.node_sigs[nodeB] = b'u3'
+    bld.zmExtra = { 'key' : 'value' }
+
+def _dumpState(bld):
+    result = { x: getattr(bld, x) for x in ('task_sigs', 'imp_sigs', 'raw_deps') }
+    result['node_deps'] = { k: [x.abspath() for x in v] \
+                                        for k, v in bld.node_deps.items() }
+    result['node_sigs'] = { k.abspath(): v for k, v in bld.node_sigs.items() }
+    result['zmExtra'] = bld.zmExtra
+    return result
+
+def testStoreRestore(bldFactory):
+
+    bld = bldFactory()
+    _fillState(bld)
+    buildstate.store(bld)
+    expected = _dumpState(bld)
+
+    shardsDir = joinpath(bld.variant_dir, buildstate.SHARDS_DIRNAME)
+    assert sorted(os.listdir(shardsDir)) == ['@common', 'debug.app', 'debug.lib']
+
+    bld = bldFactory()
+    buildstate.restore(bld)
+    # only common shard is loaded
+    assert bld.zmExtra == { 'key' : 'value' }
+    assert not bld.task_sigs
+
+    for name, variant, uids in (('lib', 'debug.lib', [b'u1', b'u2']),
+                                ('app', 'debug.app', [b'u3'])):
+        buildstate._tgenPost(bld.addTaskGen(name, variant, uids))
+    assert _dumpState(bld) == expected
+
+def testUnchangedShardsNotRewritten(bldFactory, monkeypatch):
+
+    bld = bldFactory()
+    bld.addTaskGen('lib', 'lib', [b'u1'])
+    bld.addTaskGen('app', 'app', [b'u2'])
+    bld.task_sigs.update({ b'u1' : b'sig1', b'u2' : b'sig2' })
+    bld.zmExtra = {}
+    buildstate.store(bld)
+
+    written = []
+    origReplace = os.replace
+    def replace(src, dst):
+        written.append(os.path.basename(dst))
+        origReplace(src, dst)
+    monkeypatch.setattr(buildstate.os, 'replace', replace)
+
+    def rebuild(sig2):
+        bld = bldFactory()
+        buildstate.restore(bld)
+        for name, uid in (('lib', b'u1'), ('app', b'u2')):
+            buildstate._tgenPost(bld.addTaskGen(name, name, [uid]))
+        bld.task_sigs[b'u2'] = sig2
+        buildstate.store(bld)
+
+    rebuild(b'sig2')
+    assert not written
+
+    rebuild(b'sig2-changed')
+    assert written == ['app']
+
+def testUseDepsLoadedOnPost(bldFactory):
+
+    bld = bldFactory()
+    _fillState(bld)
+    buildstate.store(bld)
+
+    bld = bldFactory()
+    buildstate.restore(bld)
+    bld.addTaskGen('lib', 'debug.lib', [b'u1', b'u2'])
+    otherLib = bld.addTaskGen('other', 'release.other', [])
+    app = bld.addTaskGen('app', 'debug.app', [b'u3'], use = ['lib', 'unknown'])
+    buildstate._tgenPost(app)
+
+    loaded = bld.zmBuildState.loaded
+    assert 'debug.app' in loaded and 'debug.lib' in loaded
+    assert b'u1' in bld.task_sigs and b'u3' in bld.task_sigs
+    assert 'release.other' not in loaded
+
+    # posted task generator doesn't load anything
+    otherLib.posted = True
+    buildstate._tgenPost(otherLib)
+    assert 'release.other' not in loaded
+
+def testClean(bldFactory):
+
+    bld = bldFactory()
+    _fillState(bld)
+    buildstate.store(bld)
+    shardsDir = joinpath(bld.variant_dir, buildstate.SHARDS_DIRNAME)
+    assert os.path.isdir(shardsDir)
+
+    buildstate._bldClean(bld)
+    assert not os.path.exists(shardsDir)
+    assert not bld.zmBuildState.shardOfUid
+
+    bld = bldFactory()
+    buildstate.restore(bld)
+    buildstate._tgenPost(bld.addTaskGen('lib', 'debug.lib', [b'u1', b'u2']))
+    assert not bld.task_sigs
+    assert not bld.zmExtra
@@ -0,0 +1,154 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+from collections import defaultdict
+
+from waflib import Task, TaskGen, Runner
+from zm.waf import critpath
+
+class _FakeTask(object):
+
+    def __init__(self, name, runAfter = None):
+        self.name = name
+        self.run_after = set(runAfter or [])
+        self.inputs = self.outputs = []
+
+    def uid(self):
+        return self.name
+
+class _FakeBld(object):
+    pass
+
+def testMakeEstimator():
+
+    class cxx(_FakeTask):
+        pass
+
+    class link(_FakeTask):
+        pass
+
+    times = {
+        'a.o': (2.0, 'cxx'),
+        'b.o': (4.0, 'cxx'),
+        'app': (1.0, 'link'),
+    }
+    estimate = critpath._makeEstimator(times)
+    assert estimate(cxx('a.o')) == 2.0
+    assert estimate(link('app')) == 1.0
+    # average of known tasks of the same class
+    assert estimate(cxx('new.o')) == 3.0
+    assert estimate(_FakeTask('other')) == critpath._DEFAULT_DURATION
+
+def testPrioAndSplit():
+
+    class cxx(_FakeTask):
+        pass
+
+    class link(_FakeTask):
+        pass
+
+    for cls in (cxx, link):
+        cls.hasrun = Task.NOT_RUN
+        cls.tree_weight = 0
+        cls.prio_order = 0
+
+    class FakeProducer(object):
+        _wafPrioAndSplit = Runner.Parallel._wafPrioAndSplit
+        def __init__(self, bld):
+            self.bld = bld
+            self.revdeps = defaultdict(set)
+
+    # long chain with only one dependent task
+    heavy = cxx('heavy.o')
+    heavyLink = link('heavy', [heavy])
+    # short task with many dependent tasks
+    light = cxx('light.o')
+    lightDeps = [cxx('dep%d.o' % i, [light]) for i in range(50)]
+
+    bld = _FakeBld()
+    bld.zmTaskTimes = { 'heavy.o': (10.0, 'cxx'), 'heavy': (1.0, 'link') }
+    for task in [light] + lightDeps:
+        bld.zmTaskTimes[task.name] = (0.1, 'cxx')
+
+    tasks = [light, heavy, heavyLink] + lightDeps
+    ready, waiting = critpath._prioAndSplit(FakeProducer(bld), tasks)
+    assert set(ready) == {light, heavy}
+    assert len(waiting) == 51
+
+    assert heavy.prio_order > light.prio_order
+    assert abs(heavy.prio_order - 11.0) < 0.001
+    assert abs(light.prio_order - 0.2) < 0.001
+    # the Waf priority is a tie-breaker for tasks with the same durations
+    assert lightDeps[0].prio_order == lightDeps[1].prio_order
+    assert light.prio_order > 0.2
+
+def testTaskDeps():
+
+    first = _FakeTask('first')
+    second = _FakeTask('second')
+    group = Task.TaskGroup([first, second], [])
+    last = _FakeTask('last', [group])
+    assert sorted(x.name for x in critpath._taskDeps(last)) == ['first', 'second']
+
+def testPrune():
+
+    def makeBld(posted):
+        bld = _FakeBld()
+        tgen = TaskGen.task_gen.__new__(TaskGen.task_gen)
+        tgen.posted = posted
+        bld.groups = [[tgen]]
+        bld.zmTaskTimes = { 'a': (1.0, 'cxx'), 'old': (2.0, 'cxx') }
+        critpath.setUp(bld, False)
+        bld.zmSeenTaskUids.add('a')
+        return bld
+
+    bld = makeBld(True)
+    assert critpath._prune(bld)
+    assert bld.zmTaskTimes == { 'a': (1.0, 'cxx') }
+    assert bld.zmSeenTaskUids is None
+    assert not critpath._prune(bld)
+
+    # not all tasks were created
+    bld = makeBld(False)
+    assert not critpath._prune(bld)
+    assert len(bld.zmTaskTimes) == 2
+
+    bld = makeBld(True)
+    bld.zmFastPartialSkipped = 1
+    assert not critpath._prune(bld)
+    assert len(bld.zmTaskTimes) == 2
+
+def testReport(monkeypatch):
+
+    lines = []
+    monkeypatch.setattr(critpath.log, 'info', lines.append)
+
+    bld = _FakeBld()
+    critpath.setUp(bld, True)
+    critpath.report(bld, 2)
+    assert lines == ['Critical path: no tasks were executed']
+
+    a, b, c = _FakeTask('a'), _FakeTask('b'), _FakeTask('c')
+    link = _FakeTask('link')
+    bld.zmTaskDeps = { link: [a, b, c] }
+    bld.zmTaskSpans = [
+        (a, 0.0, 3.0),
+        (b, 0.0, 1.0),
+        (c, 1.0, 2.0),
+        (link, 3.0, 4.0),
+    ]
+
+    lines.clear()
+    critpath.report(bld, 2)
+    assert lines[0] == 'Critical path: 4.000s through 2 of 4 executed tasks'
+    assert lines[1].endswith('_FakeTask')
+    # total work is 6s on 2 jobs, so critical path is the theoretical minimum
+    assert lines[-1] == 'Tasks time: 4.000s, total work: 6.000s on 2 jobs, ' \
+                        'theoretical minimum: 4.000s (100%)'
@@ -0,0 +1,89 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import types
+
+import pytest
+from waflib import ConfigSet
+from zm.waf import depscanner
+
+class _FakeTaskGen(object):
+
+    def __init__(self, features, scanner = 'compiler', **envVars):
+        self.features = features
+        self.env = ConfigSet.ConfigSet()
+        for name, value in envVars.items():
+            self.env[name] = value
+        setattr(self, 'zm-task-params', { 'dep-scanner': scanner })
+
+@pytest.fixture
+def extras(monkeypatch):
+    # real extras replace Task classes 'c' and 'cxx' for the whole process
+    monkeypatch.setitem(depscanner._local, 'gccdeps', types.SimpleNamespace(
+        supported_compilers = ['gas', 'gcc', 'icc', 'clang'],
+        gccdeps_flags = ['-MD'],
+    ))
+    monkeypatch.setitem(depscanner._local, 'msvcdeps', types.SimpleNamespace(
+        supported_compilers = ['msvc'],
+        PREPROCESSOR_FLAG = '/showIncludes',
+    ))
+
+def testGccLikeCompilers(extras):
+
+    tgen = _FakeTaskGen(['c', 'cxx', 'cxxprogram'], CC_NAME = 'gcc', CXX_NAME = 'clang')
+    depscanner.applyCompilerDepScanner(tgen)
+    env = tgen.env
+    assert env.ENABLE_GCCDEPS == ['c', 'cxx']
+    assert env.CFLAGS == ['-MD']
+    assert env.CXXFLAGS == ['-MD']
+    assert not env.ZM_MSVCDEPS
+
+    tgen = _FakeTaskGen(['cxx'], CC_NAME = 'gcc', CXX_NAME = 'gcc')
+    depscanner.applyCompilerDepScanner(tgen)
+    assert tgen.env.ENABLE_GCCDEPS == ['cxx']
+    assert not tgen.env.CFLAGS
+
+def testMsvc(extras):
+
+    tgen = _FakeTaskGen(['cxx'], CC_NAME = 'msvc', CXX_NAME = 'msvc')
+    depscanner.applyCompilerDepScanner(tgen)
+    env = tgen.env
+    assert env.ZM_MSVCDEPS
+    assert env.CXXFLAGS == ['/showIncludes']
+    assert not env.CFLAGS
+    assert not env.ENABLE_GCCDEPS
+
+    # compiler of the language is checked, not the C compiler
+    tgen = _FakeTaskGen(['cxx'], CC_NAME = 'msvc', CXX_NAME = 'unknown')
+    depscanner.applyCompilerDepScanner(tgen)
+    assert not tgen.env.ZM_MSVCDEPS
+    assert not tgen.env.CXXFLAGS
+
+    tgen = _FakeTaskGen(['c', 'cxx'], CC_NAME = 'gcc', CXX_NAME = 'msvc')
+    depscanner.applyCompilerDepScanner(tgen)
+    assert tgen.env.ENABLE_GCCDEPS == ['c']
+    assert tgen.env.CFLAGS == ['-MD']
+    assert tgen.env.ZM_MSVCDEPS
+    assert tgen.env.CXXFLAGS == ['/showIncludes']
+
+def testPythonScanner(extras):
+
+    # unknown compilers use the python scanner
+    tgen = _FakeTaskGen(['c', 'cxx'], CC_NAME = 'suncc', CXX_NAME = 'sunc++')
+    depscanner.applyCompilerDepScanner(tgen)
+    env = tgen.env
+    assert not env.ENABLE_GCCDEPS and not env.ZM_MSVCDEPS
+    assert not env.CFLAGS and not env.CXXFLAGS
+
+    # default value of the param
+    tgen = _FakeTaskGen(['c'], scanner = None, CC_NAME = 'gcc')
+    depscanner.applyCompilerDepScanner(tgen)
+    assert not tgen.env.ENABLE_GCCDEPS
+    assert not tgen.env.CFLAGS
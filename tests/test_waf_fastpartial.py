@@ -0,0 +1,133 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import os
+
+from waflib import ConfigSet, Task
+from zm.autodict import AutoDict
+from zm.waf import fastpartial
+
+def testSelectToPost():
+
+    tgens = ['a', 'b', 'c', 'd', 'e', 'f']
+    # b uses a, c uses b, e uses d, f consumes output files of e
+    deps = { 'b': {'a'}, 'c': {'b'}, 'e': {'d'} }
+    consumers = { 'a': {'b'}, 'b': {'c'}, 'd': {'e'}, 'e': {'f'} }
+
+    assert fastpartial.selectToPost(tgens, set(), consumers, deps) == set()
+    assert fastpartial.selectToPost(tgens, {'c'}, consumers, deps) == {'a', 'b', 'c'}
+    assert fastpartial.selectToPost(tgens, {'a'}, consumers, deps) == {'a', 'b', 'c'}
+    assert fastpartial.selectToPost(tgens, {'e'}, consumers, deps) == {'d', 'e', 'f'}
+    assert fastpartial.selectToPost(tgens, {'f'}, consumers, deps) == {'f'}
+
+class _FakeTaskGen(object):
+
+    def __init__(self, source):
+        self.name = 'prog'
+        self.source = source
+        self.env = ConfigSet.ConfigSet()
+        self.env.CXXFLAGS = ['-O2']
+        setattr(self, 'zm-task-params', {
+            'name' : 'prog', 'source' : source, '$task.variant' : 'debug.prog',
+        })
+
+def testTgenHash():
+
+    tgen1 = _FakeTaskGen(x for x in ['a.cpp', 'b.cpp'])
+    tgen2 = _FakeTaskGen(['a.cpp', 'b.cpp'])
+    hash1 = fastpartial._tgenHash(tgen1, 'h')
+    assert hash1 == fastpartial._tgenHash(tgen2, 'h')
+    # lazy source is replaced by the list
+    assert tgen1.source == ['a.cpp', 'b.cpp']
+    assert getattr(tgen1, 'zm-task-params')['source'] is tgen1.source
+    assert fastpartial._tgenKey(tgen1) == 'debug.prog'
+
+    assert hash1 != fastpartial._tgenHash(tgen2, 'other')
+    tgen2.env.CXXFLAGS = ['-O3']
+    assert hash1 != fastpartial._tgenHash(tgen2, 'h')
+
+def testStamp(tmpdir):
+
+    path = str(tmpdir.join('file'))
+    cache = {}
+    assert fastpartial._stamp(path, cache) is None
+
+    with open(path, 'w') as file:
+        file.write('12')
+    assert fastpartial._stamp(path, cache) is None # cached
+    stamp = fastpartial._stamp(path, {})
+    assert stamp == (os.stat(path).st_mtime_ns, 2)
+
+class _FakeNode(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def abspath(self):
+        return self.path
+
+class _FakeTask(object):
+
+    def __init__(self, uid, inputs, outputs, hasrun = Task.SUCCESS):
+        self._uid = uid
+        self.inputs = [_FakeNode(x) for x in inputs]
+        self.outputs = [_FakeNode(x) for x in outputs]
+        self.dep_nodes = []
+        self.hasrun = hasrun
+
+    def uid(self):
+        return self._uid
+
+def testRecord(tmpdir):
+
+    paths = {}
+    for name in ('a.cpp', 'a.h', 'a.o', 'b.cpp', 'b.o'):
+        paths[name] = str(tmpdir.join(name))
+        with open(paths[name], 'w') as file:
+            file.write(name)
+
+    tgenA = _FakeTaskGen(['a.cpp'])
+    tgenA.posted = True
+    tgenA.tasks = [_FakeTask(1, [paths['a.cpp']], [paths['a.o']])]
+    tgenB = _FakeTaskGen(['b.cpp'])
+    getattr(tgenB, 'zm-task-params')['$task.variant'] = 'debug.b'
+    tgenB.posted = True
+    tgenB.tasks = [_FakeTask(2, [paths['b.cpp']], [paths['b.o']])]
+
+    bld = AutoDict(node_deps = { 1: [_FakeNode(paths['a.h'])] })
+    setattr(bld, fastpartial._RECORDS_ATTR, {})
+    records = getattr(bld, fastpartial._RECORDS_ATTR)
+
+    bld.zmFastPartial = { tgenA: 'ha', tgenB: 'hb' }
+    assert fastpartial._record(bld)
+    assert bld.zmFastPartial is None
+    stamp = lambda x: fastpartial._stamp(paths[x], {})
+    assert records['debug.prog'] == ('ha', tuple(sorted(
+        (paths[x], stamp(x)) for x in ('a.cpp', 'a.h', 'a.o'))), (paths['a.o'],))
+    assert records['debug.b'][0] == 'hb'
+
+    # nothing is changed
+    bld.zmFastPartial = { tgenA: 'ha', tgenB: 'hb' }
+    assert not fastpartial._record(bld)
+
+    # task generators with failed tasks and tasks with 'always_run'
+    # must be posted in the next build
+    tgenA.tasks[0].hasrun = Task.CRASHED
+    tgenB.tasks[0].always_run = True
+    bld.zmFastPartial = { tgenA: 'ha', tgenB: 'hb' }
+    assert fastpartial._record(bld)
+    assert records == {}
+
+    # task generator that wasn't posted
+    tgenA.tasks[0].hasrun = Task.SUCCESS
+    tgenA.posted = False
+    bld.zmFastPartial = { tgenA: 'ha' }
+    assert not fastpartial._record(bld)
+    assert records == {}
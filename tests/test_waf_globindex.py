@@ -0,0 +1,72 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import os
+from waflib import Context
+from zm.waf import globindex
+
+joinpath = os.path.join
+
+def _makeFiles(rootdir, paths):
+    for path in paths:
+        path = joinpath(rootdir, path)
+        dirpath = os.path.dirname(path)
+        if not os.path.isdir(dirpath):
+            os.makedirs(dirpath)
+        with open(path, 'w') as file:
+            file.write('')
+
+def testGlob(tmpdir):
+
+    rootdir = str(tmpdir.realpath())
+    _makeFiles(rootdir, [
+        'src/a.cpp', 'src/b.cpp', 'src/b.h', 'src/sub/c.cpp',
+        'src/sub/deep/d.cpp', 'src/excl/e.cpp', 'other/f.cpp',
+    ])
+
+    ctx = Context.Context(run_dir = rootdir)
+    startNode = ctx.root.make_node(rootdir)
+    indexPath = joinpath(rootdir, 'index')
+
+    def check(incl, excl, withDirs = False):
+        index = globindex.GlobIndex(indexPath)
+        index.load()
+        nodes = index.glob(startNode, incl, excl, withDirs = withDirs)
+        index.save()
+        expected = startNode.ant_glob(incl = incl, excl = excl, dir = withDirs,
+                                      remove = False)
+        assert nodes == expected
+        return index
+
+    check(['src/**/*.cpp'], ['**/excl/**'])
+    check(['**/*.cpp', '*/*.h'], [])
+    check(['src/*'], [], withDirs = True)
+    index = check(['**/*.cpp'], ['other'])
+    assert not index.changed
+    assert os.path.isfile(indexPath)
+
+    # listing from the index is used while mtime of the directory is the same
+    dirpath = joinpath(rootdir, 'src', 'sub')
+    mtime = os.stat(dirpath).st_mtime_ns - 10 ** 10
+    os.utime(dirpath, ns = (mtime, mtime))
+    index = globindex.GlobIndex(indexPath)
+    index.load()
+    listing = index.listdir(dirpath)
+    assert index.dirs[dirpath] == (mtime, listing)
+    index.save()
+    index.load()
+    assert index.listdir(dirpath) is not listing
+    assert not index.changed
+
+    # new file
+    _makeFiles(rootdir, ['src/sub/g.cpp'])
+    assert ('g.cpp', False) in index.listdir(dirpath)
+    assert index.changed
+    check(['src/**/*.cpp'], [])
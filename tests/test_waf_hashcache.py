@@ -0,0 +1,53 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import os
+import time
+
+from zm.waf import hashcache
+
+def testHashCache(tmpdir):
+
+    path = str(tmpdir.join('file'))
+    with open(path, 'w') as file:
+        file.write('12')
+
+    calls = []
+    def hashFunc():
+        calls.append(path)
+        return 'digest%d' % len(calls)
+
+    hashes = {}
+    cache = hashcache._HashCache(hashes)
+
+    # recently modified file is not cached
+    assert cache.get(path, hashFunc) == 'digest1'
+    assert cache.get(path, hashFunc) == 'digest2'
+    assert not hashes and not cache.dirty
+
+    past = int(time.time() * 1e9) - 10 * 10**9
+    os.utime(path, ns = (past, past))
+    assert cache.get(path, hashFunc) == 'digest3'
+    assert cache.dirty
+    assert cache.get(path, hashFunc) == 'digest3'
+    assert len(calls) == 3
+
+    # stat data has been changed
+    with open(path, 'w') as file:
+        file.write('123')
+    os.utime(path, ns = (past, past))
+    assert cache.get(path, hashFunc) == 'digest4'
+    assert cache.get(path, hashFunc) == 'digest4'
+
+    # the same mtime and size but recent modification
+    with open(path, 'w') as file:
+        file.write('321')
+    assert cache.get(path, hashFunc) == 'digest5'
+    assert path not in hashes
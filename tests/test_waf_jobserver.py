@@ -0,0 +1,177 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import os
+import queue
+import select
+import threading
+import pytest
+from waflib import Runner
+from zm.autodict import AutoDict
+from zm.constants import PLATFORM
+from zm.waf import jobserver
+
+pytestmark = pytest.mark.skipif(PLATFORM == 'windows',
+                                reason = 'jobserver is not supported on Windows')
+
+def _hasToken(fd):
+    return bool(select.select([fd], [], [], 0)[0])
+
+def testParseMakeFlags():
+
+    parse = jobserver._parseMakeFlags
+    assert parse('') == (None, [], [])
+    assert parse('w -j4 --jobserver-auth=3,4') == ('3,4', ['w'], [])
+    assert parse(' -j --jobserver-fds=5,6 --jobserver-auth=fifo:/tmp/x -- A=1') == \
+        ('fifo:/tmp/x', [], ['--', 'A=1'])
+
+def testTokens():
+
+    server = jobserver.JobServer.create(3)
+    try:
+        assert server.makeflags(3) == '-j3 --jobserver-auth=%d,%d' % server.fds
+
+        # the implicit token at first
+        assert server.acquire() is None
+        tokens = [server.acquire(), server.acquire()]
+        assert tokens == [b'+', b'+']
+        assert not _hasToken(server.rfd)
+
+        # the implicit token is taken while waiting for a token in the pipe
+        server.release(None)
+        assert server.acquire() is None
+
+        for token in tokens:
+            server.release(token)
+        assert _hasToken(server.rfd)
+    finally:
+        server.close()
+
+def testConnect(tmpdir):
+
+    with pytest.raises(OSError):
+        jobserver.JobServer.connect('fifo:%s' % tmpdir.join('nofifo'))
+    with pytest.raises(OSError):
+        jobserver.JobServer.connect('semaphore')
+
+    server = jobserver.JobServer.create(2)
+    try:
+        client = jobserver.JobServer.connect('%d,%d' % server.fds)
+        assert client.acquire() is None
+        assert client.acquire() == b'+'
+        assert not _hasToken(server.rfd)
+        client.release(b'+')
+        assert _hasToken(server.rfd)
+        client.close()
+    finally:
+        server.close()
+
+
+    path = str(tmpdir.join('fifo'))
+    os.mkfifo(path)
+    client = jobserver.JobServer.connect('fifo:%s' % path)
+    assert client.fds == ()
+    client.close()
+
+def testSetUpEnv(monkeypatch):
+
+    monkeypatch.setenv('MAKEFLAGS', 'k -- A=1')
+    monkeypatch.setattr(jobserver.cli, 'selected', AutoDict(args = AutoDict()))
+    bld = AutoDict(jobs = 3)
+    bld.bconfManager.root.general = {}
+
+    jobserver.setUp(bld)
+    try:
+        server = jobserver.get()
+        assert server is not None
+        # only processes which get fds of the jobserver must see it
+        assert os.environ['MAKEFLAGS'] == 'k -- A=1'
+        env = jobserver.popenEnv({ 'X' : '1' })
+        assert env == { 'X' : '1', 'MAKEFLAGS' :
+                    'k -j3 --jobserver-auth=%d,%d -- A=1' % jobserver.popenFds() }
+    finally:
+        jobserver.finish(bld)
+
+    assert jobserver.get() is None
+    assert jobserver.popenEnv({ 'X' : '1' }) == { 'X' : '1' }
+    assert os.environ['MAKEFLAGS'] == 'k -- A=1'
+
+def testConsumerReleasesTokenBeforeDone():
+
+    server = jobserver.JobServer.create(2)
+    try:
+        assert server.acquire() is None
+        token = server.acquire()
+        assert not _hasToken(server.rfd)
+
+        events = []
+        class Queue(object):
+            def put(self, task):
+                # the main thread can close the jobserver after that
+                events.append(('done', task, _hasToken(server.rfd)))
+
+        master = AutoDict(stop = False, out = Queue())
+        master.process_task = lambda task: events.append(('process', task))
+        spawner = AutoDict(master = master, sem = AutoDict())
+        spawner.sem.release = lambda: None
+
+        consumer = jobserver._Consumer(spawner, 'task', server, token)
+        consumer.join()
+        assert events == [('process', 'task'), ('done', 'task', True)]
+    finally:
+        server.close()
+
+def testClosedMidBuild(monkeypatch):
+
+    rfd, wfd = os.pipe()
+    server = jobserver.JobServer(rfd, wfd, owned = True)
+    monkeypatch.setitem(jobserver._local, 'jobserver', server)
+    monkeypatch.setattr(jobserver.log, 'warn', lambda msg: None)
+
+    firstStarted = threading.Event()
+    finishFirst = threading.Event()
+
+    class FakeTask(object):
+        def __init__(self, name):
+            self.name = name
+            self.generator = AutoDict()
+        def log_display(self, bld):
+            pass
+
+    class FakeMaster(object):
+        def __init__(self):
+            self.numjobs = 3
+            self.stop = False
+            self.ready = queue.Queue()
+            self.out = queue.Queue()
+        def process_task(self, task):
+            if task.name == 'a':
+                firstStarted.set()
+                finishFirst.wait(5)
+
+    master = FakeMaster()
+    tasks = [FakeTask(x) for x in ('a', 'b', 'c')]
+    try:
+        for task in tasks:
+            master.ready.put(task)
+        Runner.Spawner(master)
+
+        # 'a' has the implicit token and 'b' waits for a token in the pipe
+        assert firstStarted.wait(5)
+        os.close(wfd)
+
+        # the build goes on without the jobserver
+        done = [master.out.get(timeout = 5) for _ in range(2)]
+        assert sorted(x.name for x in done) == ['b', 'c']
+        finishFirst.set()
+        assert master.out.get(timeout = 5) is tasks[0]
+    finally:
+        finishFirst.set()
+        os.close(rfd)
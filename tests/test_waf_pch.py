@@ -0,0 +1,30 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+from waflib import Context, Task
+from zm.waf import pch
+
+def testTaskClasses():
+
+    for lang in ('c', 'cxx'):
+        cls = Task.classes['%spch' % lang]
+        assert issubclass(cls, pch._PchTaskBase)
+        assert 'ZMPCH_FLAGS' in cls.vars
+        assert 'ZMPCH_WRAPPER' in cls.vars
+
+def testWrapperText(tmpdir):
+
+    rootdir = str(tmpdir.realpath())
+    ctx = Context.Context(run_dir = rootdir)
+    rootNode = ctx.root.make_node(rootdir)
+
+    wrapper = rootNode.make_node('build/debug/app.1.pch.h')
+    header = rootNode.make_node('src/pch.h')
+    assert pch._wrapperText(wrapper, header) == '#include "../../src/pch.h"\n'
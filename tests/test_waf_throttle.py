@@ -0,0 +1,111 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import os
+
+from waflib import Task
+from zm.autodict import AutoDict
+from zm.waf import throttle
+from waflib.Tools import cxx # pylint: disable = unused-import, wrong-import-order
+
+GB = 1024 ** 3
+
+class _FakeTask(object):
+    pass
+
+def _makeTask(name):
+    return object.__new__(Task.classes[name])
+
+def testAvailableMemory(tmpdir):
+
+    path = tmpdir.join('meminfo')
+    path.write('MemTotal:  16000000 kB\nMemFree:  1000 kB\n'
+               'MemAvailable:  8000000 kB\nCached:  2000 kB\n')
+    assert throttle.availableMemory(str(path)) == 8000000 * 1024
+
+    path.write('MemTotal:  16000000 kB\nMemFree:  1000 kB\nCached:  2000 kB\n')
+    assert throttle.availableMemory(str(path)) == 3000 * 1024
+
+    assert throttle.availableMemory(str(tmpdir.join('nofile'))) is None
+
+def testIsLinkTask():
+
+    assert throttle.isLinkTask(_makeTask('cxxprogram'))
+    assert not throttle.isLinkTask(_makeTask('cxxstlib'))
+    assert not throttle.isLinkTask(_FakeTask())
+
+def testLoad():
+
+    load = [4.0]
+    gate = throttle.Throttle(maxLoad = 4)
+    gate.getLoad = lambda: (load[0], 0, 0)
+
+    # the first task is always started
+    assert gate._canStart(False)
+    gate.start(_FakeTask())
+    assert not gate._canStart(False)
+
+    # the started task is counted in the load
+    load[0] = 2.0
+    assert gate._canStart(False)
+    gate.start(_FakeTask())
+    assert not gate._canStart(False)
+
+    # until the load average is updated
+    gate._started.clear()
+    assert gate._canStart(False)
+
+    gate.finish(_FakeTask())
+    gate.finish(_FakeTask())
+    load[0] = 10.0
+    assert gate._canStart(False)
+
+def testMemory():
+
+    memory = [3 * GB]
+    gate = throttle.Throttle(minFreeMem = 1 * GB, linkMem = 2 * GB)
+    gate.getMemory = lambda: memory[0]
+
+    link = _makeTask('cxxprogram')
+    gate.start(link)
+    # memory for the running link task is reserved
+    assert gate._canStart(False)
+    assert not gate._canStart(True)
+
+    memory[0] = 2 * GB
+    assert not gate._canStart(False)
+
+    # unknown memory
+    memory[0] = None
+    assert gate._canStart(True)
+
+    gate.finish(link)
+    memory[0] = 0
+    assert gate._canStart(True)
+
+def testNoLoadAverage(monkeypatch):
+
+    monkeypatch.delattr(os, 'getloadavg', raising = False)
+    warnings = []
+    monkeypatch.setattr(throttle.log, 'warn', warnings.append)
+
+    gate = throttle.Throttle(maxLoad = 1)
+    gate.start(_FakeTask())
+    assert gate._canStart(False)
+
+    bld = AutoDict(jobs = 4)
+    monkeypatch.setattr(throttle.cli, 'selected', AutoDict(args = AutoDict(maxLoad = 2)))
+    assert throttle._makeThrottle(bld) is None
+    assert len(warnings) == 1
+
+    monkeypatch.setattr(throttle.cli, 'selected',
+                        AutoDict(args = AutoDict(maxLoad = 2, minFreeMem = '1G')))
+    gate = throttle._makeThrottle(bld)
+    assert gate.maxLoad is None and gate.minFreeMem == GB
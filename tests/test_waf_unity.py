@@ -0,0 +1,37 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+from waflib import Context, ConfigSet
+from zm.waf import unity
+
+class _FakeTaskGen(object):
+
+    def __init__(self, param, features = ('cxx', 'cxxprogram')):
+        setattr(self, 'zm-task-params', { 'unity-build': param })
+        self.features = list(features)
+
+def testBatchSize():
+
+    assert unity._unityBatchSize(_FakeTaskGen(False)) == 0
+    assert unity._unityBatchSize(_FakeTaskGen(True)) == unity.DEFAULT_BATCH_SIZE
+    assert unity._unityBatchSize(_FakeTaskGen(20)) == 20
+    assert unity._unityBatchSize(_FakeTaskGen(True, ['cxx', 'qt5'])) == 0
+
+def testUnityText(tmpdir):
+
+    rootdir = str(tmpdir.realpath())
+    ctx = Context.Context(run_dir = rootdir)
+    rootNode = ctx.root.make_node(rootdir)
+
+    task = unity.unity(env = ConfigSet.ConfigSet())
+    task.outputs = [rootNode.make_node('build/prog.1.unity-0.cpp')]
+    task.batch = [rootNode.make_node(x) for x in ('src/a.cpp', 'src/sub/b.cpp')]
+    assert task.makeText() == \
+        '#include "../src/a.cpp"\n#include "../src/sub/b.cpp"\n'
@@ -0,0 +1,133 @@
+# coding=utf-8
+#
+
+# pylint: disable = missing-docstring, invalid-name, protected-access
+
+"""
+ Copyright (c) 2022, Alexander Magola. All rights reserved.
+ license: BSD 3-Clause License, see LICENSE for more details.
+"""
+
+import os
+import pytest
+from zm.constants import PLATFORM
+from zm import watch
+
+joinpath = os.path.join
+
+def _writeFile(path, content = ''):
+    dirpath = os.path.dirname(path)
+    if not os.path.isdir(dirpath):
+        os.makedirs(dirpath)
+    with open(path, 'w') as file:
+        file.write(content)
+
+@pytest.fixture
+def project(tmpdir):
+
+    rootdir = str(tmpdir.realpath())
+    for path in ('src/a.cpp', 'src/sub/b.cpp', 'src/.git/c', 'build/d.o', 'tests/t.cpp'):
+        _writeFile(joinpath(rootdir, path))
+
+    spec = watch.WatchSpec()
+    spec.addTree(joinpath(rootdir, 'src'))
+    spec.addTree(joinpath(rootdir, 'src', 'sub'))
+    spec.addTree(joinpath(rootdir, 'nonexistent'))
+    spec.addFile(joinpath(rootdir, 'src', 'sub', 'b.cpp'))
+    spec.addFile(joinpath(rootdir, 'tests', 't.cpp'))
+    spec.addFile(joinpath(rootdir, 'buildconf.py'))
+    spec.excluded.add(joinpath(rootdir, 'build'))
+    spec.finalize()
+
+    return rootdir, spec
+
+def testWatchSpec(project):
+
+    rootdir, spec = project
+
+    assert spec.trees == { joinpath(rootdir, 'src') }
+    assert spec.files == {
+        joinpath(rootdir, 'tests', 't.cpp'), joinpath(rootdir, 'buildconf.py'),
+    }
+    assert spec.dirs() == [
+        joinpath(rootdir, 'src'), joinpath(rootdir, 'src', 'sub'),
+        rootdir, joinpath(rootdir, 'tests'),
+    ]
+
+    assert spec.isWatched(joinpath(rootdir, 'src', 'sub', 'new.cpp'))
+    assert spec.isWatched(joinpath(rootdir, 'tests', 't.cpp'))
+    assert not spec.isWatched(joinpath(rootdir, 'tests', 'other.cpp'))
+    assert not spec.isWatched(joinpath(rootdir, 'src', '.git', 'c'))
+    assert not spec.isWatched(joinpath(rootdir, 'build', 'd.o'))
+
+def testChanges():
+
+    changes = watch.Changes()
+    assert not changes
+    changes.paths.add('/p/src/a.cpp')
+    changes.dirs.add('/p/src')
+    changes.trees.add('/p/src/sub')
+
+    assert changes
+    assert changes.isChangedFile('/p/src/a.cpp')
+    assert not changes.isChangedFile('/p/src/b.cpp')
+    assert changes.isChangedFile('/p/src/sub/deep/c.cpp')
+    assert changes.isChangedDir('/p/src')
+    assert changes.isChangedDir('/p/src/sub/deep')
+    assert not changes.isChangedDir('/p/other')
+
+    state = watch._BuildState()
+    state.sigs = { '/p/src/a.cpp': 1, '/p/src/b.cpp': 2, '/p/src/sub/c.cpp': 3 }
+    state.visitedDirs = { '/p/src', '/p/src/sub', '/p/other' }
+    state.applyChanges(changes)
+    assert state.sigs == { '/p/src/b.cpp': 2 }
+    assert state.visitedDirs == { '/p/other' }
+
+    changes.overflow = True
+    state.applyChanges(changes)
+    assert state.sigs == {}
+    assert state.visitedDirs is None
+
+def _checkWatcher(watcher, rootdir):
+
+    srcdir = joinpath(rootdir, 'src')
+
+    _writeFile(joinpath(srcdir, 'a.cpp'), 'int a;')
+    _writeFile(joinpath(srcdir, 'sub', 'new', 'e.cpp'))
+    _writeFile(joinpath(rootdir, 'build', 'f.o'))
+    changes = watch.Changes()
+    while watcher.read(changes, 0.2):
+        pass
+    assert joinpath(srcdir, 'a.cpp') in changes.paths
+    assert changes.isChangedFile(joinpath(srcdir, 'sub', 'new', 'e.cpp'))
+    assert changes.isChangedDir(joinpath(srcdir, 'sub'))
+    assert not changes.isChangedDir(srcdir)
+    assert not changes.isChangedFile(joinpath(rootdir, 'build', 'f.o'))
+
+    # created dir is watched too
+    _writeFile(joinpath(srcdir, 'sub', 'new', 'g.cpp'))
+    changes = watch.Changes()
+    while watcher.read(changes, 0.2):
+        pass
+    assert joinpath(srcdir, 'sub', 'new', 'g.cpp') in changes.paths
+
+    # nothing is changed
+    changes = watch.Changes()
+    assert not watcher.read(changes, 0.1)
+    assert not changes
+
+def testPollingWatcher(project):
+
+    rootdir, spec = project
+    watcher = watch.PollingWatcher(spec, interval = 0.05)
+    _checkWatcher(watcher, rootdir)
+
+@pytest.mark.skipif(PLATFORM != 'linux', reason = 'inotify is for Linux only')
+def testInotifyWatcher(project):
+
+    rootdir, spec = project
+    watcher = watch.InotifyWatcher(spec)
+    try:
+        _checkWatcher(watcher, rootdir)
+    finally:
+        watcher.close()